@@ -1,29 +1,94 @@
-from flask import Flask, request, jsonify
-import os, json
-import asyncio
+from flask import Flask, Request, Response, request, jsonify
+import io, os, json
 from dotenv import load_dotenv
 import requests
-from tools.detect_items import detect_items
+from tools.detect_items import detect_items, detect_items_batch, ingredient_names, DETECT_BATCH_MAX_IMAGES, DETECT_MAX_IMAGE_MB
 # from tools.tools import fetch_youtube_link, find_recipe_by_ingredients, fetch_recipe_data, store_all_recipe_data_in_pinecone,find_recipe_using_query, get_festival_recipes
-from tools.tools import fetch_youtube_link, find_recipe_by_ingredients, fetch_recipe_data, store_all_recipe_data_in_pinecone, find_recipe_using_query, get_festival_recipes, fetch_recipes_by_filter, fetch_recipe_by_filter_for_values, fetch_recipes_from_db_by_filters, fetch_recipes_flat_from_db, fetch_recipes_by_ingredients_match, classify_and_extract_recipe_query, classify_recipe_with_openai, insert_youtube_recipe_into_db
+from tools.tools import fetch_youtube_link, find_recipe_by_ingredients, fetch_recipe_data, store_all_recipe_data_in_pinecone, find_recipe_using_query, get_festival_recipes, stream_recipes_by_ingredients, stream_recipes_by_query, fetch_recipes_by_filter, fetch_recipe_by_filter_for_values, fetch_recipes_from_db_by_filters, fetch_recipes_flat_from_db, fetch_recipes_by_ingredients_match, classify_and_extract_recipe_query, classify_recipe_with_openai, insert_youtube_recipe_into_db, index as recipe_index
 from flask_cors import CORS  # Import CORS
 from utils import get_festivals  # Import the new festival function
 from tools.youtube_service import YouTubeService
+from tools.db import pool_stats
+from tools.cache import all_cache_stats, get_registered_cache, purge_caches, registered_cache_names, sync_purges
+from tools.video_index import channel_video_index
+from tools.festival_recipes import festival_recipe_store
+from tools.async_runner import iterate_async, run_async
+from tools.streaming import STREAM_HEADERS, event_stream, stream_format
 # Load environment variables
 load_dotenv()
 
+class InMemoryRequest(Request):
+    """Keep uploaded files in memory instead of spooling large ones to a temp file."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 CORS(app)  # Allow all origins
 
-app.config['UPLOAD_FOLDER'] = 'uploads'
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Uploads never touch disk; MAX_UPLOAD_MB bounds the memory a single request can take.
+# Only /detect_items_batch raises its own limit, to fit a full batch (plus 1 MB of form overhead)
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "16"))
+DETECT_BATCH_MAX_UPLOAD_MB = float(os.getenv("DETECT_BATCH_MAX_UPLOAD_MB", str(DETECT_BATCH_MAX_IMAGES * DETECT_MAX_IMAGE_MB + 1)))
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_UPLOAD_MB * 1024 * 1024)
 os.environ['OPENAI_API_KEY'] = os.getenv("OPENAI_API_KEY")
 
+@app.errorhandler(413)
+def request_too_large(e):
+    limit_mb = (request.max_content_length or app.config['MAX_CONTENT_LENGTH']) / (1024 * 1024)
+    return jsonify({"error": f"Upload too large; the limit is {limit_mb:g} MB"}), 413
+
+def image_too_large(image):
+    """413 response for a single upload over DETECT_MAX_IMAGE_MB, else None"""
+    if len(image) > DETECT_MAX_IMAGE_MB * 1024 * 1024:
+        return jsonify({"error": f"Image larger than {DETECT_MAX_IMAGE_MB:g} MB"}), 413
+    return None
+
+@app.before_request
+def apply_cache_purges():
+    """Replay cache purges made through another worker (rate limited, see tools.cache.sync_purges)."""
+    sync_purges()
+
 def allowed_file(filename):
     """Helper function to check if the file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ['jpg', 'jpeg', 'png']
 
+def stream_response(events, fmt):
+    """Streaming response for (event, data) pairs in the format picked by stream_format"""
+    return Response(event_stream(events, fmt), mimetype=fmt, headers=STREAM_HEADERS)
+
+def recipe_events(agen):
+    """Relay a recipe event generator from the shared loop, then a "done" event with the recipe count"""
+    recipes_found = 0
+    for event, data in iterate_async(agen):
+        if event == "recipe":
+            recipes_found += 1
+        yield event, data
+    if not recipes_found:
+        yield "error", {"error": "No matching recipes found"}
+    yield "done", {"recipes_found": recipes_found}
+
+def image_recipe_events(image_bytes):
+    """Detected ingredients first, then the recipe events for them"""
+    detected_items = detect_items(image_bytes)
+    if isinstance(detected_items, str):
+        detected_items = json.loads(detected_items)
+    if isinstance(detected_items, dict) and "error" in detected_items:
+        yield "error", {"error": detected_items["error"]}
+        yield "done", {"recipes_found": 0}
+        return
+
+    detected_ingredients = ingredient_names(detected_items)
+    yield "ingredients", {"ingredients": detected_ingredients}
+    if not detected_ingredients:
+        yield "error", {"error": "No ingredients detected"}
+        yield "done", {"recipes_found": 0}
+        return
+    yield from recipe_events(stream_recipes_by_ingredients(detected_ingredients))
+
 @app.route('/', methods=['GET'])
 def home():
     """Default route to check API status and list all available endpoints with detailed documentation."""
@@ -50,6 +115,11 @@ def home():
                             "error": "No file part / Invalid file type"
                         }
                     },
+                    "413": {
+                        "example": {
+                            "error": "Image larger than 8 MB / Upload too large"
+                        }
+                    },
                     "500": {
                         "example": {
                             "error": "Error processing the image"
@@ -57,6 +127,38 @@ def home():
                     }
                 }
             },
+            {
+                "route": "/detect_items_batch",
+                "method": "POST",
+                "description": "Upload several images (e.g. fridge, freezer, pantry) and get one merged ingredient list.",
+                "request_body": {
+                    "files": f"Image files (JPEG/PNG), repeat the field per image, at most {DETECT_BATCH_MAX_IMAGES} "
+                             f"images of {DETECT_MAX_IMAGE_MB:g} MB each and {DETECT_BATCH_MAX_UPLOAD_MB:g} MB in total [Required]"
+                },
+                "response": {
+                    "200": {
+                        "example": {
+                            "ingredients": ["Milk", "Peas", "Rice"],
+                            "provenance": {"Milk": [0], "Peas": [1], "Rice": [2]},
+                            "images": [
+                                {"index": 0, "filename": "fridge.jpg", "ingredients": ["Milk"]},
+                                {"index": 1, "filename": "freezer.jpg", "ingredients": ["Peas"]},
+                                {"index": 2, "filename": "pantry.jpg", "ingredients": ["Rice"]}
+                            ]
+                        }
+                    },
+                    "400": {
+                        "example": {
+                            "error": "No files provided / Too many images / Invalid file type"
+                        }
+                    },
+                    "413": {
+                        "example": {
+                            "error": "Images larger than 8 MB / Upload too large"
+                        }
+                    }
+                }
+            },
             {
                 "route": "/find_recipe_from_image",
                 "method": "POST",
@@ -111,7 +213,12 @@ def home():
                 "method": "GET",
                 "description": "Get recipe suggestions based on user-provided ingredients.",
                 "request_params": {
-                    "ingredients": "Comma-separated list of ingredients (e.g., ?ingredients=tomato,cheese) [Required]"
+                    "ingredients": "Comma-separated list of ingredients (e.g., ?ingredients=tomato,cheese) [Required]",
+                    "recipe_type": "Meal type, e.g. Breakfast [Optional]",
+                    "preparation_time": "Maximum preparation time in minutes [Optional]",
+                    "diet": "veg, vegan or non-veg [Optional]",
+                    "cuisine": "Cuisine, repeat for several (any matches) [Optional]",
+                    "count": "Number of recipes to return (default 24) [Optional]"
                 },
                 "response": {
                     "200": {
@@ -318,8 +425,8 @@ def home():
 
 
 @app.route('/detect_items', methods=['POST'])
-async def upload_image():
-    """Async image upload & object detection"""
+def upload_image():
+    """Image upload & object detection"""
     if 'file' not in request.files:
         return jsonify({"error": "No file part"}), 400
     
@@ -328,12 +435,13 @@ async def upload_image():
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename):
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        file.save(file_path)
-
+        image = file.read()
+        too_large = image_too_large(image)
+        if too_large:
+            return too_large
         try:
-            # Run detect_items asynchronously
-            detected_items = await asyncio.to_thread(detect_items, file_path)
+            # Hand the in-memory upload straight to preprocessing
+            detected_items = detect_items(image)
             return jsonify({
                 "filename": file.filename,
                 "detected_items": detected_items,
@@ -343,9 +451,35 @@ async def upload_image():
     else:
         return jsonify({"error": "Invalid file type. Please upload a valid image file."}), 400
 
+@app.route('/detect_items_batch', methods=['POST'])
+def upload_images_batch():
+    """Detect ingredients across several photos (fridge, freezer, pantry) in one request"""
+    # Raise the upload limit for this route only, before the form is parsed
+    request.max_content_length = int(DETECT_BATCH_MAX_UPLOAD_MB * 1024 * 1024)
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+    if len(files) > DETECT_BATCH_MAX_IMAGES:
+        return jsonify({"error": f"Too many images; the limit is {DETECT_BATCH_MAX_IMAGES}"}), 400
+
+    invalid = [f.filename for f in files if not allowed_file(f.filename)]
+    if invalid:
+        return jsonify({"error": "Invalid file type. Please upload valid image files.", "files": invalid}), 400
+
+    images = [f.read() for f in files]
+    too_large = [f.filename for f, image in zip(files, images) if len(image) > DETECT_MAX_IMAGE_MB * 1024 * 1024]
+    if too_large:
+        return jsonify({"error": f"Images larger than {DETECT_MAX_IMAGE_MB:g} MB", "files": too_large}), 413
+
+    try:
+        result = detect_items_batch(images, filenames=[f.filename for f in files])
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to process images: {str(e)}"}), 500
+
 @app.route('/find_recipe_from_image', methods=['POST'])
-async def get_recipe_from_image():
-    """Async API to detect ingredients & find recipes"""
+def get_recipe_from_image():
+    """API to detect ingredients & find recipes"""
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
     
@@ -354,12 +488,19 @@ async def get_recipe_from_image():
         return jsonify({"error": "No selected file"}), 400
 
     if file and allowed_file(file.filename):
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        file.save(file_path)
+        image = file.read()
+        too_large = image_too_large(image)
+        if too_large:
+            return too_large
+
+        # Accept: application/x-ndjson or text/event-stream streams ingredients, then recipes
+        fmt = stream_format(request.headers.get('Accept'))
+        if fmt:
+            return stream_response(image_recipe_events(image), fmt)
 
         try:
-            # Run detect_items asynchronously
-            detected_items = await asyncio.to_thread(detect_items, file_path)
+            # Hand the in-memory upload straight to preprocessing
+            detected_items = detect_items(image)
 
             # Debugging logs
             # print("Type of detected_items:", type(detected_items))
@@ -395,9 +536,8 @@ async def get_recipe_from_image():
                 return jsonify({"error": "No ingredients detected"}), 400
 
             
-            # Call find_recipe_by_ingredients asynchronously
-            # matched_recipes = await asyncio.to_thread(find_recipe_by_ingredients, detected_ingredients)
-            matched_recipes = await find_recipe_by_ingredients(detected_ingredients)
+            # Run find_recipe_by_ingredients on the worker's shared event loop
+            matched_recipes = run_async(find_recipe_by_ingredients(detected_ingredients))
 
             if matched_recipes:
                 return jsonify(matched_recipes), 200
@@ -416,13 +556,15 @@ def fetch_recipe_data_and_store_it_in_pinecone():
 
 
 @app.route('/find_recipe', methods=['GET'])
-async def get_recipe():
+def get_recipe():
     """Get a recipe suggestion based on user input ingredients.
     
     If ingredients, recipe_type, and preparation_time are all provided,
     fetches recipes via fetch_recipes_by_filter and returns the same
     response shape as /recipe_by_api.
-    Otherwise falls back to the existing find_recipe_by_ingredients flow.
+    Otherwise falls back to the existing find_recipe_by_ingredients flow, where
+    any of recipe_type, preparation_time (max minutes), diet and cuisine
+    filter the vector search and count sets how many recipes come back.
     """
     user_ingredients = request.args.getlist('ingredients')
     print(user_ingredients)
@@ -479,7 +621,25 @@ async def get_recipe():
 
     # --- existing ingredients-only flow ---
     print(user_ingredients)
-    matched_recipe = await find_recipe_by_ingredients(user_ingredients)
+    try:
+        search_filters = {
+            "recipe_type": recipe_type or None,
+            "preparation_time": int(preparation_time) if preparation_time else None,
+            "diet": request.args.get('diet', '').strip() or None,
+            "cuisine": [c for c in request.args.getlist('cuisine') if c.strip()] or None,
+            "top_k": int(request.args['count']) if request.args.get('count') else None,
+        }
+    except ValueError:
+        return jsonify({"error": "preparation_time and count must be integers"}), 400
+
+    fmt = stream_format(request.headers.get('Accept'))
+    if fmt:
+        def events():
+            yield "ingredients", {"ingredients": user_ingredients}
+            yield from recipe_events(stream_recipes_by_ingredients(user_ingredients, **search_filters))
+        return stream_response(events(), fmt)
+
+    matched_recipe = run_async(find_recipe_by_ingredients(user_ingredients, **search_filters))
 
     if matched_recipe:
         return jsonify(matched_recipe), 200
@@ -488,8 +648,12 @@ async def get_recipe():
 
 
 @app.route('/store_receipe_info', methods=['GET'])
-async def store_recipes():
-    stored_recipes = store_all_recipe_data_in_pinecone()
+def store_recipes():
+    # ?resume=true continues an interrupted re-ingest from its checkpoint
+    resume = request.args.get("resume", "false").lower() == "true"
+    # ?mode=delta only re-embeds changed recipes and removes deleted ones
+    delta = request.args.get("mode", "full").lower() == "delta"
+    stored_recipes = store_all_recipe_data_in_pinecone(resume=resume, delta=delta)
 
     if stored_recipes:
         return jsonify(stored_recipes), 200
@@ -497,7 +661,7 @@ async def store_recipes():
         return jsonify({"error": "No matching recipe found"}), 404
     
 @app.route('/find_recipe_by_query', methods=['GET'])
-async def get_recipe_by_query():
+def get_recipe_by_query():
     """Get recipe suggestions based on natural language query"""
     query = request.args.get('query')
     
@@ -505,10 +669,14 @@ async def get_recipe_by_query():
         return jsonify({"error": "No query provided"}), 400
     
     print(f"Received query: {query}")
-    
+
+    fmt = stream_format(request.headers.get('Accept'))
+    if fmt:
+        return stream_response(recipe_events(stream_recipes_by_query(query)), fmt)
+
     try:
-        # Run find_recipe_using_query asynchronously
-        matched_recipes = await find_recipe_using_query(query)
+        # Run find_recipe_using_query on the worker's shared event loop
+        matched_recipes = run_async(find_recipe_using_query(query))
 
         if matched_recipes:
             return jsonify({
@@ -633,7 +801,7 @@ def festival_recipes():
     Returns festivals for the specified range and LLM-picked dishes with their recipes.
     '''
     from datetime import datetime, timedelta
-    import calendar, asyncio
+    import calendar
 
     range_type = request.args.get('range', 'week')
     start_date_param = request.args.get('start_date')
@@ -665,14 +833,26 @@ def festival_recipes():
     print("###################################################################################################")
 
     print(f"[DEBUG] Festivals found: {len(festivals)}")
-    print(get_festival_recipes("Eid Recipes"))
-    print("###################################################################################################")
 
-    # Step 2: Use your existing function to get recipes
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    festival_recipes = loop.run_until_complete(get_festival_recipes(festivals))
-    loop.close()
+    fmt = stream_format(request.headers.get('Accept'))
+    if fmt:
+        # Festival list first, then each festival's recipes as soon as they are available
+        def events():
+            yield "festivals", {"festivals": [{"festival": f["name"], "date": f["date"]} for f in festivals]}
+            pending = {}
+            for festival in festivals:
+                pending.setdefault(festival["name"], []).append(festival)
+            for name, recipes in festival_recipe_store.iter_recipes(festivals):
+                for festival in pending.pop(name, []):
+                    yield "festival", {"festival": name, "date": festival["date"], "recipes": recipes}
+            for name, remaining in pending.items():
+                for festival in remaining:
+                    yield "festival", {"festival": name, "date": festival["date"], "recipes": []}
+            yield "done", {"festivals": len(festivals)}
+        return stream_response(events(), fmt)
+
+    # Step 2: Look recipes up in the precomputed festival -> recipes store
+    festival_recipes = festival_recipe_store.get_recipes(festivals)
 
     # print(f"[DEBUG] Recipes fetched: {festival_recipes}")
 
@@ -1195,6 +1375,58 @@ def get_channel_videos():
     except Exception as e:
         return jsonify({"error": str(e), "type": type(e).__name__}), 500  # ← show error type too
 
+@app.route('/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    """Connection pool metrics (checkouts, waits, discards) for this worker."""
+    return jsonify({"pid": os.getpid(), "pools": pool_stats()}), 200
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for every registered cache in this worker."""
+    return jsonify({
+        "pid": os.getpid(),
+        "caches": all_cache_stats(),
+        "video_index": channel_video_index.stats(),
+        "festival_recipes": festival_recipe_store.stats(),
+        "vector_index": recipe_index.stats(),
+    }), 200
+
+@app.route('/admin/cache/purge', methods=['POST'])
+def purge_cache():
+    """
+    Purge cached responses.
+
+    Requires the X-Admin-Token header to match ADMIN_TOKEN (disabled when unset).
+    The worker handling the request purges at once; the other workers on
+    the host replay the purge from the shared SQLite cache file within
+    CACHE_PURGE_POLL_SECONDS. Other hosts keep their in-memory entries
+    until they expire.
+    JSON body (all optional):
+        namespace - cache to purge, e.g. "recipes_by_filter"; omit for every cache
+        key       - key parts of a single entry, e.g. ["breakfast", 15, 0, 10]
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or request.headers.get("X-Admin-Token") != admin_token:
+        return jsonify({"error": "Forbidden"}), 403
+
+    body = request.get_json(silent=True) or {}
+    namespace = body.get("namespace")
+    key = body.get("key")
+
+    if namespace:
+        cache = get_registered_cache(namespace)
+        if cache is None:
+            return jsonify({"error": f"Unknown cache '{namespace}'"}), 404
+        caches = {namespace: cache}
+    else:
+        caches = {name: get_registered_cache(name) for name in registered_cache_names()}
+
+    if key is not None and (not namespace or not hasattr(caches[namespace], "purge")):
+        return jsonify({"error": "key purges need a namespace that supports per-key purging"}), 400
+    purge_caches(namespace, key)
+
+    return jsonify({"purged": list(caches), "key": key}), 200
+
 # @app.route('/recipe_by_ingredients', methods=['GET'])
 # def recipe_by_ingredients():
 #     """
@@ -1791,4 +2023,10 @@ def youtube_data_load():
     
 if __name__ == '__main__':
     import uvicorn
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    # Same serving mode as the Docker image; see "Serving and concurrency" in README.md
+    uvicorn.run(
+        "asgi:asgi_app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "5000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
\ No newline at end of file
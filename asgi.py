@@ -0,0 +1,13 @@
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import app
+
+# Threads per worker process that run Flask request handlers. Each request
+# holds one thread while it runs; async tool calls inside it run on the
+# worker's shared event loop (tools/async_runner.py).
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "32"))
+
+# Production entry point: uvicorn asgi:asgi_app --workers $WEB_CONCURRENCY
+asgi_app = WSGIMiddleware(app, workers=ASGI_THREADS)
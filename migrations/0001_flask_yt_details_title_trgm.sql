@@ -0,0 +1,6 @@
+-- Trigram index so `title ILIKE '%dish%'` lookups (fetch_youtube_urls_from_db)
+-- can use a bitmap index scan instead of a sequential scan per dish name.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS flask_yt_details_title_trgm_idx
+    ON flask_yt_details USING gin (title gin_trgm_ops);
@@ -0,0 +1,15 @@
+-- Precomputed dietary bitmask (tools/diet.py): 1 veg, 2 vegan, 4 egg,
+-- 8 dairy, 16 nuts, 32 gluten. Written by insert_youtube_recipe_into_db;
+-- existing rows are filled in by 0004_backfill_recipe_diet_flags.py.
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS diet_flags SMALLINT;
+
+-- Partial indexes matching diet_sql_clause(); keyed on title for the
+-- ORDER BY title pagination in fetch_recipes_flat_from_db
+CREATE INDEX CONCURRENTLY IF NOT EXISTS recipes_veg_title_idx
+    ON recipes (title) WHERE (diet_flags & 1) = 1;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS recipes_vegan_title_idx
+    ON recipes (title) WHERE (diet_flags & 2) = 2;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS recipes_non_veg_title_idx
+    ON recipes (title) WHERE (diet_flags & 1) = 0;
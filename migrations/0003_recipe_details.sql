@@ -0,0 +1,16 @@
+-- Full recipe bodies (tools/recipe_store.py). Pinecone metadata only keeps
+-- the display and filter fields; ingredients, steps and the story HTML are
+-- fetched from here by id for the matches a query actually returns.
+-- Populated by the ingest (`python -m tools.ingest --delta` re-upserts every
+-- recipe once after METADATA_VERSION 4).
+CREATE TABLE IF NOT EXISTS recipe_details (
+    id                  TEXT PRIMARY KEY,
+    dish_name           TEXT NOT NULL DEFAULT '',
+    recipe_url          TEXT NOT NULL DEFAULT '',
+    recipe_youtube_link TEXT NOT NULL DEFAULT '',
+    dish_image          TEXT NOT NULL DEFAULT '',
+    ingredients         JSONB NOT NULL DEFAULT '[]'::jsonb,
+    cooking_steps       JSONB NOT NULL DEFAULT '[]'::jsonb,
+    story               TEXT NOT NULL DEFAULT '',
+    updated_at          TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
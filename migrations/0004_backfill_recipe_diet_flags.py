@@ -0,0 +1,13 @@
+"""
+Fill recipes.diet_flags for rows written before 0002_recipes_diet_flags.
+
+diet_sql_clause() filters on diet_flags alone so the planner can use the
+partial indexes from 0002; rows left NULL would drop out of every diet
+filter. Only NULL rows are touched, so a re-run after an interruption
+resumes where it stopped.
+"""
+from tools.diet import backfill_recipe_flags
+
+
+def upgrade(dsn: str = None) -> None:
+    backfill_recipe_flags(dsn)
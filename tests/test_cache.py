@@ -0,0 +1,50 @@
+import pytest
+
+from tools import cache
+from tools.cache import MISS, SQLiteCache, StaleWhileRevalidateCache, TieredCache, make_key, purge_caches, sync_purges
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(cache, "_durable_store", store)
+    monkeypatch.setattr(cache, "_purge_sync", {"last_id": None, "next_check": 0.0, "own": set()})
+    monkeypatch.setattr(cache, "_registry", {})
+    sync_purges(force=True)
+    return store
+
+
+def test_purge_clears_memory_and_durable_tier(store):
+    tiered = TieredCache("test_tiered")
+    tiered.set("a", {"v": 1})
+    purge_caches("test_tiered")
+    assert tiered.memory.get("a") is MISS
+    assert store.get("test_tiered", "a") is None
+    assert sync_purges(force=True) == 0
+
+
+def test_replayed_purge_keeps_rows_written_after_it(store):
+    tiered = TieredCache("test_tiered")
+    tiered.set("a", {"v": 1})
+
+    # Another worker purges, then refetches and writes a new durable row
+    # before this worker gets to replay the purge
+    store.record_purge("test_tiered")
+    store.set("test_tiered", "a", b'{"v": 2}', 4102444800)
+
+    assert sync_purges(force=True) == 1
+    assert tiered.memory.get("a") is MISS
+    assert tiered.get("a") == {"v": 2}
+
+
+def test_replayed_key_purge_is_local_only(store):
+    swr = StaleWhileRevalidateCache("test_swr")
+    assert swr.get_or_load(("dal",), lambda: "old") == "old"
+
+    store.record_purge("test_swr", ["dal"])
+    key = make_key("dal")
+    store.set("test_swr", key, store.get("test_swr", key)[0], 4102444800)
+
+    assert sync_purges(force=True) == 1
+    assert swr._cache.memory.get(key) is MISS
+    assert store.get("test_swr", key) is not None
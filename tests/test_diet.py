@@ -0,0 +1,85 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from tools import diet
+from tools.diet import (
+    DAIRY, EGG, GLUTEN, NUT, VEG, VEGAN,
+    dairy_matcher, diet_flags, disliked_matcher, egg_matcher, non_veg_matcher,
+)
+
+
+@pytest.mark.parametrize("keyword, ingredient", [
+    ("tomatoes", "Tomato"),
+    ("tomato", "Tomatoes"),
+    ("potatoes", "potato"),
+    ("onion", "Onions, sliced"),
+    ("peas", "Green Pea"),
+    ("green chillies", "Green Chilli"),
+])
+def test_disliked_matches_plural_and_singular_spellings(keyword, ingredient):
+    assert disliked_matcher([keyword]).matches("Curry", [ingredient])
+
+
+def test_disliked_matcher_is_word_aware():
+    matcher = disliked_matcher(["pea"])
+    assert not matcher.matches("Pearl Millet Roti", ["Peanut", "Chickpeas"])
+
+
+@pytest.mark.parametrize("ingredients", [["Eggplant"], ["Veggie Stock"], ["Pandan Leaves"]])
+def test_egg_not_found_inside_other_words(ingredients):
+    assert egg_matcher.find("Bharta", ingredients) is None
+    assert non_veg_matcher.find("Bharta", ingredients) is None
+    assert diet_flags("Bharta", ingredients) & VEGAN
+
+
+def test_eggs_match_egg():
+    assert egg_matcher.find("Curry", ["2 Eggs, boiled"]) == "eggs"
+    assert not diet_flags("Egg Curry", ["Onion"]) & VEG
+
+
+def test_peanut_butter_is_not_dairy():
+    assert dairy_matcher.find("Toast", ["Peanut Butter"]) is None
+    flags = diet_flags("Toast", ["Peanut Butter"])
+    assert flags & NUT and flags & VEGAN and not flags & DAIRY
+
+
+def test_allowed_phrase_does_not_hide_a_later_keyword():
+    assert dairy_matcher.find("Toast", ["Peanut  Butter", "Butter"]) == "butter"
+    assert diet_flags("Toast", ["Peanut Butter", "Butter"]) & DAIRY
+
+
+def test_phrases_do_not_span_ingredients():
+    assert diet.gluten_matcher.find("Noodles", ["Rice", "Noodles"]) == "noodles"
+    assert diet.gluten_matcher.find("Stir Fry", ["Rice Noodles"]) is None
+
+
+def test_longest_phrase_wins():
+    assert non_veg_matcher.find("Butter-Chicken", []) == "butter chicken"
+    flags = diet_flags("Butter Chicken", [])
+    assert flags & DAIRY and not flags & VEG
+
+
+def test_combined_scan_agrees_with_per_category_matchers():
+    for dish_name, ingredients in diet._fixture(500):
+        text = diet._search_text(dish_name, ingredients)
+        found = {bit for bit, matcher in diet._CATEGORY_MATCHERS if matcher.find_text(text) is not None}
+        flags = diet_flags(dish_name, ingredients)
+        assert bool(flags & EGG) == (EGG in found)
+        assert bool(flags & DAIRY) == (DAIRY in found)
+        assert bool(flags & NUT) == (NUT in found)
+        assert bool(flags & GLUTEN) == (GLUTEN in found)
+        assert bool(flags & VEG) == (diet._NON_VEG not in found)
+
+
+def test_benchmark_reports_cold_speedup():
+    result = diet.benchmark(size=200, repeat=1)
+    assert result["speedup"] == pytest.approx(result["substring_ms"] / result["compiled_ms"], rel=0.1)
+
+
+def test_diet_sql_matches_partial_index_predicates():
+    migration = (Path(diet.__file__).resolve().parent.parent / "migrations" / "0002_recipes_diet_flags.sql").read_text()
+    predicates = set(re.findall(r"WHERE (.+);", migration))
+    for name in ("veg", "vegan", "non-veg"):
+        assert diet.diet_sql_clause(name) in predicates
@@ -0,0 +1,23 @@
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from tools.image_preprocess import image_hash, prepare_image
+
+
+def _jpeg(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_image_hash_leaves_a_pil_source_untouched():
+    img = Image.open(io.BytesIO(_jpeg()))
+    hash_value = image_hash(img)
+    assert img.mode == "RGB" and img.size == (800, 600)
+
+    prepared = prepare_image(img, max_edge=1024, hash_value=hash_value)
+    assert (prepared["width"], prepared["height"]) == (800, 600)
+
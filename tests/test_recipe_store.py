@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from tools import recipe_store
+from tools.recipe_store import DETAIL_FIELDS, RecipeDetailStore
+
+
+def _record(recipe_id, story):
+    details = {"dish_name": recipe_id, "recipe_url": "", "recipe_youtube_link": "", "dish_image": "",
+               "ingredients": ["Onion"], "cooking_steps": ["Fry"], "story": story}
+    return {"id": recipe_id, "details": details, "metadata": {"dish_name": recipe_id}}
+
+
+class FakeConnection:
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def written(monkeypatch):
+    batches = []
+
+    @contextmanager
+    def db_connection(dsn=None):
+        yield FakeConnection()
+
+    monkeypatch.setattr(recipe_store, "db_connection", db_connection)
+    monkeypatch.setattr(recipe_store, "execute_values",
+                        lambda cur, sql, rows, **kwargs: batches.append(list(rows)))
+    return batches
+
+
+def test_put_many_keeps_the_last_record_per_id(written):
+    store = RecipeDetailStore()
+    store.put_many([_record("Poha", "first"), _record("Upma", "upma"), _record("Poha", "second")])
+
+    assert len(written) == 1
+    rows = {row[0]: dict(zip(DETAIL_FIELDS, row[1:])) for row in written[0]}
+    assert len(written[0]) == 2
+    assert rows["Poha"]["story"] == "second"
+
+
+def test_vector_metadata_stays_slim_with_duplicate_ids(written):
+    store = RecipeDetailStore()
+    metadata = store.vector_metadata([_record("Poha", "first"), _record("Poha", "second")])
+    assert metadata == [{"dish_name": "Poha"}, {"dish_name": "Poha"}]
+    assert store.stats()["full_metadata_fallbacks"] == 0
@@ -0,0 +1,163 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tools.vector_backend import VECTOR_GROW_SLACK, LocalVectorIndex, TieredVectorIndex, VectorBackend, matches_filter
+
+RECIPE = {"dish_name": "Poha", "recipe_type": ["breakfast", "snack"], "preparation_time": 20, "is_veg": True}
+
+
+@pytest.mark.parametrize("metadata_filter, expected", [
+    (None, True),
+    ({"is_veg": True}, True),
+    ({"is_veg": {"$eq": False}}, False),
+    ({"recipe_type": {"$in": ["snack", "dinner"]}}, True),
+    ({"recipe_type": {"$nin": ["breakfast"]}}, False),
+    ({"recipe_type": {"$eq": "snack"}}, True),
+    ({"preparation_time": {"$lte": 20}}, True),
+    ({"preparation_time": {"$lt": 20}}, False),
+    ({"preparation_time": {"$gte": "20"}}, False),
+    ({"cuisine": {"$exists": False}}, True),
+    ({"cuisine": {"$in": ["punjabi"]}}, False),
+    ({"cuisine": {"$ne": "punjabi"}}, True),
+    ({"$and": [{"is_veg": True}, {"preparation_time": {"$gt": 10}}]}, True),
+    ({"$and": [{"is_veg": True}, {"preparation_time": {"$gt": 30}}]}, False),
+    ({"$or": [{"is_veg": False}, {"recipe_type": "breakfast"}]}, True),
+])
+def test_matches_filter(metadata_filter, expected):
+    assert matches_filter(RECIPE, metadata_filter) is expected
+
+
+def test_matches_filter_rejects_unknown_operator():
+    with pytest.raises(ValueError):
+        matches_filter(RECIPE, {"preparation_time": {"$between": [1, 2]}})
+
+
+def _unit(dim, axis, tilt=0.0):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[axis] = 1.0
+    vector[(axis + 1) % dim] = tilt
+    return vector.tolist()
+
+
+def _index(tmp_path, count=5, dim=8):
+    index = LocalVectorIndex(str(tmp_path))
+    index.upsert([(f"r{i}", _unit(dim, 0, tilt=i * 0.5), {"n": i, "is_veg": i % 2 == 0}) for i in range(count)])
+    return index
+
+
+def test_query_returns_top_k_by_cosine_score(tmp_path):
+    result = _index(tmp_path).query(vector=_unit(8, 0), top_k=3, include_metadata=True)
+    assert [m["id"] for m in result["matches"]] == ["r0", "r1", "r2"]
+    scores = [m["score"] for m in result["matches"]]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == pytest.approx(1.0)
+    assert result["matches"][1]["metadata"] == {"n": 1, "is_veg": False}
+
+
+def test_query_applies_filter_before_top_k(tmp_path):
+    result = _index(tmp_path).query(vector=_unit(8, 0), top_k=2, filter={"is_veg": True})
+    assert [m["id"] for m in result["matches"]] == ["r0", "r2"]
+
+
+def test_upsert_replaces_and_delete_tombstones(tmp_path):
+    index = _index(tmp_path)
+    index.upsert([("r0", _unit(8, 3), {"n": 0, "is_veg": True})])
+    index.delete(ids=["r1"])
+    assert len(index) == 4
+    assert index.stats()["tombstones"] == 2
+    result = index.query(vector=_unit(8, 0), top_k=10)
+    assert [m["id"] for m in result["matches"]] == ["r2", "r3", "r4", "r0"]
+    assert index.fetch(["r1"]) == {"vectors": {}}
+
+
+def test_compaction_drops_tombstones(tmp_path):
+    index = LocalVectorIndex(str(tmp_path))
+    index.upsert([(f"r{i}", _unit(4, i % 4), {}) for i in range(3000)])
+    index.delete(ids=[f"r{i}" for i in range(1500)])
+    stats = index.stats()
+    assert stats["vectors"] == 1500 and stats["tombstones"] == 0
+    assert index.fetch(["r2999"])["vectors"]["r2999"]["values"] == pytest.approx(_unit(4, 3))
+    assert {m["id"] for m in index.query(vector=_unit(4, 3), top_k=5)["matches"]} <= {f"r{i}" for i in range(1500, 3000)}
+
+
+def test_snapshot_round_trip(tmp_path):
+    index = _index(tmp_path)
+    index.delete(ids=["r4"])
+    index.snapshot()
+
+    restored = LocalVectorIndex(str(tmp_path))
+    assert not restored.loaded
+    assert restored.restore()
+    assert restored.loaded and restored.stats()["memory_mapped"]
+    query = _unit(8, 0, tilt=0.7)
+    assert restored.query(vector=query, top_k=4, include_metadata=True) == \
+        index.query(vector=query, top_k=4, include_metadata=True)
+
+    # Writes after a restore copy the read-only mapping instead of touching it
+    restored.upsert([("r9", _unit(8, 5), {})])
+    assert restored.query(vector=_unit(8, 5), top_k=1)["matches"][0]["id"] == "r9"
+    reread = LocalVectorIndex(str(tmp_path))
+    assert reread.restore() and len(reread) == 4 and reread.fetch(["r9"]) == {"vectors": {}}
+
+
+def test_restore_without_snapshot(tmp_path):
+    index = LocalVectorIndex(str(tmp_path / "missing"))
+    assert index.restore() is False
+    assert not index.loaded
+
+
+class FakePinecone(VectorBackend):
+    def __init__(self):
+        self.upserts, self.queries = [], 0
+
+    def query(self, vector=None, top_k=10, include_metadata=False, filter=None, **kwargs):
+        self.queries += 1
+        return {"matches": [{"id": "from-pinecone", "score": 1.0}], "namespace": ""}
+
+    def upsert(self, vectors, **kwargs):
+        self.upserts.extend(vectors)
+
+    def delete(self, ids=None, **kwargs):
+        return {}
+
+    def stats(self):
+        return {}
+
+
+def test_tiered_uses_pinecone_until_local_is_loaded(tmp_path):
+    primary = FakePinecone()
+    tiered = TieredVectorIndex(primary, LocalVectorIndex(str(tmp_path)))
+    tiered.upsert([("new", _unit(8, 0), {})])
+    assert len(primary.upserts) == 1 and len(tiered.local) == 0
+    assert tiered.query(vector=_unit(8, 0), top_k=1)["matches"][0]["id"] == "from-pinecone"
+
+    _index(tmp_path).snapshot()
+    tiered.local.reload_seconds = 0
+    assert tiered.query(vector=_unit(8, 0), top_k=1)["matches"][0]["id"] == "r0"
+    tiered.upsert([("new", _unit(8, 6), {})])
+    assert tiered.query(vector=_unit(8, 6), top_k=1)["matches"][0]["id"] == "new"
+    assert primary.queries == 1
+
+
+def test_first_write_after_restore_copies_with_small_slack(tmp_path):
+    _index(tmp_path, count=2000).snapshot()
+    restored = LocalVectorIndex(str(tmp_path))
+    assert restored.restore()
+    restored.upsert([("new", _unit(8, 5), {})])
+    assert len(restored._matrix) == 2001 + VECTOR_GROW_SLACK
+
+
+def test_query_skips_rows_tombstoned_after_the_snapshot(tmp_path, monkeypatch):
+    index = _index(tmp_path)
+    filter_mask = index._filter_mask
+
+    def delete_mid_query(*args):
+        mask = filter_mask(*args)
+        index.delete(ids=["r0", "r2"])
+        return mask
+
+    monkeypatch.setattr(index, "_filter_mask", delete_mid_query)
+    result = index.query(vector=_unit(8, 0), top_k=3, include_metadata=True, filter={"is_veg": True})
+    assert [m["id"] for m in result["matches"]] == ["r4"]
+    assert result["matches"][0]["metadata"] == {"n": 4, "is_veg": True}
@@ -0,0 +1,112 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Coroutine, Dict, Iterator, Optional
+
+# Default upper bound (seconds) for a coroutine run from a sync route
+ASYNC_RUN_TIMEOUT = float(os.getenv("ASYNC_RUN_TIMEOUT", "120"))
+# Threads behind asyncio.to_thread on the shared loop. The blocking clients
+# (Pinecone, psycopg2, YouTube, embeddings) all run there, so asyncio's
+# default of min(32, cpus + 4) queues upstream waits on small hosts
+ASYNC_RUNNER_THREADS = int(os.getenv("ASYNC_RUNNER_THREADS", "64"))
+
+
+class LoopRunner:
+    """
+    One long-lived event loop running in a daemon thread.
+
+    Sync code (Flask routes, background jobs) hands coroutines to it instead
+    of creating a loop per call, so loop-bound resources such as the shared
+    aiohttp session and its DNS cache live across requests.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(ASYNC_RUNNER_THREADS, thread_name_prefix="async-runner-io"))
+        self._thread = threading.Thread(target=self._run, daemon=True, name="async-runner")
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = ASYNC_RUN_TIMEOUT) -> Any:
+        """Run coro on the loop and block until it finishes (cancelled on timeout)."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("run_async() called from the shared event loop; await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Coroutine did not finish within {timeout}s")
+
+
+_runners: Dict[int, LoopRunner] = {}
+_runners_lock = threading.Lock()
+
+
+def get_runner() -> LoopRunner:
+    """The worker's loop runner, keyed by PID so forked workers start their own."""
+    pid = os.getpid()
+    runner = _runners.get(pid)
+    if runner is None:
+        with _runners_lock:
+            runner = _runners.get(pid)
+            if runner is None:
+                runner = LoopRunner()
+                _runners[pid] = runner
+    return runner
+
+
+def run_async(coro: Coroutine, timeout: Optional[float] = ASYNC_RUN_TIMEOUT) -> Any:
+    """
+    Run a coroutine on the worker's shared event loop from synchronous code.
+
+    Args:
+        coro: Coroutine to run.
+        timeout: Seconds to wait before cancelling it (None waits forever).
+
+    Returns:
+        The coroutine's result; its exceptions propagate to the caller.
+    """
+    return get_runner().run(coro, timeout)
+
+
+def submit_async(coro: Coroutine) -> Future:
+    """Schedule a coroutine on the shared loop without waiting for it."""
+    return get_runner().submit(coro)
+
+
+def iterate_async(agen: AsyncIterator, timeout: Optional[float] = ASYNC_RUN_TIMEOUT) -> Iterator:
+    """
+    Iterate an async generator from synchronous code (e.g. a streaming
+    response body), pulling one item at a time on the shared event loop.
+
+    Args:
+        agen: Async generator to drain.
+        timeout: Seconds to wait for each item (None waits forever).
+
+    Closing the returned generator early (client disconnect) closes agen too.
+    """
+    runner = get_runner()
+
+    async def step():
+        try:
+            return False, await agen.__anext__()
+        except StopAsyncIteration:
+            return True, None
+
+    try:
+        while True:
+            finished, item = runner.run(step(), timeout)
+            if finished:
+                return
+            yield item
+    finally:
+        runner.submit(agen.aclose())
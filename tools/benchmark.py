@@ -0,0 +1,90 @@
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Dict, List
+
+import aiohttp
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def run_benchmark(url: str, requests: int = 200, concurrency: int = 20,
+                        method: str = "GET", timeout: float = 60) -> Dict:
+    """
+    Fire `requests` calls at url with `concurrency` in flight and report
+    throughput and latency. A "{n}" in url is replaced by the request number,
+    so every request can miss the server's caches.
+
+    Returns:
+        dict with requests/sec, latency percentiles (ms) and status counts.
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for n in range(requests):
+        queue.put_nowait(n)
+
+    async def worker(session):
+        while True:
+            try:
+                n = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                async with session.request(method, url.replace("{n}", str(n))) as response:
+                    await response.read()
+                    status = str(response.status)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "url": url,
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_sec": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 1) if latencies else 0.0,
+            "p50": round(_percentile(latencies, 50), 1),
+            "p95": round(_percentile(latencies, 95), 1),
+            "p99": round(_percentile(latencies, 99), 1),
+        },
+        "statuses": statuses,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure requests/sec of a running server, e.g. "
+                    "flask run vs uvicorn asgi:asgi_app --workers 4"
+    )
+    parser.add_argument("url", help="Full URL to hit, e.g. http://localhost:5000/find_recipe_by_query?query=dal; "
+                                    "{n} is replaced by the request number")
+    parser.add_argument("-n", "--requests", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("-X", "--method", default="GET")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(args.url, args.requests, args.concurrency, args.method, args.timeout))
+    print(f"{result['requests']} requests, concurrency {result['concurrency']}: "
+          f"{result['requests_per_sec']} req/s over {result['elapsed_seconds']}s")
+    print(f"latency ms: {result['latency_ms']}")
+    print(f"statuses: {result['statuses']}")
@@ -0,0 +1,544 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# Local SQLite file shared by every worker process on the host
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", str(Path(".cache") / "ifn_cache.sqlite3"))
+CACHE_DURABLE_ENABLED = os.getenv("CACHE_DURABLE_ENABLED", "1").lower() not in ("0", "false", "no")
+# Expired rows are only skipped on read; writes delete them at most this often
+CACHE_PURGE_INTERVAL = int(os.getenv("CACHE_PURGE_INTERVAL", "3600"))
+# How often a worker checks the SQLite file for purges made by other workers
+CACHE_PURGE_POLL_SECONDS = float(os.getenv("CACHE_PURGE_POLL_SECONDS", "2"))
+# Recorded purges older than this are deleted with the expired entries
+CACHE_PURGE_LOG_TTL = int(os.getenv("CACHE_PURGE_LOG_TTL", str(24 * 3600)))
+
+# Sentinel returned on a cache miss, so None / [] can be cached as real values
+MISS = object()
+
+
+def make_key(*parts) -> str:
+    """Stable hash of arbitrary JSON-serialisable key parts."""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISS):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None, expires_at: Optional[float] = None):
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SQLiteCache:
+    """
+    Durable key/value tier stored in a local SQLite file.
+
+    Values are stored as BLOBs; callers choose the codec. Every thread gets
+    its own connection, and WAL mode lets several worker processes read
+    while one writes. Expired rows are skipped on read and deleted from
+    set() at most every `purge_interval` seconds, so the file does not
+    grow without bound.
+    """
+
+    def __init__(self, path: str = CACHE_DB_PATH, purge_interval: float = CACHE_PURGE_INTERVAL):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._purge_lock = threading.Lock()
+        self._next_purge = 0.0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connect().execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace  TEXT NOT NULL,
+                key        TEXT NOT NULL,
+                value      BLOB,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        # Admin purges, replayed by every worker's in-memory tiers (sync_purges)
+        self._connect().execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_purges (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace  TEXT,
+                key_parts  TEXT,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str):
+        """Returns (value_bytes, expires_at) or None when absent/expired."""
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def set(self, namespace: str, key: str, value: bytes, expires_at: float):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, expires_at),
+        )
+        self._maybe_purge()
+
+    def delete(self, namespace: str, key: str):
+        self._connect().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def clear(self, namespace: str):
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+    def purge_expired(self) -> int:
+        conn = self._connect()
+        cur = conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),))
+        conn.execute("DELETE FROM cache_purges WHERE created_at < ?", (time.time() - CACHE_PURGE_LOG_TTL,))
+        return cur.rowcount
+
+    def record_purge(self, namespace: Optional[str], key_parts=None) -> int:
+        """Log a purge (namespace None = every cache) and return its id."""
+        cur = self._connect().execute(
+            "INSERT INTO cache_purges (namespace, key_parts, created_at) VALUES (?, ?, ?)",
+            (namespace, None if key_parts is None else json.dumps(key_parts), time.time()),
+        )
+        return cur.lastrowid
+
+    def last_purge_id(self) -> int:
+        return self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM cache_purges").fetchone()[0]
+
+    def purges_since(self, last_id: int):
+        """[(id, namespace, key_parts)] logged after last_id, oldest first."""
+        rows = self._connect().execute(
+            "SELECT id, namespace, key_parts FROM cache_purges WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+        return [(row_id, namespace, None if key is None else json.loads(key)) for row_id, namespace, key in rows]
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now < self._next_purge or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_purge = now + self.purge_interval
+            removed = self.purge_expired()
+            if removed:
+                print(f"[CACHE] purged {removed} expired durable entries")
+        except Exception as e:
+            print(f"[CACHE] purging expired durable entries failed: {e}")
+        finally:
+            self._purge_lock.release()
+
+
+_durable_store = None
+_durable_lock = threading.Lock()
+
+
+def get_durable_store() -> Optional[SQLiteCache]:
+    """Process-wide SQLite tier, or None when disabled or unavailable."""
+    global _durable_store
+    if not CACHE_DURABLE_ENABLED:
+        return None
+    if _durable_store is None:
+        with _durable_lock:
+            if _durable_store is None:
+                try:
+                    _durable_store = SQLiteCache(CACHE_DB_PATH)
+                except Exception as e:
+                    print(f"[CACHE] durable tier unavailable ({CACHE_DB_PATH}): {e}")
+                    return None
+    return _durable_store
+
+
+def _json_dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(raw: bytes):
+    return json.loads(raw)
+
+
+class TieredCache:
+    """
+    In-process LRU tier in front of the shared SQLite tier.
+
+    Args:
+        namespace: Logical cache name; also used for stats and purging.
+        maxsize: Max entries held in memory.
+        ttl: Seconds a value stays fresh.
+        negative_ttl: TTL used for "empty" values (see is_negative); defaults to ttl.
+        durable: Also read/write the SQLite tier.
+        dumps/loads: Codec for the durable tier (JSON by default).
+        is_negative: Predicate deciding whether a value is a negative result.
+    """
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float = 3600,
+                 negative_ttl: Optional[float] = None, durable: bool = True,
+                 dumps: Callable[[Any], bytes] = _json_dumps,
+                 loads: Callable[[bytes], Any] = _json_loads,
+                 is_negative: Callable[[Any], bool] = lambda value: not value):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.durable = durable
+        self._dumps = dumps
+        self._loads = loads
+        self._is_negative = is_negative
+        self._lock = threading.Lock()
+        self.durable_hits = 0
+        self.negative_hits = 0
+        self.sets = 0
+        register_cache(self)
+
+    def _store(self):
+        return get_durable_store() if self.durable else None
+
+    def get(self, key: str, default=MISS):
+        value = self.memory.get(key)
+        if value is MISS:
+            store = self._store()
+            if store is not None:
+                try:
+                    row = store.get(self.namespace, key)
+                except Exception as e:
+                    print(f"[CACHE] {self.namespace} durable read failed: {e}")
+                    row = None
+                if row is not None:
+                    value = self._loads(row[0])
+                    # Promote into memory, keeping the durable expiry
+                    self.memory.set(key, value, expires_at=row[1])
+                    with self._lock:
+                        self.durable_hits += 1
+        if value is MISS:
+            return default
+        if self._is_negative(value):
+            with self._lock:
+                self.negative_hits += 1
+        return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        if ttl is None:
+            ttl = self.negative_ttl if self._is_negative(value) else self.ttl
+        expires_at = time.time() + ttl
+        self.memory.set(key, value, expires_at=expires_at)
+        with self._lock:
+            self.sets += 1
+        store = self._store()
+        if store is not None:
+            try:
+                store.set(self.namespace, key, self._dumps(value), expires_at)
+            except Exception as e:
+                print(f"[CACHE] {self.namespace} durable write failed: {e}")
+
+    def delete(self, key: str, local_only: bool = False):
+        """Drop key; local_only keeps the shared SQLite row (see sync_purges)."""
+        self.memory.delete(key)
+        store = None if local_only else self._store()
+        if store is not None:
+            store.delete(self.namespace, key)
+
+    def clear(self, local_only: bool = False):
+        self.memory.clear()
+        store = None if local_only else self._store()
+        if store is not None:
+            store.clear(self.namespace)
+
+    def stats(self) -> Dict:
+        memory = self.memory.stats()
+        misses = memory["misses"] - self.durable_hits
+        hits = memory["hits"] + self.durable_hits
+        lookups = hits + misses
+        return {
+            "namespace": self.namespace,
+            "memory": memory,
+            "durable_hits": self.durable_hits,
+            "negative_hits": self.negative_hits,
+            "hits": hits,
+            "misses": misses,
+            "sets": self.sets,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class StaleWhileRevalidateCache:
+    """
+    Keyed response cache with stale-while-revalidate and single-flight loads.
+
+    Entries are fresh for `ttl` seconds. For a further `stale_ttl` seconds the
+    cached copy is still served while one background refresh replaces it.
+    Concurrent misses for the same key share a single upstream call. Loader
+    exceptions are never cached; they propagate to every waiting caller.
+
+    Args:
+        namespace: Logical cache name (stats, purging, durable tier).
+        ttl: Seconds an entry is served without refreshing.
+        stale_ttl: Extra seconds a stale entry may be served while refreshing.
+        maxsize: Max entries held in memory.
+        durable: Also persist entries in the shared SQLite tier.
+        refresh_workers: Threads running background refreshes.
+    """
+
+    def __init__(self, namespace: str, ttl: float = 600, stale_ttl: float = 3600,
+                 maxsize: int = 512, durable: bool = True, refresh_workers: int = 2):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._cache = TieredCache(namespace, maxsize=maxsize, ttl=ttl + stale_ttl,
+                                  durable=durable, is_negative=lambda entry: False)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers,
+                                             thread_name_prefix=f"swr-{namespace}")
+        self._stats = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+                       "refreshes": 0, "refresh_errors": 0}
+        register_cache(self)
+
+    def _incr(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _load(self, key: str, loader: Callable[[], Any]) -> Future:
+        """Start (or join) the single in-flight load for key."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future
+            future = Future()
+            self._inflight[key] = future
+        try:
+            value = loader()
+            self._cache.set(key, {"fresh_until": time.time() + self.ttl, "value": value})
+            future.set_result(value)
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future
+
+    def _refresh(self, key: str, loader: Callable[[], Any]):
+        self._incr("refreshes")
+        try:
+            self._load(key, loader).result()
+        except Exception as e:
+            self._incr("refresh_errors")
+            print(f"[CACHE] {self.namespace} background refresh failed: {e}")
+
+    def get_or_load(self, key_parts, loader: Callable[[], Any]):
+        """
+        Return the cached value for key_parts, loading it with `loader` on a miss.
+
+        Args:
+            key_parts: JSON-serialisable tuple identifying the request.
+            loader: Zero-argument callable producing a fresh value.
+        """
+        key = make_key(*key_parts)
+        entry = self._cache.get(key)
+        if entry is not MISS:
+            if time.time() < entry["fresh_until"]:
+                self._incr("fresh_hits")
+            else:
+                self._incr("stale_hits")
+                with self._lock:
+                    refreshing = key in self._inflight
+                if not refreshing:
+                    self._refresher.submit(self._refresh, key, loader)
+            return entry["value"]
+
+        self._incr("misses")
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            self._incr("coalesced")
+            return future.result()
+        return self._load(key, loader).result()
+
+    def purge(self, key_parts=None, local_only: bool = False):
+        """Drop one entry (by key parts) or, with no key, every entry."""
+        if key_parts is None:
+            self._cache.clear(local_only=local_only)
+        else:
+            self._cache.delete(make_key(*key_parts), local_only=local_only)
+
+    def clear(self, local_only: bool = False):
+        self.purge(local_only=local_only)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["inflight"] = len(self._inflight)
+        hits = stats["fresh_hits"] + stats["stale_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return {**self._cache.stats(), "swr": stats, "ttl": self.ttl, "stale_ttl": self.stale_ttl}
+
+
+# Registry so operational endpoints can report on / purge every cache.
+# Registered caches provide namespace, stats() and clear(local_only=False);
+# local_only drops in-process entries but leaves the shared SQLite tier alone.
+_registry: Dict[str, Any] = {}
+
+
+def register_cache(cache):
+    _registry[cache.namespace] = cache
+
+
+def all_cache_stats() -> Dict[str, Dict]:
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def get_registered_cache(namespace: str):
+    return _registry.get(namespace)
+
+
+def registered_cache_names():
+    return list(_registry)
+
+
+def _purge_local(namespace: Optional[str], key_parts=None, local_only: bool = False):
+    names = [namespace] if namespace else registered_cache_names()
+    for name in names:
+        cache = _registry.get(name)
+        if cache is None:
+            continue
+        if key_parts is not None and hasattr(cache, "purge"):
+            cache.purge(key_parts, local_only=local_only)
+        elif key_parts is None:
+            cache.clear(local_only=local_only)
+
+
+_purge_sync = {"last_id": None, "next_check": 0.0, "own": set()}
+_purge_sync_lock = threading.Lock()
+
+
+def purge_caches(namespace: Optional[str] = None, key_parts=None):
+    """
+    Purge one cache (optionally one key of it) or every cache, in this
+    worker and - through the purge log in the shared SQLite file - in every
+    other worker on the host, which replay it within CACHE_PURGE_POLL_SECONDS.
+    """
+    _purge_local(namespace, key_parts)
+    store = get_durable_store()
+    if store is None:
+        return
+    try:
+        purge_id = store.record_purge(namespace, key_parts)
+    except Exception as e:
+        print(f"[CACHE] recording purge for other workers failed: {e}")
+        return
+    with _purge_sync_lock:
+        _purge_sync["own"].add(purge_id)
+
+
+def sync_purges(force: bool = False) -> int:
+    """
+    Replay purges other workers logged since the last check (at most every
+    CACHE_PURGE_POLL_SECONDS unless forced). Returns the number applied.
+    """
+    now = time.time()
+    if not force and now < _purge_sync["next_check"]:
+        return 0
+    store = get_durable_store()
+    if store is None:
+        return 0
+    with _purge_sync_lock:
+        if not force and now < _purge_sync["next_check"]:
+            return 0
+        _purge_sync["next_check"] = now + CACHE_PURGE_POLL_SECONDS
+        try:
+            if _purge_sync["last_id"] is None:
+                # Nothing is cached in memory yet, so older purges do not matter
+                _purge_sync["last_id"] = store.last_purge_id()
+                return 0
+            purges = store.purges_since(_purge_sync["last_id"])
+        except Exception as e:
+            print(f"[CACHE] reading the purge log failed: {e}")
+            return 0
+        if purges:
+            _purge_sync["last_id"] = purges[-1][0]
+        own = _purge_sync["own"]
+        purges = [purge for purge in purges if purge[0] not in own]
+        own.difference_update([purge_id for purge_id in own if purge_id <= _purge_sync["last_id"]])
+
+    # The purging worker already cleared the shared SQLite tier; clearing it
+    # again here would drop rows other workers wrote since
+    for _, namespace, key_parts in purges:
+        _purge_local(namespace, key_parts, local_only=True)
+    if purges:
+        print(f"[CACHE] applied {len(purges)} purges from other workers")
+    return len(purges)
@@ -0,0 +1,233 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+# Pool configuration (per worker process, per DSN)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "10"))
+# Connections idle for longer than this are pinged before being handed out
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no connection could be checked out within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe Postgres connection pool with bounded size, health checks on
+    checkout, a server-side statement timeout and simple usage metrics.
+
+    Connections are opened lazily, so a freshly forked worker only connects
+    when it serves its first DB request instead of all workers connecting at
+    once on boot.
+    """
+
+    def __init__(self, dsn: str, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+                 connect_timeout: int = DB_CONNECT_TIMEOUT,
+                 checkout_timeout: float = DB_POOL_CHECKOUT_TIMEOUT):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.checkout_timeout = checkout_timeout
+        self._connect_kwargs = {
+            "connect_timeout": connect_timeout,
+            "options": f"-c statement_timeout={int(statement_timeout_ms)}",
+        }
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises instead of waiting when it is full,
+        # so the semaphore makes callers queue for a free slot instead.
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._last_used = {}
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "checkouts": 0,
+            "checkout_wait_ms_total": 0.0,
+            "checkout_timeouts": 0,
+            "healthcheck_failures": 0,
+            "discarded": 0,
+            "errors": 0,
+            "in_use": 0,
+        }
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = pg_pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, self.dsn, **self._connect_kwargs
+                    )
+        return self._pool
+
+    def _incr(self, key, amount=1):
+        with self._metrics_lock:
+            self._metrics[key] += amount
+
+    def _is_healthy(self, conn) -> bool:
+        """Cheap liveness check; only pings connections that sat idle for a while."""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_IDLE:
+            # Freshly opened or recently used
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        """Check out a healthy connection, waiting up to checkout_timeout for a free slot."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            self._incr("checkout_timeouts")
+            raise PoolExhaustedError(
+                f"No DB connection available after {self.checkout_timeout}s (max={self.maxconn})"
+            )
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                self._incr("healthcheck_failures")
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        except Exception:
+            self._slots.release()
+            self._incr("errors")
+            raise
+
+        with self._metrics_lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["in_use"] += 1
+            self._metrics["checkout_wait_ms_total"] += (time.monotonic() - started) * 1000
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, resetting any open transaction."""
+        try:
+            if not discard and not conn.closed:
+                try:
+                    if conn.status != psycopg2.extensions.STATUS_READY:
+                        conn.rollback()
+                    if conn.autocommit:
+                        conn.autocommit = False
+                except Exception:
+                    discard = True
+            if discard or conn.closed:
+                self._incr("discarded")
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._get_pool().putconn(conn, close=discard or bool(conn.closed))
+        finally:
+            with self._metrics_lock:
+                self._metrics["in_use"] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding a pooled connection.
+
+        The caller is responsible for committing writes; any exception rolls
+        the transaction back, and broken connections are discarded.
+        """
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except psycopg2.InterfaceError:
+            discard = True
+            raise
+        except psycopg2.OperationalError:
+            # Server went away / statement timeout - don't reuse a suspect socket
+            discard = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self) -> Dict:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        checkouts = metrics["checkouts"] or 1
+        metrics["avg_checkout_wait_ms"] = round(metrics.pop("checkout_wait_ms_total") / checkouts, 3)
+        metrics["min"] = self.minconn
+        metrics["max"] = self.maxconn
+        metrics["open"] = len(self._last_used)
+        return metrics
+
+    def closeall(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: Optional[str] = None) -> ConnectionPool:
+    """
+    Return the process-wide pool for the given DSN (defaults to DB_URL).
+
+    Pools are keyed by PID as well, so a worker forked from a parent that
+    already had a pool never shares the parent's sockets.
+    """
+    dsn = dsn or os.getenv("DB_URL")
+    if not dsn:
+        raise RuntimeError("DB_URL is not configured")
+    key = (os.getpid(), dsn)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(dsn)
+                _pools[key] = pool
+    return pool
+
+
+@contextmanager
+def db_connection(dsn: Optional[str] = None):
+    """Shortcut for `get_pool(dsn).connection()`."""
+    with get_pool(dsn).connection() as conn:
+        yield conn
+
+
+def pool_stats() -> Dict[str, Dict]:
+    """Metrics for every pool owned by this worker, keyed by database host/name."""
+    stats = {}
+    pid = os.getpid()
+    for (owner_pid, dsn), pool in list(_pools.items()):
+        if owner_pid != pid:
+            continue
+        stats[_describe_dsn(dsn)] = pool.stats()
+    return stats
+
+
+def _describe_dsn(dsn: str) -> str:
+    """Strip credentials from a DSN so it can be shown in metrics."""
+    if "@" in dsn:
+        return dsn.split("@", 1)[1]
+    return dsn
@@ -1,9 +1,103 @@
-import PIL.Image
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
 from utils import generate_food_or_ingredients_in_image
 
+# Images analysed in parallel per batch request (each is one vision-model call)
+DETECT_BATCH_CONCURRENCY = int(os.getenv("DETECT_BATCH_CONCURRENCY", "4"))
+# Largest number of images accepted in one batch request
+DETECT_BATCH_MAX_IMAGES = int(os.getenv("DETECT_BATCH_MAX_IMAGES", "10"))
+# Largest single image accepted by every upload route; the batch route's request
+# size cap (DETECT_BATCH_MAX_UPLOAD_MB in app.py) defaults to a full batch of these
+DETECT_MAX_IMAGE_MB = float(os.getenv("DETECT_MAX_IMAGE_MB", "8"))
+
 
-def detect_items(image_path):
-    img = PIL.Image.open(image_path)
-    result = generate_food_or_ingredients_in_image(img)
+def detect_items(image):
+    """
+    Detect food or ingredients in an image.
+
+    Args:
+        image: Raw bytes, a file-like object, a path or a PIL image. Uploads
+            are passed as bytes so they never touch disk.
+    """
+    # Preprocessing (EXIF orientation, downscale, re-encode) happens in
+    # generate_food_or_ingredients_in_image via tools.image_preprocess
+    result = generate_food_or_ingredients_in_image(image)
     return result
 
+
+def ingredient_names(detected) -> List[str]:
+    """Ingredient names from a detect_items result (names or dicts with a 'name' key)."""
+    if not isinstance(detected, dict) or not isinstance(detected.get("ingredients"), list):
+        return []
+    names = []
+    for item in detected["ingredients"]:
+        if isinstance(item, dict):
+            item = item.get("name")
+        if isinstance(item, str) and item.strip():
+            names.append(item.strip())
+    return names
+
+
+def _detect_one(image):
+    try:
+        return detect_items(image)
+    except Exception as e:
+        return {"error": f"Failed to process image: {str(e)}"}
+
+
+def detect_items_batch(images: List, filenames: List[str] = None, concurrency: int = None) -> Dict:
+    """
+    Detect ingredients in several photos (e.g. fridge, freezer and pantry) at once.
+
+    Each image is preprocessed and sent to the vision model on its own worker,
+    at most `concurrency` at a time, so model latency overlaps across images
+    and the per-image result cache still applies. One failed image does not
+    fail the batch.
+
+    Args:
+        images: Images in any form detect_items accepts.
+        filenames: Optional display names, parallel to images.
+        concurrency: Parallel vision calls (defaults to DETECT_BATCH_CONCURRENCY).
+
+    Returns:
+        dict with "ingredients" (merged, deduplicated case-insensitively in
+        first-seen order), "provenance" (ingredient -> indexes of the images
+        it was seen in) and "images" (per-image filename, ingredients or error).
+    """
+    filenames = list(filenames or [])
+    filenames += [f"image_{i}" for i in range(len(filenames), len(images))]
+    concurrency = max(1, min(concurrency or DETECT_BATCH_CONCURRENCY, len(images) or 1))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="detect-batch") as executor:
+        results = list(executor.map(_detect_one, images))
+
+    merged: Dict[str, str] = {}
+    provenance: Dict[str, List[int]] = {}
+    per_image = []
+    for index, (filename, detected) in enumerate(zip(filenames, results)):
+        entry = {"index": index, "filename": filename}
+        if isinstance(detected, dict) and "error" in detected:
+            entry["error"] = detected["error"]
+            per_image.append(entry)
+            continue
+        names = ingredient_names(detected)
+        entry["ingredients"] = names
+        per_image.append(entry)
+        for name in names:
+            key = " ".join(name.lower().split())
+            display = merged.setdefault(key, name)
+            seen_in = provenance.setdefault(display, [])
+            if index not in seen_in:
+                seen_in.append(index)
+
+    print(f"[DETECT] batch of {len(images)} images -> {len(merged)} ingredients "
+          f"in {time.perf_counter() - started:.2f}s (concurrency {concurrency})")
+    return {
+        "ingredients": list(merged.values()),
+        "provenance": provenance,
+        "images": per_image,
+    }
@@ -0,0 +1,512 @@
+import os
+import re
+import time
+import string
+from functools import lru_cache
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bits of the diet_flags bitmask stored on recipes (Postgres column and
+# Pinecone metadata). VEG/VEGAN mark what a recipe is; the rest mark what it contains.
+VEG = 1
+VEGAN = 2
+EGG = 4
+DAIRY = 8
+NUT = 16
+GLUTEN = 32
+
+DIET_FLAGS_CACHE_SIZE = int(os.getenv("DIET_FLAGS_CACHE_SIZE", "65536"))
+
+NON_VEG_KEYWORDS = (
+    "chicken", "mutton", "lamb", "goat", "pork", "beef", "meat", "meatball", "keema",
+    "fish", "prawn", "shrimp", "crab", "lobster", "squid", "octopus", "clam",
+    "salmon", "tuna", "surmai", "pomfret", "rawas", "bangda", "rohu", "hilsa",
+    "egg", "anda", "omelette", "omelet",
+    "bacon", "ham", "sausage", "salami", "pepperoni",
+    "murgh", "gosht", "jhinga", "machhi", "machi", "machli",
+    "tikka chicken", "butter chicken", "tandoori chicken",
+    "rogan josh", "nihari", "haleem", "seekh kabab",
+)
+
+DAIRY_KEYWORDS = (
+    "milk", "buttermilk", "cream", "butter", "ghee", "paneer", "cheese", "curd", "yogurt",
+    "yoghurt", "dahi", "khoya", "mawa", "malai", "whey", "chaas", "lassi", "rabri",
+)
+
+# Animal products that are neither meat, egg nor dairy
+OTHER_ANIMAL_KEYWORDS = ("honey", "gelatin")
+
+# Everything non-vegetarian plus dairy and other animal products
+NON_VEGAN_KEYWORDS = NON_VEG_KEYWORDS + DAIRY_KEYWORDS + OTHER_ANIMAL_KEYWORDS
+
+EGG_KEYWORDS = ("egg", "anda", "omelette", "omelet", "mayonnaise", "mayo", "meringue")
+
+NUT_KEYWORDS = (
+    "nut", "almond", "badam", "cashew", "kaju", "pistachio", "pista", "walnut", "akhrot",
+    "peanut", "groundnut", "moongphali", "hazelnut", "pecan", "macadamia", "pine nut", "chilgoza",
+    "praline", "marzipan",
+)
+
+GLUTEN_KEYWORDS = (
+    "wheat", "atta", "maida", "semolina", "sooji", "suji", "rava", "dalia", "bulgur", "couscous",
+    "barley", "rye", "seitan", "bread", "breadcrumb", "pav", "bun", "naan", "kulcha", "roti",
+    "chapati", "paratha", "puri", "bhatura", "pasta", "spaghetti", "macaroni", "noodle",
+    "vermicelli", "sevai", "all purpose flour", "refined flour", "plain flour",
+)
+
+# Plant-based ingredients whose names contain a dairy word
+VEGAN_PHRASES = (
+    "peanut butter", "cocoa butter", "almond butter", "nut butter",
+    "coconut milk", "coconut cream", "almond milk", "soy milk", "soya milk",
+    "oat milk", "rice milk", "cashew milk", "cashew cream",
+    "vegan butter", "vegan cheese", "vegan cream",
+)
+
+EGGLESS_PHRASES = ("eggless mayonnaise", "eggless mayo", "vegan mayonnaise", "vegan mayo")
+
+GLUTEN_FREE_PHRASES = (
+    "rice noodle", "glass noodle", "rice vermicelli", "rice paper",
+    "gluten free bread", "gluten free pasta", "gluten free flour", "gluten free atta",
+)
+
+
+_WORD = re.compile(r"[^\W\d_]+")
+# Punctuation and digits become spaces, so str.split() yields the words
+_WORD_BREAKS = str.maketrans({c: " " for c in string.punctuation + string.digits})
+# Same, plus whitespace, for the matcher text: words end up separated by runs of spaces
+_SEARCH_BREAKS = str.maketrans({c: " " for c in string.punctuation + string.digits + string.whitespace + "\xa0"})
+# Token placed between fields so phrases never span two ingredients
+_FIELD_BREAK = "\x00"
+_PLURAL_SUFFIXES = ("", "s", "es")
+
+
+def tokenize(dish_name: str, ingredients: Sequence[str] = ()) -> List[str]:
+    """Lowercased words of the dish name and ingredients, fields separated by a break token."""
+    text = f" {_FIELD_BREAK} ".join([dish_name or ""] + [i for i in ingredients if i])
+    return text.lower().translate(_WORD_BREAKS).split()
+
+
+def _search_text(dish_name: str, ingredients: Sequence[str] = ()) -> str:
+    # Lowercased words separated by spaces, every word preceded and followed by one
+    text = f" {_FIELD_BREAK} ".join(filter(None, ingredients))
+    return f" {dish_name or ''} {_FIELD_BREAK} {text} ".lower().translate(_SEARCH_BREAKS)
+
+
+def _forms(word: str) -> Tuple[str, ...]:
+    # The word itself and its singular for a plain "s"/"es" plural
+    if word.endswith("es"):
+        return word, word[:-1], word[:-2]
+    if word.endswith("s"):
+        return word, word[:-1]
+    return (word,)
+
+
+def _spellings(phrases: Iterable[str]) -> List[str]:
+    """
+    Every singular/plural spelling of each phrase, word by word. A recipe
+    word matches a keyword word when the two share a singular form, so
+    "tomatoes" as a keyword still finds "tomato" and vice versa.
+    """
+    spellings = []
+    for phrase in phrases:
+        words = _WORD.findall((phrase or "").lower())
+        if not words:
+            continue
+        options = [sorted({form + suffix for form in _forms(word) for suffix in _PLURAL_SUFFIXES})
+                   for word in words]
+        spellings.extend(" ".join(combo) for combo in product(*options))
+    return spellings
+
+
+def _trie_regex(strings: Iterable[str]) -> str:
+    """
+    Regex alternation for `strings` factored into a prefix trie, so the
+    engine tries each character once per position instead of once per keyword.
+    Alternatives are greedy, so the longest spelling wins ("butter chicken" over "butter").
+    """
+    trie: Dict[str, Dict] = {}
+    for text in strings:
+        node = trie
+        for char in text:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _trie_node(trie)
+
+
+def _trie_node(node: Dict[str, Dict]) -> str:
+    # A space inside a phrase stands for the run of spaces between two words
+    branches = [(" +" if char == " " else re.escape(char)) + _trie_node(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        return (body if len(branches) > 1 else "(?:" + body + ")") + "?"
+    return body
+
+
+class KeywordMatcher:
+    """
+    Word-aware keyword search over a recipe's dish name and ingredients.
+
+    Keywords, with their plural and singular spellings, are compiled into one
+    prefix-trie regex anchored on word starts, so a recipe is scanned once in
+    C whatever the number of keywords. "eggs" therefore matches "egg", while
+    "eggplant", "veggie" and "pandan" do not. Phrases in `allow` are tried
+    first and skipped over, so "peanut butter" does not count as butter.
+    """
+
+    def __init__(self, keywords: Iterable[str], allow: Iterable[str] = ()):
+        self.keywords = tuple(keywords)
+        self.allow = tuple(allow)
+        keyword_re = _trie_regex(_spellings(self.keywords))
+        allow_re = _trie_regex(_spellings(self.allow))
+        self._pattern = re.compile(f" ({keyword_re})(?= )") if keyword_re else None
+        # Only run when a keyword was found, to check it is not inside an allowed phrase
+        self._allow_pattern = re.compile(f" (?:{allow_re}|({keyword_re}))(?= )") if keyword_re and allow_re else None
+
+    def find_text(self, text: str) -> Optional[str]:
+        """First keyword found in _search_text() output, as written in the recipe, or None."""
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(text)
+        if match is None or self._allow_pattern is None:
+            return match.group(1) if match else None
+        # Rescan with allowed phrases tried first at each word and skipped over
+        for match in self._allow_pattern.finditer(text):
+            if match.group(1):
+                return match.group(1)
+        return None
+
+    def find(self, dish_name: str, ingredients: Sequence[str] = ()) -> Optional[str]:
+        return self.find_text(_search_text(dish_name, ingredients))
+
+    def matches(self, dish_name: str, ingredients: Sequence[str] = ()) -> bool:
+        return self.find(dish_name, ingredients) is not None
+
+
+non_veg_matcher = KeywordMatcher(NON_VEG_KEYWORDS)
+dairy_matcher = KeywordMatcher(DAIRY_KEYWORDS, allow=VEGAN_PHRASES)
+other_animal_matcher = KeywordMatcher(OTHER_ANIMAL_KEYWORDS)
+egg_matcher = KeywordMatcher(EGG_KEYWORDS, allow=EGGLESS_PHRASES)
+nut_matcher = KeywordMatcher(NUT_KEYWORDS)
+gluten_matcher = KeywordMatcher(GLUTEN_KEYWORDS, allow=GLUTEN_FREE_PHRASES)
+
+
+@lru_cache(maxsize=256)
+def _disliked_matcher(disliked: Tuple[str, ...]) -> Optional[KeywordMatcher]:
+    return KeywordMatcher(disliked) if disliked else None
+
+
+def disliked_matcher(disliked: Optional[Iterable[str]]) -> Optional[KeywordMatcher]:
+    """Compiled matcher for a user's disliked ingredients, reused across requests with the same list."""
+    terms = tuple(sorted({d.strip().lower() for d in (disliked or []) if d and d.strip()}))
+    return _disliked_matcher(terms)
+
+
+# Internal bits for the categories that only feed VEG/VEGAN
+_NON_VEG = 64
+_OTHER_ANIMAL = 128
+
+_CATEGORY_MATCHERS = (
+    (_NON_VEG, non_veg_matcher),
+    (EGG, egg_matcher),
+    (DAIRY, dairy_matcher),
+    (NUT, nut_matcher),
+    (GLUTEN, gluten_matcher),
+    (_OTHER_ANIMAL, other_animal_matcher),
+)
+
+
+def _spelling_masks() -> Dict[str, int]:
+    # Every keyword and allowed-phrase spelling of every category, mapped to the
+    # categories whose matcher fires on it alone: "butter chicken" is non-veg and
+    # dairy, "peanut butter" only nut.
+    spellings = set()
+    for _, matcher in _CATEGORY_MATCHERS:
+        spellings.update(_spellings(matcher.keywords + matcher.allow))
+    masks = {}
+    for spelling in spellings:
+        text = f" {spelling} "
+        masks[spelling] = sum(bit for bit, matcher in _CATEGORY_MATCHERS if matcher.find_text(text) is not None)
+    return masks
+
+
+_SPELLING_MASKS = _spelling_masks()
+# One scan finds every category: longest spelling at each word, then the masks are OR-ed
+_ALL_SPELLINGS = re.compile(f" ({_trie_regex(_SPELLING_MASKS)})(?= )")
+
+
+@lru_cache(maxsize=DIET_FLAGS_CACHE_SIZE)
+def _diet_flags(dish_name: str, ingredients: Tuple[str, ...]) -> int:
+    found = 0
+    for spelling in _ALL_SPELLINGS.findall(_search_text(dish_name, ingredients)):
+        mask = _SPELLING_MASKS.get(spelling)
+        # Phrases written with more than one space between their words
+        found |= _SPELLING_MASKS[" ".join(spelling.split())] if mask is None else mask
+    flags = found & (EGG | DAIRY | NUT | GLUTEN)
+    if not found & _NON_VEG:
+        flags |= VEG
+        if not found & (EGG | DAIRY | _OTHER_ANIMAL):
+            flags |= VEGAN
+    return flags
+
+
+def diet_flags(dish_name: str, ingredients: Sequence[str] = ()) -> int:
+    """
+    diet_flags bitmask (VEG, VEGAN, EGG, DAIRY, NUT, GLUTEN) for a recipe.
+
+    Memoized on (dish name, ingredients), so recipes seen on earlier pages
+    or requests cost a dict lookup.
+    """
+    return _diet_flags(dish_name or "", tuple(i for i in ingredients if i))
+
+
+def apply_diet_label(flags: int, diet: Optional[str]) -> int:
+    """Clear VEG/VEGAN when a classifier or editor labelled the recipe non-veg."""
+    if normalize_diet(diet) == "non-veg":
+        return flags & ~(VEG | VEGAN)
+    return flags
+
+
+def diet_metadata(flags: int) -> Dict:
+    """Pinecone metadata for a diet_flags value; booleans because Pinecone filters have no bitwise operators."""
+    return {
+        "diet_flags": flags,
+        "is_veg": bool(flags & VEG),
+        "is_vegan": bool(flags & VEGAN),
+        "has_egg": bool(flags & EGG),
+        "has_dairy": bool(flags & DAIRY),
+        "has_nuts": bool(flags & NUT),
+        "has_gluten": bool(flags & GLUTEN),
+    }
+
+
+def normalize_diet(diet: Optional[str]) -> str:
+    """Map the diet spellings used by clients and the query classifier to "veg", "vegan", "non-veg" or ""."""
+    d = (diet or "").strip().lower()
+    if d in ("vegetarian", "veg"):
+        return "veg"
+    if d in ("non-vegetarian", "non-veg", "nonveg", "non vegetarian", "non veg"):
+        return "non-veg"
+    return d
+
+
+def pinecone_diet_filter(diet: Optional[str]) -> Optional[Dict]:
+    """Pinecone metadata filter for a diet, or None when the diet is empty or unknown."""
+    return {
+        "veg": {"is_veg": {"$eq": True}},
+        "vegan": {"is_vegan": {"$eq": True}},
+        "non-veg": {"is_veg": {"$eq": False}},
+    }.get(normalize_diet(diet))
+
+
+# Same predicates as the partial indexes in migrations/0002, so the planner can
+# use them; rows written before diet_flags are filled by migrations/0004
+_DIET_SQL = {
+    "veg": "(diet_flags & 1) = 1",
+    "vegan": "(diet_flags & 2) = 2",
+    "non-veg": "(diet_flags & 1) = 0",
+}
+
+
+def diet_sql_clause(diet: Optional[str]) -> Optional[str]:
+    """
+    WHERE clause on recipes.diet_flags for a diet (matching the partial
+    indexes from migrations/0002), or None when the diet is empty or unknown.
+    """
+    return _DIET_SQL.get(normalize_diet(diet))
+
+
+def classify_recipe(dish_name: str, ingredients: Sequence[str],
+                    disliked: Optional[KeywordMatcher] = None) -> Dict[str, bool]:
+    """
+    Dietary flags for one recipe.
+
+    Returns:
+        dict with "non_veg", "non_vegan" and "disliked" booleans.
+    """
+    flags = diet_flags(dish_name, ingredients)
+    return {
+        "non_veg": not flags & VEG,
+        "non_vegan": not flags & VEGAN,
+        "disliked": bool(disliked and disliked.matches(dish_name, ingredients)),
+    }
+
+
+def classify_recipes(recipes: Iterable[Tuple[str, Sequence[str]]],
+                     disliked: Optional[Iterable[str]] = None) -> List[Dict[str, bool]]:
+    """
+    Classify a page of recipes in one pass.
+
+    Args:
+        recipes: (dish_name, ingredients) pairs.
+        disliked: Disliked ingredient names, compiled once for the whole page.
+
+    Returns:
+        One classify_recipe dict per recipe, in order.
+    """
+    matcher = disliked_matcher(disliked)
+    return [classify_recipe(dish_name, ingredients, matcher) for dish_name, ingredients in recipes]
+
+
+def backfill_recipe_flags(dsn: Optional[str] = None, batch_size: int = 500, recompute: bool = False) -> int:
+    """
+    Compute diet_flags for recipes rows from their title and recipe_ingredients.
+
+    Args:
+        dsn: Postgres DSN (defaults to DB_URL).
+        batch_size: Rows read and updated per round trip.
+        recompute: Also redo rows that already have flags (e.g. after a keyword change).
+
+    Returns:
+        Number of rows updated.
+    """
+    from tools.db import db_connection
+
+    updated, last_id = 0, None
+    while True:
+        with db_connection(dsn) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT r.id, r.title, r.diet,
+                       COALESCE(array_agg(ri.ingredient_name ORDER BY ri.sort_order)
+                                FILTER (WHERE ri.ingredient_name IS NOT NULL), '{}')
+                  FROM recipes r
+                  LEFT JOIN recipe_ingredients ri ON ri.recipe_id = r.id
+                 WHERE (%s OR r.diet_flags IS NULL)
+                   AND (%s::uuid IS NULL OR r.id > %s::uuid)
+                 GROUP BY r.id
+                 ORDER BY r.id
+                 LIMIT %s;
+                """,
+                (recompute, last_id, last_id, batch_size),
+            )
+            rows = cur.fetchall()
+            if rows:
+                cur.executemany(
+                    "UPDATE recipes SET diet_flags = %s WHERE id = %s;",
+                    [(apply_diet_label(diet_flags(title or "", ingredients), diet), recipe_id)
+                     for recipe_id, title, diet, ingredients in rows],
+                )
+                conn.commit()
+            cur.close()
+        if not rows:
+            break
+        updated += len(rows)
+        last_id = str(rows[-1][0])
+        print(f"[DIET] backfilled {updated} recipes")
+    return updated
+
+
+def _substring_match(keywords: Sequence[str], dish_name: str, ingredients: Sequence[str]) -> bool:
+    # The per-keyword, per-ingredient substring scan the matcher replaced; kept for the benchmark
+    name_lower = dish_name.lower()
+    for keyword in keywords:
+        if keyword in name_lower:
+            return True
+    for ing in ingredients:
+        ing_lower = ing.lower()
+        for keyword in keywords:
+            if keyword in ing_lower:
+                return True
+    return False
+
+
+def _fixture(size: int, seed: int = 7) -> List[Tuple[str, List[str]]]:
+    import random
+
+    rng = random.Random(seed)
+    plant = ["Onion", "Tomato", "Ginger Garlic Paste", "Green Chilli", "Jeera", "Turmeric Powder",
+             "Basmati Rice", "Toor Dal", "Potato", "Cauliflower", "Eggplant", "Spinach", "Coriander Leaves",
+             "Mustard Seeds", "Curry Leaves", "Peanut Butter", "Coconut Milk", "Veggie Stock", "Besan",
+             "Salt", "Red Chilli Powder", "Garam Masala", "Lemon Juice", "Atta", "Sugar"]
+    animal = ["Chicken Thighs", "Eggs", "Paneer", "Ghee", "Butter", "Curd", "Mutton", "Prawns", "Fresh Cream"]
+    dishes = ["Aloo Gobi", "Baingan Bharta", "Dal Tadka", "Palak Paneer", "Butter Chicken", "Egg Curry",
+              "Veg Pulao", "Jeera Rice", "Prawn Masala", "Masala Dosa", "Mutton Rogan Josh", "Chana Masala"]
+    fixture = []
+    for _ in range(size):
+        ingredients = rng.sample(plant, rng.randint(6, 14))
+        if rng.random() < 0.4:
+            ingredients.append(rng.choice(animal))
+        fixture.append((rng.choice(dishes), ingredients))
+    return fixture
+
+
+# A long dislike list, where the substring scan's cost per keyword shows
+_MANY_DISLIKED = ["onion", "garlic", "mushroom", "capsicum", "brinjal", "okra", "bitter gourd", "karela",
+                  "beetroot", "radish", "cabbage", "peas", "corn", "coconut", "peanut", "cashew", "almond",
+                  "raisin", "pineapple", "mango", "jackfruit", "tofu", "soy", "mayonnaise", "vinegar"]
+
+
+def benchmark(size: int = 10000, repeat: int = 3, disliked: Sequence[str] = ("onion", "garlic")) -> Dict:
+    """
+    Time classify_recipes against the substring scan on a synthetic fixture
+    of `size` recipes and count where the two disagree.
+
+    "compiled" starts from an empty diet_flags memo, so it includes computing
+    all six flags (the ingest-time cost); "memoized" is the request-time cost
+    once flags are known.
+    """
+    fixture = _fixture(size)
+    disliked = list(disliked)
+
+    def legacy():
+        return [(_substring_match(NON_VEG_KEYWORDS, n, i), _substring_match(NON_VEGAN_KEYWORDS, n, i),
+                 _substring_match(disliked, n, i)) for n, i in fixture]
+
+    def compiled():
+        _diet_flags.cache_clear()
+        return memoized()
+
+    def memoized():
+        return [(c["non_veg"], c["non_vegan"], c["disliked"]) for c in classify_recipes(fixture, disliked)]
+
+    timings = {}
+    for label, run in (("substring", legacy), ("compiled", compiled), ("memoized", memoized)):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = run()
+            best = min(best, time.perf_counter() - started)
+        timings[label] = (best, result)
+
+    legacy_s, legacy_result = timings["substring"]
+    compiled_s, compiled_result = timings["compiled"]
+    memoized_s, _ = timings["memoized"]
+    return {
+        "recipes": size,
+        "disliked_terms": len(disliked),
+        "substring_ms": round(legacy_s * 1000, 1),
+        "compiled_ms": round(compiled_s * 1000, 1),
+        "memoized_ms": round(memoized_s * 1000, 1),
+        # Cold cache against cold cache; memoized_ms is what repeat requests see
+        "speedup": round(legacy_s / compiled_s, 2) if compiled_s else 0.0,
+        # Mostly substring false positives such as "egg" in "eggplant"/"veggie"
+        "disagreements": sum(a != b for a, b in zip(legacy_result, compiled_result)),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the compiled diet matchers against substring scanning")
+    parser.add_argument("-n", "--recipes", type=int, default=10000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--backfill", action="store_true",
+                        help="Compute recipes.diet_flags in Postgres instead of benchmarking")
+    parser.add_argument("--recompute", action="store_true", help="With --backfill, redo rows that already have flags")
+    parser.add_argument("--dsn", default=os.getenv("DB_URL"), help="Postgres DSN (defaults to DB_URL)")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_recipe_flags(args.dsn, recompute=args.recompute)
+        raise SystemExit(0)
+
+    for disliked in (["onion", "garlic"], _MANY_DISLIKED):
+        result = benchmark(args.recipes, args.repeat, disliked)
+        print(f"{result['recipes']} recipes, {result['disliked_terms']} disliked terms: "
+              f"substring {result['substring_ms']}ms, compiled {result['compiled_ms']}ms "
+              f"({result['speedup']}x), memoized {result['memoized_ms']}ms, "
+              f"disagreements {result['disagreements']}")
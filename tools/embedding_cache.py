@@ -0,0 +1,129 @@
+import os
+import threading
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from tools.cache import MISS, TieredCache, make_key, register_cache
+
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600)))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "8192"))
+# Texts per embeddings request when embedding in bulk
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+
+
+def normalize_embedding_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different inputs share a key."""
+    return " ".join((text or "").lower().split())
+
+
+def canonical_ingredients(ingredients) -> str:
+    """
+    Canonical text for an ingredient set: normalised, de-duplicated and sorted,
+    so ["onion", "tomato"], ["Tomato", "onion "] and ["tomato,onion"] embed
+    (and cache) identically.
+
+    Args:
+        ingredients: List of ingredient strings (each may itself be comma
+            separated, as in ?ingredients=tomato,cheese), or one comma
+            separated string.
+
+    Returns:
+        Space separated ingredient text.
+    """
+    if isinstance(ingredients, str):
+        ingredients = [ingredients]
+    items = {
+        normalize_embedding_text(part)
+        for item in ingredients
+        for part in str(item).split(",")
+    }
+    return " ".join(sorted(i for i in items if i))
+
+
+def _to_bytes(vector) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _from_bytes(raw: bytes) -> List[float]:
+    return np.frombuffer(raw, dtype=np.float32).tolist()
+
+
+class EmbeddingCache:
+    """
+    Caching, batching front for a LangChain embeddings object.
+
+    Vectors are keyed on model + normalised text and stored as float32 bytes
+    (6 KB for a 1536-d vector) in both the memory and SQLite tiers. Misses in
+    embed_documents are de-duplicated and sent in batches of
+    EMBEDDING_BATCH_SIZE, so a full re-ingest makes ~N/100 requests.
+    """
+
+    namespace = "embeddings"
+
+    def __init__(self, embeddings, maxsize: int = EMBEDDING_CACHE_SIZE,
+                 ttl: float = EMBEDDING_CACHE_TTL, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.batch_size = max(1, batch_size)
+        self.cache = TieredCache(self.namespace, maxsize=maxsize, ttl=ttl,
+                                 dumps=lambda value: value, loads=bytes,
+                                 is_negative=lambda value: False)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.texts_embedded = 0
+        register_cache(self)
+
+    def _key(self, text: str) -> str:
+        return make_key(self.model, text)
+
+    def _count(self, texts: int):
+        with self._lock:
+            self.requests += 1
+            self.texts_embedded += texts
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single text, reusing a cached vector when available."""
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: Iterable[str]) -> List[List[float]]:
+        """
+        Embed many texts, only sending the ones not cached yet.
+
+        Returns:
+            One vector per input text, in input order.
+        """
+        normalized = [normalize_embedding_text(t) for t in texts]
+        vectors: Dict[str, bytes] = {}
+        missing = []
+        for text in dict.fromkeys(normalized):
+            raw = self.cache.get(self._key(text))
+            if raw is MISS:
+                missing.append(text)
+            else:
+                vectors[text] = raw
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            if len(batch) == 1:
+                embedded = [self.embeddings.embed_query(batch[0])]
+            else:
+                embedded = self.embeddings.embed_documents(batch)
+            self._count(len(batch))
+            for text, vector in zip(batch, embedded):
+                raw = _to_bytes(vector)
+                self.cache.set(self._key(text), raw)
+                vectors[text] = raw
+
+        return [_from_bytes(vectors[text]) for text in normalized]
+
+    def clear(self, local_only: bool = False):
+        self.cache.clear(local_only=local_only)
+
+    def stats(self) -> Dict:
+        return {
+            **self.cache.stats(),
+            "model": self.model,
+            "embedding_requests": self.requests,
+            "texts_embedded": self.texts_embedded,
+        }
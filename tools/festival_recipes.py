@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from tools.festivals import GoogleCalendarFestivalScraper
+from tools.async_runner import ASYNC_RUN_TIMEOUT, run_async
+from tools.tools import get_festival_recipes
+
+FESTIVAL_RECIPES_ENABLED = os.getenv("FESTIVAL_RECIPES_ENABLED", "1").lower() not in ("0", "false", "no")
+FESTIVAL_RECIPES_PATH = os.getenv("FESTIVAL_RECIPES_PATH", str(Path(".cache") / "festival_recipes.json"))
+# How often the precomputed festival -> recipes map is rebuilt in the background
+FESTIVAL_RECIPES_REFRESH_SECONDS = int(os.getenv("FESTIVAL_RECIPES_REFRESH_SECONDS", str(12 * 3600)))
+# First retry delay after a refresh that failed or left festivals unfetched;
+# doubles on every further failure, up to the refresh interval
+FESTIVAL_RECIPES_RETRY_SECONDS = int(os.getenv("FESTIVAL_RECIPES_RETRY_SECONDS", "300"))
+
+
+def festival_key(name: str) -> str:
+    """Normalised lookup key for a festival name."""
+    return " ".join((name or "").lower().split())
+
+
+def calendar_festival_names(years: Iterable[int]) -> List[str]:
+    """Every distinct festival name in the static calendars for the given years."""
+    names = {}
+    for year in years:
+        for festivals in GoogleCalendarFestivalScraper.get_festivals_for_year(year).values():
+            for festival in festivals:
+                name = festival.get("name")
+                if name:
+                    names.setdefault(festival_key(name), name)
+    return list(names.values())
+
+
+def _fetch(names: List[str], timeout=ASYNC_RUN_TIMEOUT) -> Tuple[Dict[str, List[Dict]], Set[str]]:
+    """
+    Fetch recipes for the given festivals on the worker's shared event loop.
+
+    Returns:
+        (festival name -> recipes, names whose searches failed rather than
+        came back empty)
+    """
+    failures = set()
+    fetched = run_async(get_festival_recipes([{"name": name} for name in names], failures=failures),
+                        timeout=timeout)
+    return fetched, failures
+
+
+class FestivalRecipeStore:
+    """
+    Precomputed festival -> recipes map, keyed by normalised festival name.
+
+    The festival calendar is static per year, so recipes for every festival of
+    the current and next year are fetched ahead of time, persisted to
+    FESTIVAL_RECIPES_PATH and rebuilt in the background every
+    FESTIVAL_RECIPES_REFRESH_SECONDS. Festivals missing from the store (e.g. a
+    custom range in another year) are fetched on demand and added to it.
+
+    Festivals whose searches failed (timeouts, upstream errors) are never
+    stored, so they do not pin an empty list for a whole refresh interval;
+    a refresh that had failures is retried after FESTIVAL_RECIPES_RETRY_SECONDS,
+    backing off exponentially.
+    """
+
+    def __init__(self, path: str = FESTIVAL_RECIPES_PATH):
+        self.path = Path(path)
+        self._recipes: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self._next_refresh = 0.0
+        self._failed_refreshes = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._recipes = data["recipes"]
+            self._refreshed_at = float(data["refreshed_at"])
+            self._next_refresh = self._refreshed_at + FESTIVAL_RECIPES_REFRESH_SECONDS
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _save(self):
+        with self._lock:
+            data = {"refreshed_at": self._refreshed_at, "recipes": dict(self._recipes)}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            print(f"[FESTIVAL] could not persist festival recipes: {e}")
+
+    def _store(self, fetched: Dict[str, List[Dict]], failures: Set[str] = frozenset()):
+        with self._lock:
+            for name, recipes in fetched.items():
+                if name not in failures:
+                    self._recipes[festival_key(name)] = recipes
+
+    def _schedule_retry(self):
+        self._failed_refreshes += 1
+        delay = min(FESTIVAL_RECIPES_RETRY_SECONDS * 2 ** (self._failed_refreshes - 1),
+                    FESTIVAL_RECIPES_REFRESH_SECONDS)
+        self._next_refresh = time.time() + delay
+        return delay
+
+    def refresh(self, years: Iterable[int] = None) -> int:
+        """
+        Rebuild the store for every festival in the given years
+        (default: current and next year). Returns the number of festivals stored.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0  # a refresh is already running
+        try:
+            if years is None:
+                this_year = datetime.now().year
+                years = [this_year, this_year + 1]
+            names = calendar_festival_names(years)
+            started = time.monotonic()
+            fetched, failures = _fetch(names, timeout=None)
+            self._store(fetched, failures)
+            if failures:
+                # refreshed_at stays at the last refresh that fetched everything
+                delay = self._schedule_retry()
+                print(f"[FESTIVAL] {len(failures)} festivals failed to fetch; retrying in {delay}s")
+            else:
+                self._failed_refreshes = 0
+                self._refreshed_at = time.time()
+                self._next_refresh = self._refreshed_at + FESTIVAL_RECIPES_REFRESH_SECONDS
+            self._save()
+            stored = len(fetched) - len(failures)
+            print(f"[FESTIVAL] precomputed recipes for {stored} festivals "
+                  f"in {time.monotonic() - started:.1f}s")
+            return stored
+        except Exception as e:
+            delay = self._schedule_retry()
+            print(f"[FESTIVAL] refresh failed: {e}; retrying in {delay}s")
+            return 0
+        finally:
+            self._refresh_lock.release()
+
+    def ensure_fresh(self):
+        """Start a background rebuild when the store is empty, stale or due a retry."""
+        if time.time() < self._next_refresh:
+            return
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self.refresh, daemon=True, name="festival-recipes-refresh").start()
+
+    def get_recipes(self, festivals: List[Dict]) -> Dict[str, List[Dict]]:
+        """
+        Recipes for each festival, keyed by the festival's display name.
+
+        Args:
+            festivals: Festival dicts with a 'name' key, as returned by get_festivals.
+        """
+        return dict(self.iter_recipes(festivals))
+
+    def iter_recipes(self, festivals: List[Dict]) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Like get_recipes, but yields (festival name, recipes): festivals already
+        in the store straight away, then the ones fetched on demand.
+        """
+        if FESTIVAL_RECIPES_ENABLED:
+            self.ensure_fresh()
+
+        found, missing = [], []
+        with self._lock:
+            for festival in festivals:
+                name = festival.get("name", "")
+                if not name:
+                    continue
+                recipes = self._recipes.get(festival_key(name)) if FESTIVAL_RECIPES_ENABLED else None
+                if recipes is None:
+                    missing.append(name)
+                else:
+                    found.append((name, recipes))
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        yield from found
+        if missing:
+            fetched, failures = _fetch(list(dict.fromkeys(missing)))
+            if FESTIVAL_RECIPES_ENABLED:
+                self._store(fetched, failures)
+            yield from fetched.items()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "festivals": len(self._recipes),
+            "refreshed_at": self._refreshed_at,
+            "next_refresh": self._next_refresh,
+            "failed_refreshes": self._failed_refreshes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+festival_recipe_store = FestivalRecipeStore()
+
+
+if __name__ == "__main__":
+    # Rebuild the store ahead of deploys: python -m tools.festival_recipes
+    festival_recipe_store.refresh()
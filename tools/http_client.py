@@ -0,0 +1,142 @@
+import os
+import random
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Timeouts for IFN / recipe-page requests (seconds)
+IFN_HTTP_CONNECT_TIMEOUT = float(os.getenv("IFN_HTTP_CONNECT_TIMEOUT", "3.05"))
+IFN_HTTP_READ_TIMEOUT = float(os.getenv("IFN_HTTP_READ_TIMEOUT", "20"))
+# Retries on connection errors and 429/5xx, with jittered exponential backoff
+IFN_HTTP_RETRIES = int(os.getenv("IFN_HTTP_RETRIES", "3"))
+IFN_HTTP_BACKOFF = float(os.getenv("IFN_HTTP_BACKOFF", "0.3"))
+# Keep-alive connections kept open per host
+IFN_HTTP_POOL_SIZE = int(os.getenv("IFN_HTTP_POOL_SIZE", "32"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _accept_encoding() -> str:
+    """Advertise brotli only when a decoder is installed (requests/aiohttp use it automatically)."""
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            return "gzip, deflate, br"
+        except ImportError:
+            return "gzip, deflate"
+
+
+ACCEPT_ENCODING = _accept_encoding()
+
+# ---------- sync face ----------
+
+_sessions: Dict[int, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide requests.Session with a keep-alive pool, retries and
+    compression. Keyed by PID so forked workers never share sockets.
+    """
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(pid)
+            if session is None:
+                retry = Retry(
+                    total=IFN_HTTP_RETRIES,
+                    connect=IFN_HTTP_RETRIES,
+                    read=IFN_HTTP_RETRIES,
+                    status=IFN_HTTP_RETRIES,
+                    backoff_factor=IFN_HTTP_BACKOFF,
+                    backoff_jitter=IFN_HTTP_BACKOFF,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset({"GET", "HEAD"}),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=IFN_HTTP_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Accept-Encoding": ACCEPT_ENCODING, "Connection": "keep-alive"})
+                _sessions[pid] = session
+    return session
+
+
+def ifn_get(url: str, **kwargs) -> requests.Response:
+    """
+    GET through the shared session with default connect/read timeouts.
+
+    Accepts the same keyword arguments as requests.get.
+    """
+    kwargs.setdefault("timeout", (IFN_HTTP_CONNECT_TIMEOUT, IFN_HTTP_READ_TIMEOUT))
+    return get_session().get(url, **kwargs)
+
+
+# ---------- async face ----------
+
+# One ClientSession per event loop: aiohttp sessions are bound to the loop they were created on
+_async_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def get_async_session() -> aiohttp.ClientSession:
+    """Shared aiohttp session for the running event loop (keep-alive pool + DNS cache)."""
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=IFN_HTTP_POOL_SIZE,
+            limit_per_host=IFN_HTTP_POOL_SIZE,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=IFN_HTTP_CONNECT_TIMEOUT + IFN_HTTP_READ_TIMEOUT,
+            sock_connect=IFN_HTTP_CONNECT_TIMEOUT,
+            sock_read=IFN_HTTP_READ_TIMEOUT,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"Accept-Encoding": ACCEPT_ENCODING},
+        )
+        _async_sessions[loop] = session
+    return session
+
+
+async def async_get_json(url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+                         retries: int = IFN_HTTP_RETRIES) -> Tuple[int, Any]:
+    """
+    GET a JSON endpoint on the shared session, retrying connection errors,
+    timeouts and 429/5xx responses with jittered exponential backoff.
+
+    Returns:
+        (status, parsed JSON) - the JSON is None for non-200 responses.
+    """
+    session = get_async_session()
+    for attempt in range(retries + 1):
+        try:
+            async with session.get(url, params=params, headers=headers) as response:
+                if response.status in RETRY_STATUSES and attempt < retries:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history, status=response.status
+                    )
+                if response.status != 200:
+                    return response.status, None
+                return response.status, await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(IFN_HTTP_BACKOFF * (2 ** attempt) + random.uniform(0, IFN_HTTP_BACKOFF))
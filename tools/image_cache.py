@@ -0,0 +1,125 @@
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+from PIL import Image
+
+from tools.cache import MISS, register_cache
+
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", str(24 * 3600)))
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "1024"))
+# Max differing bits (out of 64) for two photos to count as the same shot
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "6"))
+
+
+def dhash(img: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash: shrink to (hash_size+1) x hash_size greyscale and record
+    whether each pixel is brighter than its right neighbour. Re-encodes,
+    small crops and exposure changes flip only a few of the 64 bits.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ImageResultCache:
+    """
+    Detection results keyed by perceptual hash.
+
+    A lookup returns the entry whose hash is closest to the query, as long as
+    it is within `max_distance` bits, so a retried or re-shot photo of the same
+    fridge reuses the earlier vision-model answer. Entries expire after `ttl`
+    and the least recently used ones are evicted beyond `maxsize`.
+    """
+
+    namespace = "image_ingredients"
+
+    def __init__(self, maxsize: int = IMAGE_CACHE_SIZE, ttl: float = IMAGE_CACHE_TTL,
+                 max_distance: int = IMAGE_CACHE_MAX_DISTANCE):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        register_cache(self)
+
+    def get(self, image_hash: int, default=MISS) -> Any:
+        if not IMAGE_CACHE_ENABLED:
+            return default
+        now = time.time()
+        with self._lock:
+            best_key, best_distance = None, self.max_distance + 1
+            if image_hash in self._data:
+                best_key, best_distance = image_hash, 0
+            else:
+                # Linear scan: a few thousand XOR/popcounts take well under a millisecond
+                for key in self._data:
+                    distance = hamming(key, image_hash)
+                    if distance < best_distance:
+                        best_key, best_distance = key, distance
+            if best_key is not None:
+                value, expires_at = self._data[best_key]
+                if expires_at < now:
+                    del self._data[best_key]
+                    best_key = None
+            if best_key is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(best_key)
+            if best_distance == 0:
+                self.exact_hits += 1
+            else:
+                self.near_hits += 1
+            return copy.deepcopy(value)
+
+    def set(self, image_hash: int, value: Any, ttl: float = None):
+        if not IMAGE_CACHE_ENABLED:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[image_hash] = (copy.deepcopy(value), expires_at)
+            self._data.move_to_end(image_hash)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, local_only: bool = False):
+        # In-process only, so local_only makes no difference
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "max_distance": self.max_distance,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+image_result_cache = ImageResultCache()
@@ -0,0 +1,143 @@
+import io
+import os
+import base64
+import time
+from typing import Dict, Tuple
+
+from PIL import Image, ImageOps
+
+from tools.image_cache import dhash
+
+# Longest edge sent to the vision model; larger photos are downscaled
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+# JPEG or WEBP
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+# "auto" picks "low" for images whose longest edge is <= IMAGE_LOW_DETAIL_MAX_EDGE
+IMAGE_DETAIL = os.getenv("IMAGE_DETAIL", "auto").lower()
+IMAGE_LOW_DETAIL_MAX_EDGE = int(os.getenv("IMAGE_LOW_DETAIL_MAX_EDGE", "512"))
+# Smallest edge JPEGs are decoded at when only the perceptual hash is needed
+HASH_DRAFT_EDGE = 128
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def load_image(source) -> Tuple[Image.Image, int]:
+    """
+    Open an image from a path, raw bytes, a file-like object or a PIL image.
+
+    Returns:
+        (PIL image, size of the original encoded image in bytes or 0 if unknown)
+    """
+    if isinstance(source, Image.Image):
+        filename = getattr(source, "filename", "")
+        return source, os.path.getsize(filename) if filename and os.path.exists(filename) else 0
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source)), len(source)
+    if isinstance(source, str):
+        return Image.open(source), os.path.getsize(source)
+    if hasattr(source, "read"):
+        data = source.read()
+        return Image.open(io.BytesIO(data)), len(data)
+    raise ValueError("Unsupported image type")
+
+
+def image_bytes(source):
+    """Raw bytes for file-like sources, so they can be opened more than once; other sources unchanged."""
+    if not isinstance(source, (bytes, bytearray, str, Image.Image)) and hasattr(source, "read"):
+        return source.read()
+    return source
+
+
+def image_hash(source) -> int:
+    """
+    Perceptual hash of an upload, computed without the full pipeline:
+    JPEGs are decoded straight to greyscale at 1/2-1/8 scale (Image.draft),
+    and nothing is resized to max_edge or re-encoded. Used to look up the
+    detection cache before paying for prepare_image.
+
+    A PIL image passed in is the caller's own object, which prepare_image
+    may use next, so it is hashed as is rather than drafted in place.
+    """
+    img, _ = load_image(source)
+    if not isinstance(source, Image.Image):
+        img.draft("L", (HASH_DRAFT_EDGE, HASH_DRAFT_EDGE))
+    return dhash(ImageOps.exif_transpose(img))
+
+
+def prepare_image(source, max_edge: int = None, image_format: str = None,
+                  quality: int = None, detail: str = None, hash_value: int = None) -> Dict:
+    """
+    Normalise an upload for the vision model: apply the EXIF orientation,
+    downscale to max_edge, re-encode as JPEG/WebP and pick the detail level.
+
+    Args:
+        source: Path, bytes, file-like object or PIL image.
+        max_edge: Longest edge in pixels (defaults to IMAGE_MAX_EDGE).
+        image_format: "JPEG" or "WEBP" (defaults to IMAGE_FORMAT).
+        quality: Encoder quality 1-100 (defaults to IMAGE_QUALITY).
+        detail: "auto", "low" or "high" (defaults to IMAGE_DETAIL).
+        hash_value: dHash already computed with image_hash (skips recomputing it).
+
+    Returns:
+        dict with "base64", "mime_type", "detail", "width", "height",
+        "original_bytes", "encoded_bytes", "encode_ms" and "dhash" (64-bit
+        perceptual hash of the oriented image, see image_hash).
+    """
+    max_edge = max_edge or IMAGE_MAX_EDGE
+    image_format = (image_format or IMAGE_FORMAT).upper()
+    if image_format not in _MIME_TYPES:
+        image_format = "JPEG"
+    quality = quality or IMAGE_QUALITY
+    detail = (detail or IMAGE_DETAIL).lower()
+
+    started = time.perf_counter()
+    img, original_bytes = load_image(source)
+    original_size = img.size
+
+    # Phone photos are usually stored sideways with an EXIF rotation flag
+    img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if max(img.size) > max_edge:
+        img = img.copy()
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if image_format == "WEBP":
+        img.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    encoded = buffer.getvalue()
+    encode_ms = (time.perf_counter() - started) * 1000
+
+    if detail == "auto":
+        detail = "low" if max(img.size) <= IMAGE_LOW_DETAIL_MAX_EDGE else "high"
+
+    saved = original_bytes - len(encoded) if original_bytes else 0
+    print(f"[IMAGE] {original_size[0]}x{original_size[1]} {original_bytes}B -> "
+          f"{img.size[0]}x{img.size[1]} {len(encoded)}B {image_format} "
+          f"(saved {saved}B), encode {encode_ms:.1f}ms, detail={detail}")
+
+    return {
+        "base64": base64.b64encode(encoded).decode("utf-8"),
+        "mime_type": _MIME_TYPES[image_format],
+        "detail": detail,
+        "width": img.size[0],
+        "height": img.size[1],
+        "original_bytes": original_bytes,
+        "encoded_bytes": len(encoded),
+        "encode_ms": round(encode_ms, 1),
+        "dhash": dhash(img) if hash_value is None else hash_value,
+    }
+
+
+def image_content_part(prepared: Dict) -> Dict:
+    """OpenAI chat `image_url` content part for a prepared image."""
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{prepared['mime_type']};base64,{prepared['base64']}",
+            "detail": prepared["detail"],
+        },
+    }
@@ -0,0 +1,340 @@
+import os
+import json
+import hashlib
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+from tools.http_client import ifn_get
+from tools.recipe_store import recipe_detail_store
+from tools.tools import build_recipe_record, embedding_cache, fetch_youtube_link, index
+
+IFN_CONTENT_API_URL = os.getenv("IFN_CONTENT_API_URL", "https://indiafoodnetwork.in/dev/h-api/content")
+INGEST_PAGE_SIZE = int(os.getenv("INGEST_PAGE_SIZE", "20"))
+# Pages requested concurrently per wave
+INGEST_PAGE_WORKERS = int(os.getenv("INGEST_PAGE_WORKERS", "5"))
+# Concurrent recipe-page scrapes for the YouTube iframe
+INGEST_SCRAPE_WORKERS = int(os.getenv("INGEST_SCRAPE_WORKERS", "16"))
+INGEST_UPSERT_BATCH = int(os.getenv("INGEST_UPSERT_BATCH", "100"))
+INGEST_HTTP_TIMEOUT = float(os.getenv("INGEST_HTTP_TIMEOUT", "15"))
+INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", str(Path(".cache") / "ingest_checkpoint.json"))
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", str(Path(".cache") / "ingest_manifest.json"))
+# Bump whenever the stored metadata/vector layout changes so the next delta
+# sync re-upserts every recipe
+METADATA_VERSION = 4  # 2: diet flags, 3: recipe_type / preparation_time / cuisine, 4: recipe detail store
+
+STAGES = ("fetch", "scrape", "embed", "upsert")
+
+
+def content_hash(record: Dict) -> str:
+    """
+    Hash of everything stored for a recipe that comes from the content API
+    (ingredients, steps, story, name, URL, image) plus METADATA_VERSION.
+    The scraped YouTube link is not part of it, so unchanged recipes are not
+    re-scraped.
+    """
+    stored = {**record.get("details", {}), **record["metadata"]}
+    metadata = {k: v for k, v in stored.items() if k != "recipe_youtube_link"}
+    raw = json.dumps([METADATA_VERSION, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """Local sanitized_id -> content hash map of what the index currently holds."""
+
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        self.path = Path(path)
+        try:
+            self.hashes: Dict[str, str] = json.loads(self.path.read_text())["recipes"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.hashes = {}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"updated_at": time.time(), "recipes": self.hashes}))
+        tmp.replace(self.path)
+
+
+class IngestResult:
+    """Summaries of the stored recipes (one list per API page) plus run metrics."""
+
+    def __init__(self):
+        self.pages: List[List[Dict]] = []
+        self.start_index = 0
+        self.next_start_index = 0
+        self.completed = False
+        self.delta = False
+        self.unchanged = 0
+        self.deleted = 0
+        self.started = time.monotonic()
+        self._stages = {stage: {"recipes": 0, "seconds": 0.0} for stage in STAGES}
+
+    def record(self, stage: str, recipes: int, started: float):
+        self._stages[stage]["recipes"] += recipes
+        self._stages[stage]["seconds"] += time.monotonic() - started
+
+    @property
+    def recipes(self) -> int:
+        return sum(len(page) for page in self.pages)
+
+    def stats(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        stages = {}
+        for stage, s in self._stages.items():
+            stages[stage] = {
+                "recipes": s["recipes"],
+                "seconds": round(s["seconds"], 2),
+                "recipes_per_sec": round(s["recipes"] / s["seconds"], 2) if s["seconds"] else 0.0,
+            }
+        return {
+            "start_index": self.start_index,
+            "next_start_index": self.next_start_index,
+            "completed": self.completed,
+            "recipes": self.recipes,
+            "delta": self.delta,
+            "unchanged": self.unchanged,
+            "deleted": self.deleted,
+            "elapsed_seconds": round(elapsed, 2),
+            "recipes_per_sec": round(self.recipes / elapsed, 2) if elapsed else 0.0,
+            "embedding_requests": embedding_cache.requests,
+            "stages": stages,
+        }
+
+
+class RecipeIngester:
+    """
+    Pipelined re-ingestion of the IFN recipe catalogue into Pinecone.
+
+    Pages are fetched in concurrent waves of `page_workers`; while one wave is
+    being scraped and embedded the next wave is already downloading. Recipe
+    pages are scraped for their YouTube iframe over the shared keep-alive
+    pool, ingredient texts are embedded in bulk and vectors are upserted
+    `upsert_batch` at a time. After every flushed wave the next startIndex is
+    written to a checkpoint file so an interrupted run can resume.
+
+    In delta mode the catalogue is still walked in full, but only recipes
+    whose content hash differs from the local manifest are scraped, embedded
+    and upserted, and vectors of recipes no longer in the catalogue are
+    deleted once the walk completes.
+    """
+
+    def __init__(self, page_size: int = INGEST_PAGE_SIZE, page_workers: int = INGEST_PAGE_WORKERS,
+                 scrape_workers: int = INGEST_SCRAPE_WORKERS, upsert_batch: int = INGEST_UPSERT_BATCH,
+                 checkpoint_path: str = INGEST_CHECKPOINT_PATH, manifest_path: str = INGEST_MANIFEST_PATH,
+                 timeout: float = INGEST_HTTP_TIMEOUT):
+        self.page_size = page_size
+        self.page_workers = max(1, page_workers)
+        self.scrape_workers = max(1, scrape_workers)
+        self.upsert_batch = max(1, upsert_batch)
+        self.checkpoint_path = Path(checkpoint_path)
+        self.manifest_path = manifest_path
+        self.timeout = timeout
+        self.headers = {"accept": "*/*", "s-id": os.getenv("FETCH_RECIPE_S_ID")}
+
+    # ---------- checkpoints ----------
+
+    def load_checkpoint(self) -> int:
+        try:
+            return int(json.loads(self.checkpoint_path.read_text())["next_start_index"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0
+
+    def save_checkpoint(self, next_start_index: int):
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"next_start_index": next_start_index, "updated_at": time.time()}))
+        tmp.replace(self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        try:
+            self.checkpoint_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    # ---------- stages ----------
+
+    def fetch_page(self, start_index: int) -> Optional[List[Dict]]:
+        """Returns the recipes of one API page, or None when the request failed."""
+        api_url = f"{IFN_CONTENT_API_URL}?startIndex={start_index}&count={self.page_size}"
+        try:
+            response = ifn_get(api_url, headers=self.headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"[INGEST] page {start_index} failed: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"[INGEST] page {start_index} failed with status {response.status_code}")
+            return None
+        return response.json().get("news", [])
+
+    def scrape_link(self, recipe: Dict) -> str:
+        recipe_url = f"https://www.indiafoodnetwork.in{recipe.get('url', '')}"
+        return fetch_youtube_link(recipe_url, timeout=self.timeout) or ""
+
+    def upsert(self, records: List[Dict], result: IngestResult):
+        started = time.monotonic()
+        vectors = embedding_cache.embed_documents([record["text"] for record in records])
+        result.record("embed", len(records), started)
+
+        # Bodies go to the detail store before the slim vectors that refer to them
+        started = time.monotonic()
+        metadata = recipe_detail_store.vector_metadata(records)
+        result.record("upsert", 0, started)
+
+        for i in range(0, len(records), self.upsert_batch):
+            started = time.monotonic()
+            batch = records[i:i + self.upsert_batch]
+            index.upsert([
+                (record["id"], vector, record_metadata)
+                for record, vector, record_metadata in zip(
+                    batch, vectors[i:i + self.upsert_batch], metadata[i:i + self.upsert_batch]
+                )
+            ])
+            result.record("upsert", len(batch), started)
+
+    def delete_missing(self, manifest: IngestManifest, seen: set, result: IngestResult):
+        """Delete vectors whose recipes were not returned by a complete walk."""
+        missing = [recipe_id for recipe_id in manifest.hashes if recipe_id not in seen]
+        for i in range(0, len(missing), 1000):
+            batch = missing[i:i + 1000]
+            index.delete(ids=batch)
+            recipe_detail_store.delete_many(batch)
+            for recipe_id in batch:
+                manifest.hashes.pop(recipe_id, None)
+            result.deleted += len(batch)
+        if missing:
+            print(f"[INGEST] deleted {len(missing)} recipes no longer in the catalogue")
+
+    # ---------- driver ----------
+
+    def run(self, resume: bool = False, start_index: Optional[int] = None, delta: bool = False) -> IngestResult:
+        """
+        Ingest every page from start_index (or the checkpoint when resume=True).
+
+        Args:
+            resume: Continue from the saved checkpoint (ignored in delta mode).
+            start_index: Explicit startIndex to begin at (ignored in delta mode).
+            delta: Only upsert recipes that changed since the last sync and
+                delete the ones that disappeared.
+
+        Returns:
+            IngestResult with per-page summaries and per-stage throughput.
+        """
+        result = IngestResult()
+        result.delta = delta
+        manifest = IngestManifest(self.manifest_path)
+        seen = set()
+        if delta:
+            # Deletions are only safe after walking the whole catalogue
+            start_index = 0
+        elif start_index is None:
+            start_index = self.load_checkpoint() if resume else 0
+        result.start_index = result.next_start_index = start_index
+        print(f"[INGEST] starting {'delta sync' if delta else 'full ingest'} at startIndex={start_index}")
+
+        with ThreadPoolExecutor(self.page_workers, thread_name_prefix="ingest-page") as pages_pool, \
+                ThreadPoolExecutor(self.scrape_workers, thread_name_prefix="ingest-scrape") as scrape_pool:
+
+            def submit_wave(first):
+                started = time.monotonic()
+                starts = [first + i * self.page_size for i in range(self.page_workers)]
+                return started, [(s, pages_pool.submit(self.fetch_page, s)) for s in starts]
+
+            wave = submit_wave(start_index)
+            while wave is not None:
+                fetch_started, futures = wave
+                pages, failed, exhausted = [], False, False
+                for page_start, future in futures:
+                    recipes = future.result()
+                    if recipes is None:
+                        failed = True
+                        break
+                    if not recipes:
+                        exhausted = True
+                        break
+                    pages.append(recipes)
+                result.record("fetch", sum(len(p) for p in pages), fetch_started)
+
+                # Start downloading the next wave while this one is processed
+                wave = None
+                if not failed and not exhausted:
+                    wave = submit_wave(futures[-1][0] + self.page_size)
+
+                if pages:
+                    # Hash before scraping so unchanged recipes skip every later stage
+                    page_items = []
+                    for page in pages:
+                        items = []
+                        for recipe in page:
+                            record = build_recipe_record(recipe)
+                            digest = content_hash(record)
+                            seen.add(record["id"])
+                            if delta and manifest.hashes.get(record["id"]) == digest:
+                                result.unchanged += 1
+                                continue
+                            items.append((recipe, digest))
+                        page_items.append(items)
+                    changed = [item for items in page_items for item in items]
+
+                    started = time.monotonic()
+                    links = list(scrape_pool.map(self.scrape_link, [recipe for recipe, _ in changed]))
+                    result.record("scrape", len(changed), started)
+
+                    records = [build_recipe_record(recipe, link) for (recipe, _), link in zip(changed, links)]
+                    try:
+                        if records:
+                            self.upsert(records, result)
+                    except Exception as e:
+                        print(f"[INGEST] upsert failed at startIndex={result.next_start_index}: {e}")
+                        failed = True
+                        wave = None
+                    else:
+                        for record, (_, digest) in zip(records, changed):
+                            manifest.hashes[record["id"]] = digest
+                        manifest.save()
+                        offset = 0
+                        for items in page_items:
+                            result.pages.append([r["summary"] for r in records[offset:offset + len(items)]])
+                            offset += len(items)
+                        result.next_start_index += len(pages) * self.page_size
+                        if not delta:
+                            self.save_checkpoint(result.next_start_index)
+                        print(f"[INGEST] stored {result.recipes} recipes ({result.unchanged} unchanged), "
+                              f"next startIndex={result.next_start_index}")
+
+                if failed:
+                    # Leave the checkpoint in place so the run can be resumed
+                    break
+                if exhausted:
+                    result.completed = True
+
+        if result.completed and delta:
+            try:
+                self.delete_missing(manifest, seen, result)
+            except Exception as e:
+                print(f"[INGEST] deleting removed recipes failed: {e}")
+            manifest.save()
+        elif result.completed:
+            self.clear_checkpoint()
+        print(f"[INGEST] {'finished' if result.completed else 'stopped'}: {json.dumps(result.stats())}")
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-ingest IFN recipes into Pinecone")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only upsert changed recipes and delete removed ones (uses the local manifest)")
+    parser.add_argument("--start-index", type=int, default=None, help="Explicit startIndex to begin at")
+    parser.add_argument("--page-workers", type=int, default=INGEST_PAGE_WORKERS)
+    parser.add_argument("--scrape-workers", type=int, default=INGEST_SCRAPE_WORKERS)
+    parser.add_argument("--upsert-batch", type=int, default=INGEST_UPSERT_BATCH)
+    args = parser.parse_args()
+
+    ingester = RecipeIngester(page_workers=args.page_workers, scrape_workers=args.scrape_workers,
+                              upsert_batch=args.upsert_batch)
+    ingester.run(resume=args.resume, start_index=args.start_index, delta=args.delta)
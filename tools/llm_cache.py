@@ -0,0 +1,110 @@
+import os
+import time
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from tools.cache import MISS, TieredCache, make_key, register_cache
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "4096"))
+
+
+def prompt_version(prompt_text: str) -> str:
+    """Short hash of a prompt template; editing the prompt invalidates its entries."""
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:12]
+
+
+def normalize_text_input(text: str) -> str:
+    """Case/whitespace-insensitive form of a free-text user input."""
+    return " ".join((text or "").lower().split())
+
+
+class LLMResponseCache:
+    """
+    Memoizes deterministic (temperature 0 / 0.1) LLM calls.
+
+    Entries are keyed on call site, model, prompt version and a hash of the
+    normalised input, and hold the *parsed* result of the call. Only results
+    the compute function returns (not None) are stored, so fallbacks and
+    errors are never cached.
+    """
+
+    namespace = "llm_responses"
+
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL):
+        self._cache = TieredCache(self.namespace, maxsize=maxsize, ttl=ttl,
+                                  is_negative=lambda value: False)
+        self._lock = threading.Lock()
+        self._sites = defaultdict(lambda: {"hits": 0, "misses": 0, "stored": 0, "miss_ms_total": 0.0})
+        register_cache(self)
+
+    def _key(self, site: str, model: str, prompt: str, payload: Any) -> tuple:
+        version = prompt_version(prompt)
+        return make_key(site, model, version, make_key(payload)), version
+
+    def _lookup(self, site, key, version):
+        entry = self._cache.get(key) if LLM_CACHE_ENABLED else MISS
+        if entry is not MISS and entry.get("v") == version:
+            with self._lock:
+                self._sites[site]["hits"] += 1
+            return entry["value"]
+        return MISS
+
+    def _store(self, site, key, version, value, started, ttl):
+        with self._lock:
+            stats = self._sites[site]
+            stats["misses"] += 1
+            stats["miss_ms_total"] += (time.monotonic() - started) * 1000
+        if value is not None and LLM_CACHE_ENABLED:
+            self._cache.set(key, {"v": version, "value": value}, ttl=ttl)
+            with self._lock:
+                self._sites[site]["stored"] += 1
+
+    def cached(self, site: str, model: str, prompt: str, payload: Any,
+               compute: Callable[[], Any], ttl: Optional[float] = None):
+        """Return the cached result for this call, or run `compute` and cache it."""
+        key, version = self._key(site, model, prompt, payload)
+        value = self._lookup(site, key, version)
+        if value is not MISS:
+            return value
+        started = time.monotonic()
+        value = compute()
+        self._store(site, key, version, value, started, ttl)
+        return value
+
+    async def acached(self, site: str, model: str, prompt: str, payload: Any,
+                      compute: Callable[[], Awaitable[Any]], ttl: Optional[float] = None):
+        """Async variant of cached() for coroutine-based call sites."""
+        key, version = self._key(site, model, prompt, payload)
+        value = self._lookup(site, key, version)
+        if value is not MISS:
+            return value
+        started = time.monotonic()
+        value = await compute()
+        self._store(site, key, version, value, started, ttl)
+        return value
+
+    def clear(self, local_only: bool = False):
+        self._cache.clear(local_only=local_only)
+
+    def stats(self) -> Dict:
+        sites = {}
+        with self._lock:
+            for site, s in self._sites.items():
+                lookups = s["hits"] + s["misses"]
+                avg_miss_ms = s["miss_ms_total"] / s["misses"] if s["misses"] else 0.0
+                sites[site] = {
+                    "hits": s["hits"],
+                    "misses": s["misses"],
+                    "stored": s["stored"],
+                    "hit_rate": round(s["hits"] / lookups, 4) if lookups else 0.0,
+                    "avg_miss_ms": round(avg_miss_ms, 1),
+                    "est_saved_ms": round(avg_miss_ms * s["hits"], 1),
+                }
+        return {**self._cache.stats(), "sites": sites}
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,98 @@
+import argparse
+import importlib.util
+import os
+from pathlib import Path
+from typing import List
+
+from tools.db import db_connection
+
+# Migration files live at the repository root, applied in filename order.
+# NNNN_*.sql files are run statement by statement; NNNN_*.py files (data
+# migrations such as backfills) define upgrade(dsn) and are called with the DSN.
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+MIGRATION_SUFFIXES = (".sql", ".py")
+
+
+def _split_statements(sql: str) -> List[str]:
+    """
+    Split a migration file into individual statements.
+
+    Each statement runs on its own in autocommit mode, which statements such
+    as CREATE INDEX CONCURRENTLY require.
+    """
+    statements, current = [], []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not current and (not stripped or stripped.startswith("--")):
+            continue
+        current.append(line)
+        if stripped.endswith(";"):
+            statements.append("\n".join(current).strip())
+            current = []
+    if current and "\n".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return statements
+
+
+def pending_migrations(applied: set) -> List[Path]:
+    return [
+        p for p in sorted(MIGRATIONS_DIR.iterdir(), key=lambda p: p.name)
+        if p.suffix in MIGRATION_SUFFIXES and p.name not in applied
+    ]
+
+
+def _run_python_migration(path: Path, dsn: str = None) -> None:
+    spec = importlib.util.spec_from_file_location(f"migrations_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.upgrade(dsn)
+
+
+def apply_migrations(dsn: str = None, dry_run: bool = False) -> List[str]:
+    """
+    Apply every migration in migrations/ that has not been recorded in
+    schema_migrations yet.
+
+    Returns:
+        List of migration filenames that were applied (or would be, on dry_run).
+    """
+    applied_now = []
+    with db_connection(dsn) as conn:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name        TEXT PRIMARY KEY,
+                applied_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """
+        )
+        cur.execute("SELECT name FROM schema_migrations;")
+        applied = {row[0] for row in cur.fetchall()}
+
+        for path in pending_migrations(applied):
+            print(f"[MIGRATE] {'would apply' if dry_run else 'applying'} {path.name}")
+            if dry_run:
+                applied_now.append(path.name)
+                continue
+            if path.suffix == ".py":
+                _run_python_migration(path, dsn)
+            else:
+                for statement in _split_statements(path.read_text(encoding="utf-8")):
+                    cur.execute(statement)
+            cur.execute("INSERT INTO schema_migrations (name) VALUES (%s);", (path.name,))
+            applied_now.append(path.name)
+        cur.close()
+
+    if not applied_now:
+        print("[MIGRATE] database is up to date")
+    return applied_now
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply SQL migrations from migrations/")
+    parser.add_argument("--dsn", default=os.getenv("DB_URL"), help="Postgres DSN (defaults to DB_URL)")
+    parser.add_argument("--dry-run", action="store_true", help="List pending migrations without applying them")
+    args = parser.parse_args()
+    apply_migrations(args.dsn, dry_run=args.dry_run)
@@ -0,0 +1,181 @@
+import os
+import threading
+from typing import Dict, Iterable, List
+
+from psycopg2.extras import Json, execute_values
+
+from tools.cache import MISS, TTLCache, register_cache
+from tools.db import db_connection
+
+# Keep ingredients, steps and the story HTML out of Pinecone metadata and
+# serve them from the recipe_details table (migrations/0003)
+PINECONE_SLIM_METADATA = os.getenv("PINECONE_SLIM_METADATA", "1").lower() not in ("0", "false", "no")
+RECIPE_DETAILS_CACHE_SIZE = int(os.getenv("RECIPE_DETAILS_CACHE_SIZE", "4096"))
+RECIPE_DETAILS_CACHE_TTL = int(os.getenv("RECIPE_DETAILS_CACHE_TTL", str(6 * 3600)))
+RECIPE_DETAILS_WRITE_BATCH = int(os.getenv("RECIPE_DETAILS_WRITE_BATCH", "500"))
+
+# Body fields that live in the detail store rather than in Pinecone
+DETAIL_BODY_FIELDS = ("ingredients", "cooking_steps", "story")
+DETAIL_FIELDS = ("dish_name", "recipe_url", "recipe_youtube_link", "dish_image") + DETAIL_BODY_FIELDS
+
+_UPSERT_SQL = f"""
+    INSERT INTO recipe_details (id, {", ".join(DETAIL_FIELDS)}, updated_at)
+    VALUES %s
+    ON CONFLICT (id) DO UPDATE SET
+        {", ".join(f"{field} = EXCLUDED.{field}" for field in DETAIL_FIELDS)},
+        updated_at = NOW();
+"""
+_UPSERT_TEMPLATE = f"({', '.join(['%s'] * (len(DETAIL_FIELDS) + 1))}, NOW())"
+_SELECT_SQL = f"SELECT id, {', '.join(DETAIL_FIELDS)} FROM recipe_details WHERE id = ANY(%s);"
+
+
+class RecipeDetailStore:
+    """
+    Full recipe bodies keyed by the Pinecone vector id.
+
+    Queries fetch the details of all returned matches in one round trip
+    (`WHERE id = ANY(...)`); recently served recipes are kept in an
+    in-process TTL cache in front of Postgres. Reads never raise: when the
+    table is unreachable the caller gets whatever was found and falls back
+    to the Pinecone metadata. Ingestion goes through vector_metadata(), which
+    upserts full metadata whenever the details could not be stored.
+    """
+
+    namespace = "recipe_details"
+
+    def __init__(self, maxsize: int = RECIPE_DETAILS_CACHE_SIZE, ttl: float = RECIPE_DETAILS_CACHE_TTL,
+                 write_batch: int = RECIPE_DETAILS_WRITE_BATCH):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.write_batch = write_batch
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.fetched_rows = 0
+        self.errors = 0
+        self.full_metadata_fallbacks = 0
+        register_cache(self)
+
+    def _incr(self, **counts):
+        with self._lock:
+            for name, amount in counts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Details for the given ids.
+
+        Args:
+            ids: Recipe ids (Pinecone match ids); duplicates are fetched once.
+
+        Returns:
+            dict of id -> {dish_name, recipe_url, recipe_youtube_link,
+            dish_image, ingredients, cooking_steps, story}; ids without a row
+            are left out.
+        """
+        found, missing = {}, []
+        for recipe_id in dict.fromkeys(ids):
+            details = self._cache.get(recipe_id)
+            if details is MISS:
+                missing.append(recipe_id)
+            else:
+                found[recipe_id] = details
+        if not missing:
+            return found
+
+        try:
+            with db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(_SELECT_SQL, (missing,))
+                rows = cur.fetchall()
+                cur.close()
+        except Exception as e:
+            self._incr(errors=1)
+            print(f"[RECIPE_DETAILS] fetch of {len(missing)} ids failed: {e}")
+            return found
+
+        self._incr(fetches=1, fetched_rows=len(rows))
+        for row in rows:
+            details = dict(zip(DETAIL_FIELDS, row[1:]))
+            self._cache.set(row[0], details)
+            found[row[0]] = details
+        return found
+
+    def put_many(self, records: List[Dict]):
+        """
+        Upsert the "details" of records built by build_recipe_record.
+        Raises on database errors; ingestion calls vector_metadata() instead.
+
+        Ids come from the dish name, so a batch can repeat one; the last
+        record wins, as it does in the Pinecone upsert (Postgres rejects an
+        ON CONFLICT DO UPDATE statement that touches the same row twice).
+        """
+        latest = {record["id"]: record for record in records}
+        rows = [
+            (recipe_id, *(
+                Json(record["details"].get(field) or [])
+                if field in ("ingredients", "cooking_steps")
+                else record["details"].get(field) or ""
+                for field in DETAIL_FIELDS
+            ))
+            for recipe_id, record in latest.items()
+        ]
+        if not rows:
+            return
+        with db_connection() as conn:
+            cur = conn.cursor()
+            execute_values(cur, _UPSERT_SQL, rows, template=_UPSERT_TEMPLATE, page_size=self.write_batch)
+            conn.commit()
+            cur.close()
+        for recipe_id in latest:
+            self._cache.delete(recipe_id)
+
+    def vector_metadata(self, records: List[Dict]) -> List[Dict]:
+        """
+        Store the details of records built by build_recipe_record and return
+        the Pinecone metadata to upsert with each of them.
+
+        Returns:
+            The records' own metadata (slim when PINECONE_SLIM_METADATA is on)
+            once the details are stored; when the write fails (Postgres down,
+            migration 0003 not applied) the metadata with the details merged
+            back in, so vectors never depend on rows that do not exist.
+        """
+        try:
+            self.put_many(records)
+        except Exception as e:
+            self._incr(errors=1, full_metadata_fallbacks=len(records))
+            print(f"[RECIPE_DETAILS] storing {len(records)} records failed, upserting full metadata: {e}")
+            return [{**record["metadata"], **record["details"]} for record in records]
+        return [record["metadata"] for record in records]
+
+    def delete_many(self, ids: List[str]):
+        if not ids:
+            return
+        try:
+            with db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("DELETE FROM recipe_details WHERE id = ANY(%s);", (list(ids),))
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            self._incr(errors=1)
+            print(f"[RECIPE_DETAILS] delete of {len(ids)} ids failed: {e}")
+        for recipe_id in ids:
+            self._cache.delete(recipe_id)
+
+    def clear(self, local_only: bool = False):
+        # Clears the in-process cache only; Postgres rows are the source of truth
+        self._cache.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "namespace": self.namespace,
+            "slim_metadata": PINECONE_SLIM_METADATA,
+            "fetches": self.fetches,
+            "fetched_rows": self.fetched_rows,
+            "errors": self.errors,
+            "full_metadata_fallbacks": self.full_metadata_fallbacks,
+            **self._cache.stats(),
+        }
+
+
+recipe_detail_store = RecipeDetailStore()
@@ -0,0 +1,48 @@
+import json
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+NDJSON = "application/x-ndjson"
+SSE = "text/event-stream"
+
+# Keep proxies (nginx) from buffering the stream
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def stream_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Streaming format requested by an Accept header: NDJSON, SSE or None for
+    the regular JSON response.
+    """
+    accept = (accept or "").lower()
+    if NDJSON in accept:
+        return NDJSON
+    if SSE in accept:
+        return SSE
+    return None
+
+
+def encode_event(event: str, data: Dict, fmt: str) -> str:
+    """
+    One event on the wire.
+
+    NDJSON: {"event": ..., "data": ...} per line.
+    SSE: an "event:" line and a single-line "data:" JSON payload.
+    """
+    if fmt == SSE:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({"event": event, "data": data}, default=str) + "\n"
+
+
+def event_stream(events: Iterable[Tuple[str, Dict]], fmt: str) -> Iterator[str]:
+    """
+    Encode (event, data) pairs for a streaming response.
+
+    An exception raised while producing events becomes a final "error" event,
+    since the status line has already been sent by then.
+    """
+    try:
+        for event, data in events:
+            yield encode_event(event, data, fmt)
+    except Exception as e:
+        print(f"[STREAM] aborted: {e}")
+        yield encode_event("error", {"error": str(e)}, fmt)
@@ -15,6 +15,17 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 from tools.youtube_service import YouTubeService
+from tools.db import db_connection
+from tools.http_client import async_get_json, ifn_get
+from tools.cache import StaleWhileRevalidateCache
+from tools.llm_cache import llm_cache, normalize_text_input
+from tools.embedding_cache import EmbeddingCache, canonical_ingredients
+from tools.vector_backend import create_index
+from tools.recipe_store import DETAIL_BODY_FIELDS, PINECONE_SLIM_METADATA, recipe_detail_store
+from tools.diet import VEG, VEGAN, apply_diet_label, classify_recipe, classify_recipes, diet_flags, diet_metadata, diet_sql_clause, disliked_matcher, normalize_diet, pinecone_diet_filter
+
+# Cached/batched front for the embeddings client; use this instead of `embeddings`
+embedding_cache = EmbeddingCache(embeddings)
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 client = OpenAI(api_key=OPENAI_API_KEY)
 # Initialize Pinecone
@@ -30,7 +41,8 @@ index_name = "ifn-recipes"
 #         dimension=1536,
 #         metric="cosine"
 #     )
-index = pc.Index(index_name)
+# Pinecone, or the local in-process index in front of it (VECTOR_BACKEND)
+index = create_index(pc.Index(index_name))
 
 
 
@@ -46,7 +58,7 @@ def fetch_second_span_values(url):
     """
     try:
         # Request the page content
-        response = requests.get(url)
+        response = ifn_get(url)
         response.raise_for_status()
 
         # Parse the HTML
@@ -69,19 +81,22 @@ def fetch_second_span_values(url):
         print(f"An error occurred: {e}")
         return []
 
-def fetch_youtube_link(url):
+def fetch_youtube_link(url, session=None, timeout=None):
     """
     Fetches the YouTube video link from the given URL containing an embedded iframe.
     
     Args:
         url (str): The URL of the webpage to scrape.
+        session (requests.Session, optional): Session to use instead of the shared IFN client.
+        timeout (float, optional): Request timeout in seconds (defaults to the client's).
     
     Returns:
         str: The YouTube video link if found, else None.
     """
     try:
         # Make a request to the URL
-        response = requests.get(url)
+        kwargs = {"timeout": timeout} if timeout else {}
+        response = session.get(url, **kwargs) if session else ifn_get(url, **kwargs)
         response.raise_for_status()  # Raise an exception for HTTP errors
 
         # Parse the HTML content of the page
@@ -120,51 +135,153 @@ def sanitize_id(input_string):
     # Truncate if necessary to fit Pinecone ID length limits (if any)
     return sanitized
 
-def extract_recipe_data(api_response):
+def _metadata_terms(value):
+    """Lowercased, de-duplicated strings from a comma-separated string or a list (Pinecone string-list metadata)."""
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, (list, tuple)):
+        return []
+    return list(dict.fromkeys(str(v).strip().lower() for v in value if v and str(v).strip()))
+
+
+def recipe_filter_metadata(recipe):
     """
-    Extracts required recipe information from the API response and stores it in Pinecone.
+    Filterable Pinecone metadata from an IFN content API item: recipe_type and
+    cuisine as lowercase string lists, preparation_time in minutes. Missing
+    fields are left out (Pinecone rejects null metadata values).
+
+    recipe_type and preparation_time are the names contentFilter filters on
+    (see fetch_recipes_by_filter); cuisine is not a contentFilter field and is
+    only stored when an item happens to carry it.
     """
-    recipes = api_response.get("news", [])
-    extracted_data = []
-    print("These are the recipes fetched", len(recipes))
+    metadata = {}
+    recipe_types = _metadata_terms(recipe.get("recipe_type"))
+    if recipe_types:
+        metadata["recipe_type"] = recipe_types
+    cuisines = _metadata_terms(recipe.get("cuisine"))
+    if cuisines:
+        metadata["cuisine"] = cuisines
+    prep = recipe.get("preparation_time")
+    if isinstance(prep, str):
+        digits = re.search(r"\d+", prep)
+        prep = digits.group(0) if digits else None
+    prep_minutes = _to_int(prep)
+    if prep_minutes is not None:
+        metadata["preparation_time"] = prep_minutes
+    return metadata
+
+
+def build_recipe_filter(recipe_type=None, preparation_time=None, diet=None, cuisine=None):
+    """
+    Pinecone metadata filter for recipe searches, or None when no filter is given.
 
-    for recipe in recipes:
-        recipe_url = f"https://www.indiafoodnetwork.in{recipe.get('url', '')}"
-        youtube_link = fetch_youtube_link(recipe_url) or ""
-        ingredients = [ingredient.get("heading", "") for ingredient in recipe.get("ingredient", [])]
-        steps = [step.get("description", "") for step in sorted(recipe.get("cookingstep", []), key=lambda x: x.get("uid", 0))]
-        story = recipe.get("story", "") or ""
-        thumbnail_image = recipe.get("thumbImage", "") or ""
-        dish_name = recipe.get("heading", "") or "Unnamed Dish"
+    Args:
+        recipe_type: One type or a list (any of them matches), e.g. "Breakfast".
+        preparation_time: Maximum preparation time in minutes.
+        diet: "veg", "vegan" or "non-veg" (and the spellings normalize_diet accepts).
+        cuisine: One cuisine or a list (any of them matches).
+    """
+    clauses = []
+    recipe_types = _metadata_terms([recipe_type] if isinstance(recipe_type, str) else recipe_type)
+    if recipe_types:
+        clauses.append({"recipe_type": {"$in": recipe_types}})
+    prep_minutes = _to_int(preparation_time)
+    if prep_minutes and prep_minutes > 0:
+        clauses.append({"preparation_time": {"$lte": prep_minutes}})
+    diet_filter = pinecone_diet_filter(diet)
+    if diet_filter:
+        clauses.append(diet_filter)
+    cuisines = _metadata_terms([cuisine] if isinstance(cuisine, str) else cuisine)
+    if cuisines:
+        clauses.append({"cuisine": {"$in": cuisines}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
-        sanitized_id = sanitize_id(dish_name)
-        ingredient_text = " ".join(ingredients)
-        ingredient_embedding = embeddings.embed_query(ingredient_text)
 
-        try:
-            index.upsert([(sanitized_id, ingredient_embedding, {
-                "recipe_url": recipe_url,
-                "dish_name": dish_name,
-                "recipe_youtube_link": youtube_link,
-                "ingredients": ingredients,
-                "cooking_steps": steps,
-                "story": story,
-                "dish_image": thumbnail_image
-            })])
-        except Exception as e:
-            print(f"Error upserting recipe '{dish_name}': {e}")
-            continue
+def build_recipe_record(recipe, youtube_link=""):
+    """
+    Builds the Pinecone record for one recipe from the IFN content API.
 
-        extracted_data.append({
+    Args:
+        recipe (dict): One item of the API's "news" list.
+        youtube_link (str): YouTube embed link scraped from the recipe page.
+
+    Returns:
+        dict: "id", "text" (ingredient text to embed), "metadata" (stored in
+        Pinecone), "details" (row for the recipe detail store) and "summary"
+        (the dict returned to API callers).
+    """
+    recipe_url = f"https://www.indiafoodnetwork.in{recipe.get('url', '')}"
+    ingredients = [ingredient.get("heading", "") for ingredient in recipe.get("ingredient", [])]
+    steps = [step.get("description", "") for step in sorted(recipe.get("cookingstep", []), key=lambda x: x.get("uid", 0))]
+    story = recipe.get("story", "") or ""
+    thumbnail_image = recipe.get("thumbImage", "") or ""
+    dish_name = recipe.get("heading", "") or "Unnamed Dish"
+    youtube_link = youtube_link or ""
+
+    details = {
+        "recipe_url": recipe_url,
+        "dish_name": dish_name,
+        "recipe_youtube_link": youtube_link,
+        "ingredients": ingredients,
+        "cooking_steps": steps,
+        "story": story,
+        "dish_image": thumbnail_image,
+    }
+    metadata = dict(details)
+    if PINECONE_SLIM_METADATA:
+        # Bodies are served from the recipe detail store, so every query
+        # does not pull kilobytes of story HTML per match
+        for field in DETAIL_BODY_FIELDS:
+            del metadata[field]
+
+    return {
+        "id": sanitize_id(dish_name),
+        "text": " ".join(ingredients),
+        "metadata": {
+            **metadata,
+            # Precomputed so queries can filter on diet, type, time and cuisine server-side
+            **diet_metadata(diet_flags(dish_name, ingredients)),
+            **recipe_filter_metadata(recipe),
+        },
+        "details": details,
+        "summary": {
             "Dish Name": dish_name,
             "YouTube Link": youtube_link,
             "Ingredients": ingredients,
             "Steps to Cook": steps,
             "Story": story,
             "Thumbnail Image": thumbnail_image
-        })
+        },
+    }
+
+def extract_recipe_data(api_response):
+    """
+    Extracts required recipe information from the API response and stores it in Pinecone.
+    """
+    recipes = api_response.get("news", [])
+    print("These are the recipes fetched", len(recipes))
+
+    records = []
+    for recipe in recipes:
+        recipe_url = f"https://www.indiafoodnetwork.in{recipe.get('url', '')}"
+        records.append(build_recipe_record(recipe, fetch_youtube_link(recipe_url)))
+
+    if not records:
+        return []
+
+    # One embeddings request and one upsert for the whole page; bodies are
+    # stored first so no slim vector is ever served without its details
+    try:
+        ingredient_embeddings = embedding_cache.embed_documents([record["text"] for record in records])
+        metadata = recipe_detail_store.vector_metadata(records)
+        index.upsert(list(zip((record["id"] for record in records), ingredient_embeddings, metadata)))
+    except Exception as e:
+        print(f"Error upserting {len(records)} recipes: {e}")
+        return []
 
-    return extracted_data
+    return [record["summary"] for record in records]
 
 
 
@@ -175,7 +292,7 @@ def fetch_recipe_data():
     api_url = os.getenv("IFN_CONTENT_API_URL", "https://indiafoodnetwork.in/dev/h-api/content")
     headers = {'accept': '*/*', 's-id': os.getenv("FETCH_RECIPE_S_ID")}
 
-    response = requests.get(api_url, headers=headers)
+    response = ifn_get(api_url, headers=headers)
     
     if response.status_code == 200:
         api_response = response.json()
@@ -187,12 +304,9 @@ def fetch_recipe_data():
 # Initialize OpenAI client
 client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-async def extract_dish_name_with_gpt(user_query):
-    """
-    Use GPT-4o-mini to extract dish name from natural language query
-    """
-    try:
-        prompt = f"""
+_EXTRACT_DISH_SYSTEM_PROMPT = "You are a helpful assistant that extracts dish names from cooking queries. Return only the dish name, nothing else."
+
+_EXTRACT_DISH_PROMPT = """
 Extract only the dish name from this cooking query. Return just the dish name, nothing else.
 
 Examples:
@@ -207,28 +321,41 @@ Query: "{user_query}"
 
 Dish name:"""
 
+async def extract_dish_name_with_gpt(user_query):
+    """
+    Use GPT-4o-mini to extract dish name from natural language query
+    """
+    async def call_gpt():
         response = await client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
-                {"role": "system", "content": "You are a helpful assistant that extracts dish names from cooking queries. Return only the dish name, nothing else."},
-                {"role": "user", "content": prompt}
+                {"role": "system", "content": _EXTRACT_DISH_SYSTEM_PROMPT},
+                {"role": "user", "content": _EXTRACT_DISH_PROMPT.format(user_query=user_query)}
             ],
             max_tokens=50,
             temperature=0.1  # Low temperature for consistent extraction
         )
-        
         extracted_dish = response.choices[0].message.content.strip()
-        
-        # Fallback to regex if GPT returns empty or invalid response
+
+        # Empty or invalid responses are not cached; the caller falls back to regex
         if not extracted_dish or len(extracted_dish) > 100:
-            return fallback_extract_dish_name(user_query)
-            
+            return None
         return extracted_dish.lower()
-        
+
+    try:
+        extracted_dish = await llm_cache.acached(
+            "extract_dish_name",
+            "gpt-4o-mini",
+            _EXTRACT_DISH_SYSTEM_PROMPT + _EXTRACT_DISH_PROMPT,
+            normalize_text_input(user_query),
+            call_gpt
+        )
     except Exception as e:
         print(f"Error with GPT extraction: {e}")
-        # Fallback to regex method
-        return fallback_extract_dish_name(user_query)
+        extracted_dish = None
+
+    # Fallback to regex if GPT failed or returned an unusable answer
+    return extracted_dish or fallback_extract_dish_name(user_query)
 
 def fallback_extract_dish_name(query):
     """
@@ -276,27 +403,40 @@ def filter_recipes_by_ingredients(recipes, user_ingredients, threshold=50):
 
     return filtered
 
+def _like_pattern(text):
+    """Build a `%text%` ILIKE pattern with LIKE wildcards in the text escaped."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
 def fetch_youtube_urls_from_db(dish_names):
     """
     Fetches YouTube URLs from PostgreSQL database for given dish names.
     Returns a dict mapping dish_name -> list of youtube_url rows.
+
+    All dish names are resolved in a single round trip by joining an
+    unnested array of ILIKE patterns against flask_yt_details; the
+    pg_trgm GIN index on title (migrations/0001) keeps each probe index-backed.
     """
-    import psycopg2
-    DB_URL = os.getenv("DB_URL")
+    names = list(dict.fromkeys(name for name in dish_names if name))
+    result = {name: [] for name in names}
+    if not names:
+        return result
 
-    result = {}
+    query = """
+        SELECT d.name, y.url
+        FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS d(name, pattern, ord)
+        JOIN flask_yt_details y ON y.title ILIKE d.pattern
+        WHERE y.url IS NOT NULL AND y.url <> ''
+        ORDER BY d.ord;
+    """
     try:
-        conn = psycopg2.connect(DB_URL)
-        cur = conn.cursor()
-        for name in dish_names:
-            cur.execute(
-                "SELECT url FROM flask_yt_details WHERE title ILIKE %s",
-                (f"%{name}%",)
-            )
-            rows = cur.fetchall()
-            result[name] = [row[0] for row in rows if row[0]]
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, (names, [_like_pattern(name) for name in names]))
+            for name, url in cur.fetchall():
+                result[name].append(url)
+            cur.close()
     except Exception as e:
         print(f"DB error fetching YouTube URLs: {e}")
 
@@ -304,11 +444,33 @@ def fetch_youtube_urls_from_db(dish_names):
 
 
 
+# Responses of fetch_recipes_by_filter, keyed on (recipe_type, preparation_time, startIndex, count)
+RECIPES_BY_FILTER_TTL = int(os.getenv("RECIPES_BY_FILTER_TTL", "900"))
+RECIPES_BY_FILTER_STALE_TTL = int(os.getenv("RECIPES_BY_FILTER_STALE_TTL", str(6 * 3600)))
+recipes_by_filter_cache = StaleWhileRevalidateCache(
+    "recipes_by_filter",
+    ttl=RECIPES_BY_FILTER_TTL,
+    stale_ttl=RECIPES_BY_FILTER_STALE_TTL,
+)
+
+
 def fetch_recipes_by_filter(recipe_type: str, preparation_time: int, start_index: int = 0, count: int = 10):
     """
     Fetches recipes from India Food Network API filtered by recipe_type and preparation_time.
     YouTube link is fetched from PostgreSQL database instead of YouTube API.
+
+    Responses are cached per (recipe_type, preparation_time, start_index, count):
+    fresh entries come from memory, stale ones are served while a background
+    refresh runs, and concurrent misses share one upstream call.
     """
+    parent_names, recipes = recipes_by_filter_cache.get_or_load(
+        (recipe_type, int(preparation_time), int(start_index), int(count)),
+        lambda: _fetch_recipes_by_filter_uncached(recipe_type, preparation_time, start_index, count)
+    )
+    return parent_names, recipes
+
+
+def _fetch_recipes_by_filter_uncached(recipe_type: str, preparation_time: int, start_index: int = 0, count: int = 10):
     api_url = os.getenv("IFN_CONTENT_FILTER_API_URL", "https://www.indiafoodnetwork.in/dev/h-api/contentFilter")
     headers = {
         "Accept": "*/*",
@@ -323,7 +485,7 @@ def fetch_recipes_by_filter(recipe_type: str, preparation_time: int, start_index
         "count": count
     }
 
-    response = requests.get(api_url, headers=headers, params=params)
+    response = ifn_get(api_url, headers=headers, params=params)
     response.raise_for_status()
     data = response.json()
 
@@ -375,65 +537,43 @@ def fetch_recipes_by_filter(recipe_type: str, preparation_time: int, start_index
 
 def _is_non_veg_recipe(dish_name: str, ingredients: list) -> bool:
     """Check if a recipe contains non-vegetarian ingredients based on dish name and ingredient list."""
-    non_veg_keywords = [
-        "chicken", "mutton", "lamb", "goat", "pork", "beef", "meat", "keema",
-        "fish", "prawn", "shrimp", "crab", "lobster", "squid", "octopus", "clam",
-        "salmon", "tuna", "surmai", "pomfret", "rawas", "bangda", "rohu", "hilsa",
-        "egg", "anda", "omelette", "omelet",
-        "bacon", "ham", "sausage", "salami", "pepperoni",
-        "murgh", "gosht", "jhinga", "machhi", "machi", "machli",
-        "tikka chicken", "butter chicken", "tandoori chicken",
-        "rogan josh", "nihari", "haleem", "seekh kabab","egg", "eggs",
-    ]
-    # Check dish name
-    name_lower = dish_name.lower()
-    for keyword in non_veg_keywords:
-        if keyword in name_lower:
-            return True
-    # Check ingredients
-    for ing in ingredients:
-        ing_lower = ing.lower()
-        for keyword in non_veg_keywords:
-            if keyword in ing_lower:
-                return True
-    return False
+    return not diet_flags(dish_name, ingredients) & VEG
 
 
 def _is_non_vegan_recipe(dish_name: str, ingredients: list) -> bool:
     """Check if a recipe contains non-vegan ingredients."""
-    non_vegan_keywords = [
-        # All non-veg keywords
-        "chicken", "mutton", "lamb", "goat", "pork", "beef", "meat", "keema",
-        "fish", "prawn", "shrimp", "crab", "lobster", "squid", "egg", "anda",
-        "murgh", "gosht", "jhinga", "machhi", "machi", "machli",
-        # Dairy and animal products
-        "milk", "cream", "butter", "ghee", "paneer", "cheese", "curd", "yogurt",
-        "yoghurt", "dahi", "khoya", "mawa", "malai", "whey",
-        "honey", "gelatin",
-    ]
-    name_lower = dish_name.lower()
-    for keyword in non_vegan_keywords:
-        if keyword in name_lower:
-            return True
-    for ing in ingredients:
-        ing_lower = ing.lower()
-        for keyword in non_vegan_keywords:
-            if keyword in ing_lower:
-                return True
-    return False
+    return classify_recipe(dish_name, ingredients)["non_vegan"]
 
 
 def _contains_disliked(dish_name: str, ingredients: list, disliked: list) -> bool:
     """Check if a recipe contains any disliked ingredients."""
-    name_lower = dish_name.lower()
-    for d in disliked:
-        d_lower = d.lower()
-        if d_lower in name_lower:
-            return True
-        for ing in ingredients:
-            if d_lower in ing.lower():
-                return True
-    return False
+    matcher = disliked_matcher(disliked)
+    return bool(matcher and matcher.matches(dish_name, ingredients))
+
+
+_CUISINE_MOOD_FILTER_PROMPT = """You are an Indian food expert. I have a list of recipes that are already filtered for dietary restrictions. Now I need you to rank and filter them based on cuisine and mood preferences.
+
+User preferences:
+- Preferred Cuisines: {cuisines}
+- Mood: {mood}
+
+Rules:
+1. If cuisines are specified, ONLY keep recipes that belong to those cuisines. For example:
+   - "north indian" includes dishes like dal makhani, paneer butter masala, chole, rajma, aloo gobi, paratha, naan dishes, etc.
+   - "south indian" includes dishes like dosa, idli, sambar, rasam, appam, uttapam, etc.
+   - "chinese/indo-chinese" includes manchurian, fried rice, noodles, etc.
+2. If mood is specified, prefer recipes matching that mood:
+   - "comfort" = rich, hearty, creamy, indulgent dishes
+   - "healthy" = light, nutritious, low-oil dishes
+   - "light" = simple, easy-to-digest dishes
+3. Be strict with cuisine filtering - if a dish clearly does not belong to the specified cuisine, remove it.
+
+Here are the recipes:
+{recipes}
+
+Return ONLY a JSON array of the indices (from the list above) of recipes that match the cuisine and mood preferences. Example: [0, 2, 5]
+If no recipes match, return an empty array: []
+Return ONLY the JSON array, no explanation."""
 
 
 def fetch_recipe_by_filter_for_values(
@@ -466,7 +606,7 @@ def fetch_recipe_by_filter_for_values(
     }
 
     print(f"[API REQUEST] Calling IFN API with params: recipe_type={recipe_type}, preparation_time={preparation_time}, startIndex={start_index}, count={count}")
-    response = requests.get(api_url, headers=headers, params=params)
+    response = ifn_get(api_url, headers=headers, params=params)
     response.raise_for_status()
     data = response.json()
 
@@ -480,22 +620,27 @@ def fetch_recipe_by_filter_for_values(
     food_type_lower = food_type.lower().strip() if food_type else ""
     filtered_recipes = []
 
-    for item in recipes:
+    # Classify the whole page in one pass; the disliked list is compiled once
+    classifications = classify_recipes(
+        ((item.get("heading", ""), [i.get("heading", "") for i in item.get("ingredient", [])]) for item in recipes),
+        disliked=disliked,
+    )
+
+    for item, flags in zip(recipes, classifications):
         dish_name = item.get("heading", "")
-        ingredients = [i.get("heading", "") for i in item.get("ingredient", [])]
 
         # Filter by foodType
         if food_type_lower in ["vegetarian", "veg"]:
-            if _is_non_veg_recipe(dish_name, ingredients):
+            if flags["non_veg"]:
                 print(f"[FILTERED OUT - non-veg] {dish_name}")
                 continue
         elif food_type_lower == "vegan":
-            if _is_non_vegan_recipe(dish_name, ingredients):
+            if flags["non_vegan"]:
                 print(f"[FILTERED OUT - non-vegan] {dish_name}")
                 continue
 
         # Filter by disliked ingredients
-        if disliked and _contains_disliked(dish_name, ingredients, disliked):
+        if flags["disliked"]:
             print(f"[FILTERED OUT - disliked] {dish_name}")
             continue
 
@@ -516,31 +661,12 @@ def fetch_recipe_by_filter_for_values(
                 "parent_name": item.get("parent_name", "")
             })
 
-        filter_prompt = f"""You are an Indian food expert. I have a list of recipes that are already filtered for dietary restrictions. Now I need you to rank and filter them based on cuisine and mood preferences.
-
-User preferences:
-- Preferred Cuisines: {', '.join(cuisines) if cuisines else 'any'}
-- Mood: {mood if mood else 'any'}
-
-Rules:
-1. If cuisines are specified, ONLY keep recipes that belong to those cuisines. For example:
-   - "north indian" includes dishes like dal makhani, paneer butter masala, chole, rajma, aloo gobi, paratha, naan dishes, etc.
-   - "south indian" includes dishes like dosa, idli, sambar, rasam, appam, uttapam, etc.
-   - "chinese/indo-chinese" includes manchurian, fried rice, noodles, etc.
-2. If mood is specified, prefer recipes matching that mood:
-   - "comfort" = rich, hearty, creamy, indulgent dishes
-   - "healthy" = light, nutritious, low-oil dishes
-   - "light" = simple, easy-to-digest dishes
-3. Be strict with cuisine filtering - if a dish clearly does not belong to the specified cuisine, remove it.
-
-Here are the recipes:
-{json.dumps(recipe_summaries, indent=2)}
-
-Return ONLY a JSON array of the indices (from the list above) of recipes that match the cuisine and mood preferences. Example: [0, 2, 5]
-If no recipes match, return an empty array: []
-Return ONLY the JSON array, no explanation."""
-
-        try:
+        def call_filter():
+            filter_prompt = _CUISINE_MOOD_FILTER_PROMPT.format(
+                cuisines=', '.join(cuisines) if cuisines else 'any',
+                mood=mood if mood else 'any',
+                recipes=json.dumps(recipe_summaries, indent=2)
+            )
             sync_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
             ai_response = sync_client.chat.completions.create(
                 model="gpt-4o-mini",
@@ -551,7 +677,20 @@ Return ONLY the JSON array, no explanation."""
             # Clean markdown code blocks if present
             if result_text.startswith("```"):
                 result_text = result_text.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
-            filtered_indices = json.loads(result_text)
+            return json.loads(result_text)
+
+        try:
+            filtered_indices = llm_cache.cached(
+                "cuisine_mood_filter",
+                "gpt-4o-mini",
+                _CUISINE_MOOD_FILTER_PROMPT,
+                {
+                    "cuisines": [c.strip().lower() for c in (cuisines or [])],
+                    "mood": (mood or "").strip().lower(),
+                    "recipes": recipe_summaries,
+                },
+                call_filter
+            )
             if isinstance(filtered_indices, list) and len(filtered_indices) > 0:
                 recipes = [recipes[i] for i in filtered_indices if i < len(recipes)]
                 print(f"[FILTER] OpenAI cuisine/mood filter: {len(filtered_indices)} out of {len(recipe_summaries)} kept")
@@ -601,73 +740,213 @@ Return ONLY the JSON array, no explanation."""
     return parent_names, recipes
 
 
-async def find_recipe_using_query(user_query):
+# Bounded fan-out for per-recipe YouTube enrichment
+YOUTUBE_ENRICH_CONCURRENCY = int(os.getenv("YOUTUBE_ENRICH_CONCURRENCY", "8"))
+YOUTUBE_ENRICH_TIMEOUT = float(os.getenv("YOUTUBE_ENRICH_TIMEOUT", "5"))
+
+
+def _similar_videos_lookup(yt_service, max_results=10, concurrency=None, timeout=None):
+    """Coroutine function looking up one dish's videos under a shared semaphore and timeout."""
+    semaphore = asyncio.Semaphore(concurrency or YOUTUBE_ENRICH_CONCURRENCY)
+    timeout = timeout or YOUTUBE_ENRICH_TIMEOUT
+
+    def release(search):
+        semaphore.release()
+        # Retrieve a late failure so it is not logged as never retrieved
+        if not search.cancelled():
+            search.exception()
+
+    async def lookup(dish_name):
+        await semaphore.acquire()
+        # The thread cannot be stopped, so a lookup that times out keeps its
+        # slot until the thread finishes; shield() keeps wait_for from
+        # cancelling the task and releasing it early
+        search = asyncio.ensure_future(asyncio.to_thread(
+            yt_service.search_recipe_videos,
+            recipe_name=dish_name,
+            max_results=max_results
+        ))
+        search.add_done_callback(release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(search), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Timed out fetching YouTube videos for {dish_name} after {timeout}s")
+        except Exception as e:
+            print(f"Error fetching YouTube videos for {dish_name}: {e}")
+        return []
+
+    return lookup
+
+
+async def fetch_similar_videos_concurrently(yt_service, dish_names, max_results=10,
+                                            concurrency=None, timeout=None):
     """
-    Finds recipes based on natural language query using GPT-4o-mini for better processing
+    Looks up similar YouTube videos for every dish concurrently.
+
+    At most `concurrency` lookups run at once and each one is abandoned after
+    `timeout` seconds. Lookups that time out or fail yield an empty list, so
+    callers always get partial results back in the same order as dish_names.
+    """
+    if not yt_service:
+        return [[] for _ in dish_names]
+
+    lookup = _similar_videos_lookup(yt_service, max_results, concurrency, timeout)
+    return await asyncio.gather(*(lookup(name) for name in dish_names))
+
+
+async def iter_similar_videos(yt_service, dish_names, max_results=10,
+                              concurrency=None, timeout=None):
+    """
+    Same lookups as fetch_similar_videos_concurrently, but yields
+    (position in dish_names, videos) as each one finishes.
+    """
+    if not yt_service:
+        for position in range(len(dish_names)):
+            yield position, []
+        return
+
+    lookup = _similar_videos_lookup(yt_service, max_results, concurrency, timeout)
+
+    async def indexed(position, dish_name):
+        return position, await lookup(dish_name)
+
+    tasks = [asyncio.ensure_future(indexed(i, name)) for i, name in enumerate(dish_names)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding lookups if the consumer goes away early
+        for task in tasks:
+            task.cancel()
+
+
+def _youtube_service():
+    try:
+        return YouTubeService()
+    except ValueError as e:
+        print(f"YouTubeService error: {e}")
+        return None
+
+
+async def _with_details(matches):
     """
+    Merge recipe detail store rows into the metadata of Pinecone matches,
+    fetched in one batch for exactly the ids returned. Matches without a row
+    keep their Pinecone metadata (older, non-slim vectors still carry it).
+    """
+    details = await asyncio.to_thread(recipe_detail_store.get_many, [match["id"] for match in matches])
+    for match in matches:
+        row = details.get(match["id"])
+        if row:
+            match["metadata"] = {**match["metadata"], **row}
+    return matches
+
+
+def _recipe_from_match(match, similar_youtube_videos, extra=None):
+    """Response dict for a Pinecone match (with details merged by _with_details)."""
+    metadata = match["metadata"]
+
+    # Clean up the recipe URL by removing category paths
+    recipe_url = metadata["recipe_url"]
+    if "/recipes/" in recipe_url:
+        # Extract base URL and recipe name
+        base_url = recipe_url.split("/recipes/")[0] + "/recipes/"
+        recipe_name_with_id = recipe_url.split("/")[-1]  # Get the last part (recipe-name-id)
+        recipe_url = base_url + recipe_name_with_id
+
+    recipe = {
+        "Dish Name": metadata["dish_name"],
+        "YouTube Link": metadata["recipe_youtube_link"],
+        "Ingredients": metadata.get("ingredients", []),
+        "Steps to Cook": metadata.get("cooking_steps", []),
+        "Story": metadata.get("story", ""),
+        "Thumbnail Image": metadata["dish_image"],
+        "Recipe URL": recipe_url,
+        "Similar YouTube Videos": similar_youtube_videos  # List of similar videos from same channel
+    }
+    if extra:
+        recipe.update(extra)
+    return recipe
+
+
+async def stream_recipe_matches(matches, extra=None, max_results=10):
+    """
+    Streaming counterpart of building the recipe list for Pinecone matches.
+
+    Yields ("recipe", {"index", "recipe"}) for every match straight away, with
+    an empty "Similar YouTube Videos" list, then ("patch", {"index",
+    "Similar YouTube Videos"}) for each YouTube lookup in completion order.
+
+    Args:
+        matches: Pinecone matches.
+        extra: Optional callable returning extra fields for a match.
+        max_results: Similar videos per recipe.
+    """
+    for position, match in enumerate(matches):
+        recipe = _recipe_from_match(match, [], extra(match) if extra else None)
+        yield "recipe", {"index": position, "recipe": recipe}
+
+    yt_service = _youtube_service()
+    dish_names = [match["metadata"]["dish_name"] for match in matches]
+    async for position, videos in iter_similar_videos(yt_service, dish_names, max_results=max_results):
+        yield "patch", {"index": position, "Similar YouTube Videos": videos}
+
+
+async def _query_recipe_matches(user_query):
+    """(GPT-extracted dish name, Pinecone matches) for a natural language query; matches is None on failure."""
     print(f"Processing query: '{user_query}'")
-    
+
     # Use GPT to extract dish name
     processed_query = await extract_dish_name_with_gpt(user_query)
     print(f"Original query: '{user_query}' -> GPT extracted: '{processed_query}'")
-    
+
     # Generate embedding for the processed query
     try:
-        user_vector = await asyncio.to_thread(embeddings.embed_query, processed_query)
+        user_vector = await asyncio.to_thread(embedding_cache.embed_query, processed_query)
     except Exception as e:
         print(f"Error generating embedding: {e}")
-        return None
+        return processed_query, None
 
     # Query Pinecone for matches
     try:
         result = await asyncio.to_thread(index.query, vector=user_vector, top_k=24, include_metadata=True)
+    except Exception as e:
+        print(f"Error querying Pinecone: {e}")
+        return processed_query, None
 
-        if not result or not result.get('matches'):
-            return None
+    if not result or not result.get('matches'):
+        return processed_query, None
+    return processed_query, await _with_details(result['matches'])
 
-        # Initialize YouTubeService
-        try:
-            yt_service = YouTubeService()
-        except ValueError as e:
-            print(f"YouTubeService error: {e}")
-            yt_service = None
 
-        matched_recipes = []
-        for match in result['matches']:
-            dish_name = match["metadata"]["dish_name"]
+def _query_match_fields(processed_query):
+    return lambda match: {
+        "Match Score": match.get("score", 0),
+        "Extracted Query": processed_query  # Show what was actually searched
+    }
 
-            # Fetch related videos from YouTube
-            similar_youtube_videos = []
-            if yt_service:
-                try:
-                    similar_youtube_videos = await asyncio.to_thread(
-                        yt_service.search_recipe_videos,
-                        recipe_name=dish_name,
-                        max_results=10
-                    )
-                except Exception as e:
-                    print(f"Error fetching YouTube videos for {dish_name}: {e}")
-                    similar_youtube_videos = []
-            
-            # Clean up the recipe URL
-            recipe_url = match["metadata"]["recipe_url"]
-            if "/recipes/" in recipe_url:
-                base_url = recipe_url.split("/recipes/")[0] + "/recipes/"
-                recipe_name_with_id = recipe_url.split("/")[-1]
-                recipe_url = base_url + recipe_name_with_id
-                
-            matched_recipes.append({
-                "Dish Name": dish_name,
-                "YouTube Link": match["metadata"]["recipe_youtube_link"],
-                "Ingredients": match["metadata"]["ingredients"],
-                "Steps to Cook": match["metadata"]["cooking_steps"],
-                "Story": match["metadata"]["story"],
-                "Thumbnail Image": match["metadata"]["dish_image"],
-                "Recipe URL": recipe_url,
-                "Similar YouTube Videos": similar_youtube_videos,
-                "Match Score": match.get("score", 0),
-                "Extracted Query": processed_query  # Show what was actually searched
-            })
+
+async def find_recipe_using_query(user_query):
+    """
+    Finds recipes based on natural language query using GPT-4o-mini for better processing
+    """
+    processed_query, matches = await _query_recipe_matches(user_query)
+    if not matches:
+        return None
+
+    try:
+        # Fetch related videos from YouTube for all matches at once
+        videos_per_match = await fetch_similar_videos_concurrently(
+            _youtube_service(),
+            [match["metadata"]["dish_name"] for match in matches],
+            max_results=10
+        )
+
+        extra = _query_match_fields(processed_query)
+        matched_recipes = [
+            _recipe_from_match(match, similar_youtube_videos, extra(match))
+            for match, similar_youtube_videos in zip(matches, videos_per_match)
+        ]
 
         # Sort by relevance score (highest first)
         matched_recipes.sort(key=lambda x: x["Match Score"], reverse=True)
@@ -676,75 +955,161 @@ async def find_recipe_using_query(user_query):
     except Exception as e:
         print(f"Error querying Pinecone: {e}")
         return None
+
+
+async def stream_recipes_by_query(user_query):
+    """
+    Streaming form of find_recipe_using_query: yields ("query", {...}) once the
+    dish name is extracted, then the events of stream_recipe_matches
+    (Pinecone already returns matches by descending score).
+    """
+    processed_query, matches = await _query_recipe_matches(user_query)
+    yield "query", {"query": user_query, "extracted_query": processed_query}
+    if not matches:
+        return
+    async for event in stream_recipe_matches(matches, extra=_query_match_fields(processed_query)):
+        yield event
+
 import asyncio
 from tools.youtube_service import YouTubeService
 
-async def find_recipe_by_ingredients(user_ingredients, recipe_type=None, preparation_time=None):
+# Matches returned when the caller does not ask for a page size
+RECIPE_SEARCH_TOP_K = int(os.getenv("RECIPE_SEARCH_TOP_K", "24"))
+RECIPE_SEARCH_MAX_TOP_K = int(os.getenv("RECIPE_SEARCH_MAX_TOP_K", "100"))
+# Pass search filters to Pinecone as filter=. Off until every vector carries the
+# filter metadata (re-run python -m tools.ingest); older vectors would never
+# match. While off, or when a filtered query finds nothing, filters run here
+# on RECIPE_FILTER_OVERFETCH times as many unfiltered matches.
+PINECONE_FILTER_PUSHDOWN = os.getenv("PINECONE_FILTER_PUSHDOWN", "0").lower() in ("1", "true", "yes")
+RECIPE_FILTER_OVERFETCH = int(os.getenv("RECIPE_FILTER_OVERFETCH", "4"))
+
+
+def recipe_matches_filters(metadata, recipe_type=None, preparation_time=None, diet=None, cuisine=None):
     """
-    Finds the best matching recipes based on provided ingredients using Pinecone asynchronously,
-    and fetches similar YouTube videos from India Food Network channel.
+    Whether a match's metadata passes the search filters of build_recipe_filter.
+
+    A field the vector was stored without (ingested before filter metadata
+    existed, or missing from the content API item) does not exclude it; a
+    missing diet is worked out from the dish name and ingredients instead.
+    """
+    recipe_types = _metadata_terms([recipe_type] if isinstance(recipe_type, str) else recipe_type)
+    if recipe_types and "recipe_type" in metadata and not set(recipe_types) & set(_metadata_terms(metadata["recipe_type"])):
+        return False
+    prep_minutes = _to_int(preparation_time)
+    stored_prep = _to_int(metadata.get("preparation_time"))
+    if prep_minutes and prep_minutes > 0 and stored_prep is not None and stored_prep > prep_minutes:
+        return False
+    cuisines = _metadata_terms([cuisine] if isinstance(cuisine, str) else cuisine)
+    if cuisines and "cuisine" in metadata and not set(cuisines) & set(_metadata_terms(metadata["cuisine"])):
+        return False
+    wanted_diet = normalize_diet(diet)
+    if wanted_diet in ("veg", "vegan", "non-veg"):
+        flags = _to_int(metadata.get("diet_flags"))
+        if flags is None:
+            flags = diet_flags(metadata.get("dish_name", ""), metadata.get("ingredients") or [])
+        if wanted_diet == "veg" and not flags & VEG:
+            return False
+        if wanted_diet == "vegan" and not flags & VEGAN:
+            return False
+        if wanted_diet == "non-veg" and flags & VEG:
+            return False
+    return True
+
+
+async def _ingredient_matches(user_ingredients, top_k=None, filters=None):
     """
-    user_ingredients_text = " ".join(user_ingredients)
+    Pinecone matches for an ingredient list, or None on failure.
+
+    Args:
+        top_k: Number of matches wanted (defaults to RECIPE_SEARCH_TOP_K).
+        filters: build_recipe_filter keyword arguments (recipe_type,
+            preparation_time, diet, cuisine), or None.
+    """
+    # Order/case-insensitive text, so the same ingredient set hits the same cache entry
+    user_ingredients_text = canonical_ingredients(user_ingredients)
 
     # Generate embedding for the user-provided ingredients asynchronously
     try:
-        user_vector = await asyncio.to_thread(embeddings.embed_query, user_ingredients_text)
+        user_vector = await asyncio.to_thread(embedding_cache.embed_query, user_ingredients_text)
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return None
 
+    top_k = max(1, min(int(top_k or RECIPE_SEARCH_TOP_K), RECIPE_SEARCH_MAX_TOP_K))
+    filters = filters or {}
+    metadata_filter = build_recipe_filter(**filters)
+
     # Query Pinecone for matches asynchronously
     try:
-        result = await asyncio.to_thread(index.query, vector=user_vector, top_k=24, include_metadata=True)
+        if metadata_filter and PINECONE_FILTER_PUSHDOWN:
+            result = await asyncio.to_thread(
+                index.query, vector=user_vector, top_k=top_k, include_metadata=True, filter=metadata_filter
+            )
+            if result and result.get('matches'):
+                return await _with_details(result['matches'])
+            print(f"[SEARCH] filtered query found nothing, filtering unfiltered matches instead: {metadata_filter}")
+        fetch_k = top_k * RECIPE_FILTER_OVERFETCH if metadata_filter else top_k
+        result = await asyncio.to_thread(index.query, vector=user_vector, top_k=fetch_k, include_metadata=True)
+    except Exception as e:
+        print(f"Error querying Pinecone: {e}")
+        return None
 
-        if not result or not result.get('matches'):
+    if not result or not result.get('matches'):
+        return None
+    matches = result['matches']
+    if metadata_filter:
+        matches = [m for m in matches if recipe_matches_filters(m.get("metadata") or {}, **filters)][:top_k]
+        if not matches:
             return None
+    return await _with_details(matches)
 
-        # Initialize YouTubeService (outside the loop for reuse)
-        try:
-            yt_service = YouTubeService()
-        except ValueError as e:
-            print(f"YouTubeService error: {e}")
-            yt_service = None
-
-        matched_recipes = []
-        for match in result['matches']:
-            dish_name = match["metadata"]["dish_name"]
-
-            # Fetch related videos from YouTube
-            similar_youtube_videos = []
-            if yt_service:
-                similar_youtube_videos = await asyncio.to_thread(
-                    yt_service.search_recipe_videos,
-                    recipe_name=dish_name,
-                    max_results=10
-                )
-             # Clean up the recipe URL by removing category paths
-            recipe_url = match["metadata"]["recipe_url"]
-            if "/recipes/" in recipe_url:
-                # Extract base URL and recipe name
-                base_url = recipe_url.split("/recipes/")[0] + "/recipes/"
-                recipe_name_with_id = recipe_url.split("/")[-1]  # Get the last part (recipe-name-id)
-                recipe_url = base_url + recipe_name_with_id
-                
-            matched_recipes.append({
-                "Dish Name": dish_name,
-                "YouTube Link": match["metadata"]["recipe_youtube_link"],
-                "Ingredients": match["metadata"]["ingredients"],
-                "Steps to Cook": match["metadata"]["cooking_steps"],
-                "Story": match["metadata"]["story"],
-                "Thumbnail Image": match["metadata"]["dish_image"],
-                "Recipe URL": recipe_url, #match["metadata"]["recipe_url"],
-                "Similar YouTube Videos": similar_youtube_videos  # List of similar videos from same channel
-            })
 
-        return matched_recipes
+async def find_recipe_by_ingredients(user_ingredients, recipe_type=None, preparation_time=None,
+                                     diet=None, cuisine=None, top_k=None):
+    """
+    Finds the best matching recipes based on provided ingredients using Pinecone asynchronously,
+    and fetches similar YouTube videos from India Food Network channel.
+
+    recipe_type, preparation_time (max minutes), diet and cuisine filter the
+    matches (inside Pinecone when PINECONE_FILTER_PUSHDOWN is on); top_k is
+    the number of recipes wanted (defaults to RECIPE_SEARCH_TOP_K).
+    """
+    matches = await _ingredient_matches(user_ingredients, top_k, {
+        "recipe_type": recipe_type, "preparation_time": preparation_time, "diet": diet, "cuisine": cuisine,
+    })
+    if not matches:
+        return None
+
+    try:
+        # Fetch related videos from YouTube for all matches at once
+        videos_per_match = await fetch_similar_videos_concurrently(
+            _youtube_service(),
+            [match["metadata"]["dish_name"] for match in matches],
+            max_results=10
+        )
+
+        return [
+            _recipe_from_match(match, similar_youtube_videos)
+            for match, similar_youtube_videos in zip(matches, videos_per_match)
+        ]
 
     except Exception as e:
         print(f"Error querying Pinecone: {e}")
         return None
 
 
+async def stream_recipes_by_ingredients(user_ingredients, recipe_type=None, preparation_time=None,
+                                        diet=None, cuisine=None, top_k=None):
+    """Streaming form of find_recipe_by_ingredients; yields the events of stream_recipe_matches."""
+    matches = await _ingredient_matches(user_ingredients, top_k, {
+        "recipe_type": recipe_type, "preparation_time": preparation_time, "diet": diet, "cuisine": cuisine,
+    })
+    if not matches:
+        return
+    async for event in stream_recipe_matches(matches):
+        yield event
+
+
 # import asyncio
 # async def find_recipe_by_ingredients(user_ingredients):
 #     """
@@ -828,116 +1193,24 @@ async def find_recipe_by_ingredients(user_ingredients, recipe_type=None, prepara
 
 
 
-def store_all_recipe_data_in_pinecone():
-    all_receipes_info = []
-    start_index = 0
-    count = 20
-
-    while True:
-        
-        print("Current start index:", start_index)
-
-        # Construct API URL with the custom range
-        api_url = f'{os.getenv("IFN_CONTENT_API_URL", "https://indiafoodnetwork.in/dev/h-api/content")}?startIndex={start_index}&count={count}'
-        headers = {
-            "accept": "*/*",
-            "s-id": os.getenv("FETCH_RECIPE_S_ID")
-        }
-        print(f"Requesting API URL: {api_url}")
+def store_all_recipe_data_in_pinecone(resume=False, delta=False):
+    """
+    Re-ingests every recipe from the IFN content API into Pinecone.
 
-        # Make the API request
-        response = requests.get(api_url, headers=headers)
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            data = response.json()
-            current_page_receipes_info = extract_recipe_data(data)
-            if(len(current_page_receipes_info)==0):
-                break
-            # Break the loop if no articles are returned
-            all_receipes_info.append(current_page_receipes_info)
-            start_index += count
-        else:
-            print(f"Failed to fetch articles. Status code: {response.status_code}")
-            break
+    Runs the pipelined ingester in tools/ingest.py (concurrent page fetches
+    and iframe scraping, batched embeddings and upserts, checkpointing).
 
-    return all_receipes_info
+    Args:
+        resume (bool): Continue from the last saved checkpoint instead of startIndex 0.
+        delta (bool): Only upsert recipes whose content changed since the last
+            sync and delete vectors of recipes removed from the catalogue.
 
-# async def get_festival_recipes(festivals_data, top_dishes=5, top_recipes=3):
-#     """
-#     Complete flow: festivals -> LLM dishes -> vector store recipes
-    
-#     Args:
-#         festivals_data (list): List of festival dicts with 'name' key
-#         top_dishes (int): Number of dishes to get from LLM per festival
-#         top_recipes (int): Number of recipes to get from vector store per dish
-    
-#     Returns:
-#         dict: Festival name mapped to recipes
-#     """
-#     results = {}
-#     print(festivals_data, "Festivals DATA")
-    
-#     for festival in festivals_data:
-#         festival_name = festival.get('name', '')
-#         if not festival_name:
-#             continue
-            
-#         try:
-#             # Step 1: Get dishes from LLM
-#             prompt = f"List {top_dishes} traditional dishes for {festival_name}. Return only dish names, one per line."
-            
-#             response = await client.chat.completions.create(
-#                 model="gpt-4o-mini",
-#                 messages=[
-#                     {"role": "system", "content": "Return only dish names, one per line."},
-#                     {"role": "user", "content": prompt}
-#                 ],
-#                 max_tokens=100,
-#                 temperature=0.3
-#             )
-            
-#             # Parse dishes
-#             dishes = [dish.strip().split('.', 1)[-1].strip() for dish in response.choices[0].message.content.strip().split('\n') if dish.strip()]
-#             print("DISHES", dishes)
-#             # Step 2: Search each dish in vector store
-#             festival_recipes = []
-#             for dish in dishes[:top_dishes]:
-#                 try:
-#                     # Generate embedding and search
-#                     dish_vector = await asyncio.to_thread(embeddings.embed_query, dish.lower())
-#                     result = await asyncio.to_thread(index.query, vector=dish_vector, top_k=top_recipes, include_metadata=True)
-                    
-#                     # Extract recipes
-#                     if result and result.get('matches'):
-#                         for match in result['matches']:
-#                             if match.get('score', 0) > 0.7:  # Quality threshold
-#                                 festival_recipes.append({
-#                                     "dish_name": match["metadata"]["dish_name"],
-#                                     "ingredients": match["metadata"]["ingredients"],
-#                                     "cooking_steps": match["metadata"]["cooking_steps"],
-#                                     "recipe_url": match["metadata"]["recipe_url"],
-#                                     "thumbnail": match["metadata"].get("dish_image", ""),
-#                                     "youtube_link": match["metadata"].get("recipe_youtube_link", ""),
-#                                     "suggested_for": dish,
-#                                     "score": match.get('score', 0)
-#                                 })
-#                 except Exception as e:
-#                     print(f"Error searching dish '{dish}': {e}")
-#                     continue
-            
-#             # Remove duplicates and sort by score
-#             unique_recipes = {recipe["dish_name"]: recipe for recipe in festival_recipes}
-#             sorted_recipes = sorted(unique_recipes.values(), key=lambda x: x["score"], reverse=True)
-            
-#             results[festival_name] = sorted_recipes
-            
-#         except Exception as e:
-#             print(f"Error processing festival '{festival_name}': {e}")
-#             results[festival_name] = []
-    
-#     return results
+    Returns:
+        list: One list of stored recipe summaries per API page.
+    """
+    from tools.ingest import RecipeIngester
 
+    return RecipeIngester().run(resume=resume, delta=delta).pages
 
 import asyncio
 import aiohttp
@@ -994,15 +1267,66 @@ def extract_youtube_videos_from_story(story_html: str) -> List[Dict[str, str]]:
     return videos
 
 
+# Upstream news-API searches in flight at once across all festivals
+FESTIVAL_FETCH_CONCURRENCY = int(os.getenv("FESTIVAL_FETCH_CONCURRENCY", "8"))
+# Per-search timeout (seconds); a timed out search counts as "no recipes"
+FESTIVAL_FETCH_TIMEOUT = float(os.getenv("FESTIVAL_FETCH_TIMEOUT", "10"))
+# Issue the plain-search fallback alongside the Tags search instead of after it
+FESTIVAL_SPECULATIVE_FALLBACK = os.getenv("FESTIVAL_SPECULATIVE_FALLBACK", "0").lower() in ("1", "true", "yes")
+
+
+def _parse_festival_news(data: Dict) -> List[Dict]:
+    """Turn a news-API response into festival recipe dicts."""
+    recipes = []
+    for item in data.get("news", []):
+        try:
+            youtube_videos = extract_youtube_videos_from_story(item.get("story", ""))
+
+            tags = item.get("tags", "")
+            if isinstance(tags, str):
+                tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+            elif not isinstance(tags, list):
+                tags = []
+
+            recipes.append({
+                "heading": item.get("heading", ""),
+                "thumbUrl": item.get("thumbUrl", ""),
+                "url": item.get("url", ""),
+                "tags": tags,
+                "youtube_videos": youtube_videos,
+                "description": item.get("description", ""),
+                "keywords": item.get("keywords", ""),
+            })
+        except Exception as e:
+            print(f"Error processing recipe item: {e}")
+    return recipes
+
 
 async def get_festival_recipes(
     festivals_data: List[Dict],
-    session_id: Optional[str] = None
+    session_id: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    speculative: Optional[bool] = None,
+    failures: Optional[set] = None
 ) -> Dict[str, List[Dict]]:
 
     """
     Fetch festival recipes from India Food Network API.
     First tries with searchType=Tags, falls back to plain search if no recipes found.
+
+    All festivals are fetched concurrently, with at most `concurrency` searches
+    in flight and each search bounded by `timeout` seconds. With `speculative`,
+    the plain search starts together with the Tags search; Tags results still
+    win whenever they are non-empty.
+
+    Args:
+        failures: Optional set that receives the names of festivals with no
+            recipes because a search timed out or errored, as opposed to
+            festivals that genuinely have none.
+
+    Returns:
+        dict: Festival name mapped to its recipes (empty list on failure).
     """
 
     base_url = os.getenv("IFN_NEWS_API_URL", "https://indiafoodnetwork.in/dev/h-api/news")
@@ -1010,65 +1334,68 @@ async def get_festival_recipes(
         "accept": "*/*",
         "s-id": session_id or os.getenv("FETCH_RECIPES_BY_FILTER_S_ID"),
     }
+    semaphore = asyncio.Semaphore(concurrency or FESTIVAL_FETCH_CONCURRENCY)
+    timeout = FESTIVAL_FETCH_TIMEOUT if timeout is None else timeout
+    speculative = FESTIVAL_SPECULATIVE_FALLBACK if speculative is None else speculative
 
-    results = {}
-
-    async with aiohttp.ClientSession() as session:
-        for festival in festivals_data:
-            festival_name = festival.get("name", "")
-            if not festival_name:
-                continue
-
-            recipes = []
-
-            async def fetch_recipes(params):
-                """Helper to fetch and parse recipes"""
-                nonlocal recipes
-                async with session.get(base_url, params=params, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        for item in data.get("news", []):
-                            try:
-                                youtube_videos = extract_youtube_videos_from_story(item.get("story", ""))
-
-                                tags = item.get("tags", "")
-                                if isinstance(tags, str):
-                                    tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
-                                elif not isinstance(tags, list):
-                                    tags = []
-
-                                recipe_data = {
-                                    "heading": item.get("heading", ""),
-                                    "thumbUrl": item.get("thumbUrl", ""),
-                                    "url": item.get("url", ""),
-                                    "tags": tags,
-                                    "youtube_videos": youtube_videos,
-                                    "description": item.get("description", ""),
-                                    "keywords": item.get("keywords", ""),
-                                }
-                                recipes.append(recipe_data) 
-                            except Exception as e:
-                                print(f"Error processing recipe item: {e}")
-                    else:
-                        print(f"API request failed for {festival_name}: {response.status}")
+    async def fetch_recipes(festival_name, params):
+        """Helper to fetch and parse recipes; None when the search failed"""
+        try:
+            async with semaphore:
+                status, data = await asyncio.wait_for(
+                    async_get_json(base_url, params=params, headers=headers), timeout
+                )
+        except asyncio.TimeoutError:
+            print(f"API request timed out for {festival_name} ({params.get('searchType', 'plain')})")
+            return None
+        if status != 200:
+            print(f"API request failed for {festival_name}: {status}")
+            return None
+        # Story HTML parsing is CPU work; keep it off the event loop
+        return await asyncio.to_thread(_parse_festival_news, data)
 
-            try:
+    async def fetch_festival(festival_name):
+        tags_search = {"search": festival_name, "searchType": "Tags"}
+        plain_search = {"search": festival_name}
+        try:
+            if speculative:
+                plain_task = asyncio.ensure_future(fetch_recipes(festival_name, plain_search))
+                try:
+                    tags_recipes = await fetch_recipes(festival_name, tags_search)
+                except Exception:
+                    tags_recipes = None
+                if tags_recipes:
+                    plain_task.cancel()
+                    recipes = tags_recipes
+                else:
+                    recipes = await plain_task
+            else:
                 # 1. Try with searchType=Tags
-                await fetch_recipes({"search": festival_name, "searchType": "Tags"})
+                tags_recipes = recipes = await fetch_recipes(festival_name, tags_search)
 
                 # 2. If no recipes found, fallback to plain search
                 if not recipes:
                     print(f"No recipes found with tags for {festival_name}, retrying without tags...")
-                    await fetch_recipes({"search": festival_name})
+                    recipes = await fetch_recipes(festival_name, plain_search)
 
-                results[festival_name] = recipes
-                print(f"Found {len(recipes)} recipes for {festival_name}")
+            # Empty only counts as "no recipes" when both searches answered
+            if not recipes and (recipes is None or tags_recipes is None):
+                if failures is not None:
+                    failures.add(festival_name)
+                return []
+            print(f"Found {len(recipes)} recipes for {festival_name}")
+            return recipes
 
-            except Exception as e:
-                print(f"Error fetching recipes for {festival_name}: {e}")
-                results[festival_name] = []
+        except Exception as e:
+            print(f"Error fetching recipes for {festival_name}: {e}")
+            if failures is not None:
+                failures.add(festival_name)
+            return []
 
-    return results
+    names = [festival.get("name", "") for festival in festivals_data]
+    names = list(dict.fromkeys(name for name in names if name))
+    fetched = await asyncio.gather(*(fetch_festival(name) for name in names))
+    return dict(zip(names, fetched))
 
 # def fetch_recipes_from_db_by_filters(
 #     meal_type: str = "",
@@ -1182,9 +1509,6 @@ def fetch_recipes_from_db_by_filters(
             "dessert":   [...],
         }
     """
-    import psycopg2
-    DB_URL = os.getenv("DB_URL")
-
     buckets = ["breakfast", "lunch", "snack", "dinner", "dessert"]
     grouped = {b: [] for b in buckets}
 
@@ -1206,8 +1530,13 @@ def fetch_recipes_from_db_by_filters(
         params.append(cuisine.strip().lower())
 
     if diet and diet.strip():
-        where_clauses.append("LOWER(diet) = %s")
-        params.append(diet.strip().lower())
+        # Indexed diet_flags check; unknown diet values still compare the text column
+        diet_clause = diet_sql_clause(diet)
+        if diet_clause:
+            where_clauses.append(diet_clause)
+        else:
+            where_clauses.append("LOWER(diet) = %s")
+            params.append(diet.strip().lower())
 
     if prep_time_minutes and int(prep_time_minutes) > 0:
         where_clauses.append("prep_time_minutes <= %s")
@@ -1225,12 +1554,11 @@ def fetch_recipes_from_db_by_filters(
     query = f"SELECT id, title, meal_type FROM recipes WHERE {where_sql};"
 
     try:
-        conn = psycopg2.connect(DB_URL)
-        cur = conn.cursor()
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
     except Exception as e:
         print(f"[DB ERROR] fetch_recipes_from_db_by_filters: {e}")
         return grouped
@@ -1264,9 +1592,6 @@ def fetch_recipes_flat_from_db(
     Returns:
         list[dict]: [{"title": "...", "id": "..."}, ...]
     """
-    import psycopg2
-    DB_URL = os.getenv("DB_URL")
-
     cuisines = cuisines or []
     disliked = disliked or []
 
@@ -1283,18 +1608,13 @@ def fetch_recipes_flat_from_db(
     #     params.append(diet.strip().lower())
     
     if diet and diet.strip():
-        d = diet.strip().lower()
-        # Normalize extracted value -> DB value
-        if d in ("vegetarian", "veg"):
-            db_value = "veg"
-        elif d in ("non-vegetarian", "non-veg", "nonveg", "non vegetarian"):
-            db_value = "non-veg"
-        elif d == "vegan":
-            db_value = "vegan"
+        # Normalize extracted value -> indexed diet_flags check (partial indexes on title)
+        diet_clause = diet_sql_clause(diet)
+        if diet_clause:
+            where_clauses.append(diet_clause)
         else:
-            db_value = d
-        where_clauses.append("LOWER(TRIM(diet)) = %s")
-        params.append(db_value)
+            where_clauses.append("LOWER(TRIM(diet)) = %s")
+            params.append(diet.strip().lower())
 
     # Multiple cuisines -> match ANY of them
     if cuisines:
@@ -1334,12 +1654,11 @@ def fetch_recipes_flat_from_db(
 
     results = []
     try:
-        conn = psycopg2.connect(DB_URL)
-        cur = conn.cursor()
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
     except Exception as e:
         print(f"[DB ERROR] fetch_recipes_flat_from_db: {e}")
         return results
@@ -1444,9 +1763,6 @@ def fetch_recipes_by_ingredients_match(
     Match percentage = (matched ingredients) / (user's ingredient count)
     i.e. "how many of what the user has does this recipe actually use?"
     """
-    import psycopg2
-    DB_URL = os.getenv("DB_URL")
-
     normalized = list({i.strip().lower() for i in (ingredients or []) if i and i.strip()})
     if not normalized:
         print("[DEBUG] No ingredients provided after normalization")
@@ -1487,12 +1803,11 @@ def fetch_recipes_by_ingredients_match(
 
     results = []
     try:
-        conn = psycopg2.connect(DB_URL)
-        cur = conn.cursor()
-        cur.execute(query, params)
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            cur.close()
 
         print(f"[DEBUG] rows returned from DB: {len(rows)}")
         for row in rows[:5]:
@@ -1727,7 +2042,7 @@ Output: {
   }
 }"""
 
-    try:
+    def call_openai():
         response = sync_client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
@@ -1738,7 +2053,16 @@ Output: {
             response_format={"type": "json_object"},
         )
         raw = response.choices[0].message.content.strip()
-        parsed = json.loads(raw)
+        return json.loads(raw)
+
+    try:
+        parsed = llm_cache.cached(
+            "classify_recipe_query",
+            "gpt-4o-mini",
+            system_prompt,
+            normalize_text_input(user_query),
+            call_openai
+        )
         print(f"[DEBUG][smart_ai] user_query: {user_query}")
         print(f"[DEBUG][smart_ai] parsed intent: {parsed}")
         return parsed
@@ -1853,39 +2177,49 @@ def classify_recipe_with_openai(recipe: dict) -> dict:
         f"Return JSON with recipe_type, recipe_category, and nutrition per serving."
     )
 
-    for attempt in range(3):
-        try:
-            resp = sync_client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0,
-                max_tokens=200,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": _CLASSIFY_SYSTEM_PROMPT},
-                    {"role": "user",   "content": user_prompt},
-                ],
-            )
-            raw_text = resp.choices[0].message.content or "{}"
-            print(f"[CLASSIFY attempt {attempt+1}] raw response: {raw_text}")
-
-            data = json.loads(raw_text)
-            rtype = _normalize_recipe_type(data.get("recipe_type"))
-            rcat  = _normalize_recipe_category(data.get("recipe_category"))
-            nutrition = {k: _to_int(data.get(k)) for k in NUTRITION_KEYS}
-
-            # Diagnostic: show which piece (if any) failed
-            print(f"[CLASSIFY attempt {attempt+1}] "
-                  f"rtype={rtype!r}, rcat={rcat!r}, nutrition={nutrition}")
+    def classify_with_retries():
+        for attempt in range(3):
+            try:
+                resp = sync_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    temperature=0,
+                    max_tokens=200,
+                    response_format={"type": "json_object"},
+                    messages=[
+                        {"role": "system", "content": _CLASSIFY_SYSTEM_PROMPT},
+                        {"role": "user",   "content": user_prompt},
+                    ],
+                )
+                raw_text = resp.choices[0].message.content or "{}"
+                print(f"[CLASSIFY attempt {attempt+1}] raw response: {raw_text}")
+
+                data = json.loads(raw_text)
+                rtype = _normalize_recipe_type(data.get("recipe_type"))
+                rcat  = _normalize_recipe_category(data.get("recipe_category"))
+                nutrition = {k: _to_int(data.get(k)) for k in NUTRITION_KEYS}
+
+                # Diagnostic: show which piece (if any) failed
+                print(f"[CLASSIFY attempt {attempt+1}] "
+                      f"rtype={rtype!r}, rcat={rcat!r}, nutrition={nutrition}")
+
+                if rtype and rcat and all(v is not None for v in nutrition.values()):
+                    return {"recipe_type": rtype, "recipe_category": rcat, **nutrition}
+                else:
+                    print(f"[CLASSIFY attempt {attempt+1}] validation failed — retrying")
+            except Exception as e:
+                print(f"[CLASSIFY ERROR attempt {attempt+1}] {e}")
 
-            if rtype and rcat and all(v is not None for v in nutrition.values()):
-                return {"recipe_type": rtype, "recipe_category": rcat, **nutrition}
-            else:
-                print(f"[CLASSIFY attempt {attempt+1}] validation failed — retrying")
-        except Exception as e:
-            print(f"[CLASSIFY ERROR attempt {attempt+1}] {e}")
+        print(f"[CLASSIFY] gave up after 3 attempts for: {recipe.get('title')}")
+        return None
 
-    print(f"[CLASSIFY] gave up after 3 attempts for: {recipe.get('title')}")
-    return None
+    return llm_cache.cached(
+        "classify_recipe",
+        "gpt-4o-mini",
+        _CLASSIFY_SYSTEM_PROMPT,
+        user_prompt,
+        classify_with_retries,
+        ttl=30 * 24 * 3600
+    )
 
 import re
 
@@ -1948,11 +2282,6 @@ def insert_youtube_recipe_into_db(recipe: dict) -> str:
     Returns:
         str: the recipe UUID on success, or None on failure.
     """
-    import psycopg2
-    from psycopg2.extras import Json
-
-    DB_URL = os.getenv("DB_URL")
-
     title       = (recipe.get("title") or "").strip()
     description = recipe.get("description") or ""
     url         = recipe.get("url") or recipe.get("youtube_url") or ""
@@ -1982,99 +2311,100 @@ def insert_youtube_recipe_into_db(recipe: dict) -> str:
     ingredients = recipe.get("ingredients") or []
     steps = parse_steps_from_description(description)
 
-    conn = None
-    try:
-        conn = psycopg2.connect(DB_URL)
-        conn.autocommit = False
-        cur = conn.cursor()
-
-        # --- 1. Insert/get the parent recipes row ---
-        cur.execute(
-            """
-            INSERT INTO recipes (
-                ifn_recipe_id, slug, title, description,
-                diet, meal_type,
-                calories_kcal, protein_g, carbs_g, fat_g,
-                ifn_url, source, published_at, is_published
-            ) VALUES (
-                %s, %s, %s, %s,
-                %s, %s,
-                %s, %s, %s, %s,
-                %s, %s, %s, %s
-            )
-            ON CONFLICT (ifn_recipe_id) DO UPDATE SET
-                title         = EXCLUDED.title,
-                description   = EXCLUDED.description,
-                diet          = EXCLUDED.diet,
-                meal_type     = EXCLUDED.meal_type,
-                calories_kcal = EXCLUDED.calories_kcal,
-                protein_g     = EXCLUDED.protein_g,
-                carbs_g       = EXCLUDED.carbs_g,
-                fat_g         = EXCLUDED.fat_g,
-                ifn_url       = EXCLUDED.ifn_url,
-                published_at  = EXCLUDED.published_at,
-                updated_at    = NOW()
-            RETURNING id;
-            """,
-            (
-                video_id, slug, title, description,
-                diet_value, rtype,
-                recipe.get("calories_kcal"),
-                recipe.get("protein_g"),
-                recipe.get("carbs_g"),
-                recipe.get("fat_g"),
-                url, "youtube", published, True,
-            ),
-        )
-        recipe_id = cur.fetchone()[0]
-
-        # --- 2. Wipe + re-insert ingredients (simplest way to stay in sync) ---
-        cur.execute("DELETE FROM recipe_ingredients WHERE recipe_id = %s;", (recipe_id,))
+    # Dietary bitmask from title + ingredient names; the classifier's "Non Veg" wins over keywords
+    ingredient_names = [
+        (ing.get("heading") or "") if isinstance(ing, dict) else ing
+        for ing in ingredients if isinstance(ing, (dict, str))
+    ]
+    flags = apply_diet_label(diet_flags(title, ingredient_names), diet_value)
 
-        for idx, ing in enumerate(ingredients):
-            if isinstance(ing, dict):
-                name = (ing.get("heading") or "").strip()
-                qty  = (ing.get("quantity") or "").strip() or None
-            elif isinstance(ing, str):
-                name, qty = ing.strip(), None
-            else:
-                continue
-            if not name:
-                continue
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
 
+            # --- 1. Insert/get the parent recipes row ---
             cur.execute(
                 """
-                INSERT INTO recipe_ingredients (
-                    recipe_id, ingredient_name, normalized_name,
-                    quantity, sort_order
-                ) VALUES (%s, %s, %s, %s, %s);
+                INSERT INTO recipes (
+                    ifn_recipe_id, slug, title, description,
+                    diet, diet_flags, meal_type,
+                    calories_kcal, protein_g, carbs_g, fat_g,
+                    ifn_url, source, published_at, is_published
+                ) VALUES (
+                    %s, %s, %s, %s,
+                    %s, %s, %s,
+                    %s, %s, %s, %s,
+                    %s, %s, %s, %s
+                )
+                ON CONFLICT (ifn_recipe_id) DO UPDATE SET
+                    title         = EXCLUDED.title,
+                    description   = EXCLUDED.description,
+                    diet          = EXCLUDED.diet,
+                    diet_flags    = EXCLUDED.diet_flags,
+                    meal_type     = EXCLUDED.meal_type,
+                    calories_kcal = EXCLUDED.calories_kcal,
+                    protein_g     = EXCLUDED.protein_g,
+                    carbs_g       = EXCLUDED.carbs_g,
+                    fat_g         = EXCLUDED.fat_g,
+                    ifn_url       = EXCLUDED.ifn_url,
+                    published_at  = EXCLUDED.published_at,
+                    updated_at    = NOW()
+                RETURNING id;
                 """,
-                (recipe_id, name, name.lower(), qty, idx),
+                (
+                    video_id, slug, title, description,
+                    diet_value, flags, rtype,
+                    recipe.get("calories_kcal"),
+                    recipe.get("protein_g"),
+                    recipe.get("carbs_g"),
+                    recipe.get("fat_g"),
+                    url, "youtube", published, True,
+                ),
             )
+            recipe_id = cur.fetchone()[0]
+
+            # --- 2. Wipe + re-insert ingredients (simplest way to stay in sync) ---
+            cur.execute("DELETE FROM recipe_ingredients WHERE recipe_id = %s;", (recipe_id,))
+
+            for idx, ing in enumerate(ingredients):
+                if isinstance(ing, dict):
+                    name = (ing.get("heading") or "").strip()
+                    qty  = (ing.get("quantity") or "").strip() or None
+                elif isinstance(ing, str):
+                    name, qty = ing.strip(), None
+                else:
+                    continue
+                if not name:
+                    continue
+
+                cur.execute(
+                    """
+                    INSERT INTO recipe_ingredients (
+                        recipe_id, ingredient_name, normalized_name,
+                        quantity, sort_order
+                    ) VALUES (%s, %s, %s, %s, %s);
+                    """,
+                    (recipe_id, name, name.lower(), qty, idx),
+                )
 
-        # --- 3. Wipe + re-insert steps ---
-        cur.execute("DELETE FROM recipe_steps WHERE recipe_id = %s;", (recipe_id,))
+            # --- 3. Wipe + re-insert steps ---
+            cur.execute("DELETE FROM recipe_steps WHERE recipe_id = %s;", (recipe_id,))
 
-        for i, step_text in enumerate(steps, start=1):
-            cur.execute(
-                """
-                INSERT INTO recipe_steps (recipe_id, step_number, instruction)
-                VALUES (%s, %s, %s);
-                """,
-                (recipe_id, i, step_text),
-            )
+            for i, step_text in enumerate(steps, start=1):
+                cur.execute(
+                    """
+                    INSERT INTO recipe_steps (recipe_id, step_number, instruction)
+                    VALUES (%s, %s, %s);
+                    """,
+                    (recipe_id, i, step_text),
+                )
 
-        conn.commit()
-        cur.close()
-        print(f"[DB INSERT] OK  '{title}'  id={recipe_id}  "
-              f"ings={len(ingredients)} steps={len(steps)}")
-        return str(recipe_id)
+            conn.commit()
+            cur.close()
+            print(f"[DB INSERT] OK  '{title}'  id={recipe_id}  "
+                  f"ings={len(ingredients)} steps={len(steps)}")
+            return str(recipe_id)
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         print(f"[DB INSERT ERROR] '{title}': {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        return None
\ No newline at end of file
@@ -0,0 +1,596 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# "pinecone" (default), "local" (in-process index only) or "tiered" (local
+# index answers queries, Pinecone stays the source of truth and the fallback)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+VECTOR_SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", str(Path(".cache") / "vector_index"))
+# How often a worker checks whether a newer snapshot was written
+VECTOR_SNAPSHOT_RELOAD_SECONDS = int(os.getenv("VECTOR_SNAPSHOT_RELOAD_SECONDS", "300"))
+# Ids per Pinecone fetch when syncing the local index
+VECTOR_SYNC_BATCH = int(os.getenv("VECTOR_SYNC_BATCH", "100"))
+# Distinct metadata filters whose row masks are kept between writes
+VECTOR_FILTER_CACHE_SIZE = int(os.getenv("VECTOR_FILTER_CACHE_SIZE", "256"))
+# Spare rows allocated when the first write copies a restored (memory-mapped) snapshot
+VECTOR_GROW_SLACK = int(os.getenv("VECTOR_GROW_SLACK", "1024"))
+
+SNAPSHOT_FORMAT = 1
+_MANIFEST = "manifest.json"
+
+
+# ---------- metadata filters ----------
+
+_COMPARISONS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _condition_matches(value, op: str, operand) -> bool:
+    # List-valued fields (recipe_type, cuisine) match when any element does,
+    # as in Pinecone
+    values = value if isinstance(value, list) else [value]
+    if op == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return op in ("$ne", "$nin")
+    if op == "$eq":
+        return operand in values
+    if op == "$ne":
+        return operand not in values
+    if op == "$in":
+        return any(v in operand for v in values)
+    if op == "$nin":
+        return not any(v in operand for v in values)
+    if op in _COMPARISONS:
+        return _is_number(operand) and any(_is_number(v) and _COMPARISONS[op](v, operand) for v in values)
+    raise ValueError(f"Unsupported filter operator {op!r}")
+
+
+def matches_filter(metadata: Optional[Dict], metadata_filter: Optional[Dict]) -> bool:
+    """
+    Evaluate a Pinecone metadata filter ($and, $or, $eq, $ne, $in, $nin,
+    $gt, $gte, $lt, $lte, $exists; a bare value means $eq) against one
+    record's metadata.
+    """
+    if not metadata_filter:
+        return True
+    metadata = metadata or {}
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_condition_matches(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif not _condition_matches(metadata.get(key), "$eq", condition):
+            return False
+    return True
+
+
+# ---------- backends ----------
+
+def _vector_item(item) -> Tuple[str, List[float], Dict]:
+    """(id, values, metadata) from an upsert item in any form Pinecone accepts."""
+    if isinstance(item, dict):
+        return str(item["id"]), item["values"], item.get("metadata") or {}
+    if isinstance(item, (tuple, list)):
+        return str(item[0]), item[1], (item[2] if len(item) > 2 else None) or {}
+    return str(item.id), item.values, getattr(item, "metadata", None) or {}
+
+
+class VectorBackend:
+    """
+    What the recipe code needs from a vector index: the subset of the
+    Pinecone Index API used by tools.tools and tools.ingest.
+    """
+
+    def query(self, vector, top_k: int = 10, include_metadata: bool = False,
+              filter: Optional[Dict] = None, **kwargs) -> Dict:
+        raise NotImplementedError
+
+    def upsert(self, vectors, **kwargs):
+        raise NotImplementedError
+
+    def delete(self, ids: List[str] = None, **kwargs):
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {"backend": type(self).__name__}
+
+
+class PineconeBackend(VectorBackend):
+    """Pass-through to a Pinecone Index; anything else is forwarded as-is."""
+
+    def __init__(self, pinecone_index):
+        self.pinecone_index = pinecone_index
+        self.queries = 0
+
+    def query(self, vector=None, top_k: int = 10, include_metadata: bool = False,
+              filter: Optional[Dict] = None, **kwargs):
+        self.queries += 1
+        if filter:
+            kwargs["filter"] = filter
+        return self.pinecone_index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, **kwargs)
+
+    def upsert(self, vectors, **kwargs):
+        return self.pinecone_index.upsert(vectors, **kwargs)
+
+    def delete(self, ids: List[str] = None, **kwargs):
+        return self.pinecone_index.delete(ids=ids, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.pinecone_index, name)
+
+    def stats(self) -> Dict:
+        return {"backend": "pinecone", "queries": self.queries}
+
+
+class LocalVectorIndex(VectorBackend):
+    """
+    In-process cosine index over float32 rows, queried with one matmul.
+
+    Rows are L2-normalised on insert, so the dot product is the cosine score
+    Pinecone reports. Snapshots are a raw float32 matrix plus a JSON
+    manifest of ids and metadata; restoring memory-maps the matrix
+    read-only, so all workers on a host share one copy in the page cache.
+
+    Visible rows are never modified: overwriting an id appends a new row
+    and tombstones the old one, so queries only take the lock to copy the
+    row count and alive flags and never see a half-written vector.
+    Tombstones are compacted away once they make up a quarter of the rows.
+
+    `loaded` is set once the contents came from restore() or sync_from(),
+    i.e. the index mirrors Pinecone rather than holding only recent writes.
+    """
+
+    def __init__(self, snapshot_dir: str = VECTOR_SNAPSHOT_DIR,
+                 reload_seconds: float = VECTOR_SNAPSHOT_RELOAD_SECONDS):
+        self.snapshot_dir = Path(snapshot_dir)
+        self.reload_seconds = reload_seconds
+        self._lock = threading.RLock()
+        self._reset(dim=None)
+        self.loaded = False
+        self._snapshot_mtime = 0.0
+        self._last_reload_check = 0.0
+        self._filter_masks: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def _reset(self, dim: Optional[int], matrix=None, ids=None, metadata=None):
+        self.dim = dim
+        self._matrix = matrix if matrix is not None else np.empty((0, dim or 0), dtype=np.float32)
+        self._ids: List[Optional[str]] = list(ids or [])
+        self._metadata: List[Optional[Dict]] = list(metadata or [])
+        self._count = len(self._ids)
+        self._alive = np.ones(self._count, dtype=bool)
+        self._positions = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._dead = 0
+        self._generation = getattr(self, "_generation", 0) + 1
+
+    def __len__(self):
+        return self._count - self._dead
+
+    # ---------- writes ----------
+
+    def _grow(self, needed: int):
+        capacity = len(self._matrix)
+        if self._count + needed <= capacity and self._matrix.flags.writeable:
+            return
+        if self._matrix.flags.writeable:
+            new_capacity = max(1024, 2 * capacity, self._count + needed)
+        else:
+            # Copying a restored snapshot into private memory: doubling would
+            # hold up to twice the snapshot per worker for a few mirrored writes
+            new_capacity = self._count + needed + VECTOR_GROW_SLACK
+        matrix = np.empty((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._count] = self._matrix[:self._count]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._count] = self._alive[:self._count]
+        self._matrix, self._alive = matrix, alive
+
+    def _compact(self):
+        rows = np.flatnonzero(self._alive[:self._count])
+        self._reset(
+            self.dim,
+            matrix=np.ascontiguousarray(self._matrix[rows]),
+            ids=[self._ids[row] for row in rows],
+            metadata=[self._metadata[row] for row in rows],
+        )
+
+    def _tombstone(self, row: int):
+        self._alive[row] = False
+        self._ids[row] = None
+        self._metadata[row] = None
+        self._dead += 1
+
+    def upsert(self, vectors, namespace: str = "", **kwargs):
+        """Insert or replace vectors given as (id, values[, metadata]) tuples or dicts."""
+        if namespace:
+            raise ValueError("LocalVectorIndex has no namespaces")
+        items = [_vector_item(item) for item in vectors]
+        if not items:
+            return {"upserted_count": 0}
+        values = np.asarray([item[1] for item in items], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            if self.dim is None:
+                self._reset(values.shape[1])
+            if values.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dim}")
+            self._grow(len(items))
+            for (vector_id, _, metadata), row_values in zip(items, values):
+                old_row = self._positions.get(vector_id)
+                if old_row is not None:
+                    self._tombstone(old_row)
+                row = self._count
+                self._matrix[row] = row_values
+                self._alive[row] = True
+                self._ids.append(vector_id)
+                self._metadata.append(dict(metadata))
+                self._positions[vector_id] = row
+                self._count += 1
+            self._after_write()
+        return {"upserted_count": len(items)}
+
+    def delete(self, ids: List[str] = None, delete_all: bool = False, **kwargs):
+        with self._lock:
+            if delete_all:
+                self._reset(self.dim)
+                return {}
+            for vector_id in ids or []:
+                row = self._positions.pop(str(vector_id), None)
+                if row is not None:
+                    self._tombstone(row)
+            self._after_write()
+        return {}
+
+    def _after_write(self):
+        if self._dead > max(1024, self._count // 4):
+            self._compact()
+        self._generation += 1
+        self._filter_masks.clear()
+
+    # ---------- queries ----------
+
+    def _filter_mask(self, metadata_filter: Dict, generation: int, count: int,
+                     metadata: List[Optional[Dict]]) -> np.ndarray:
+        key = (generation, count, json.dumps(metadata_filter, sort_keys=True, default=str))
+        with self._lock:
+            mask = self._filter_masks.get(key)
+            if mask is not None:
+                self._filter_masks.move_to_end(key)
+                return mask
+        mask = np.fromiter(
+            (row is not None and matches_filter(row, metadata_filter) for row in metadata[:count]),
+            dtype=bool, count=count,
+        )
+        with self._lock:
+            self._filter_masks[key] = mask
+            while len(self._filter_masks) > VECTOR_FILTER_CACHE_SIZE:
+                self._filter_masks.popitem(last=False)
+        return mask
+
+    def query(self, vector=None, top_k: int = 10, include_metadata: bool = False,
+              filter: Optional[Dict] = None, include_values: bool = False,
+              namespace: str = "", **kwargs) -> Dict:
+        """
+        Top-k cosine matches in Pinecone's response shape:
+        {"matches": [{"id", "score"[, "metadata"][, "values"]}], "namespace"}.
+        """
+        if vector is None or namespace or kwargs:
+            raise ValueError(f"LocalVectorIndex only supports vector queries, got {sorted(kwargs) or 'namespace'}")
+        self.maybe_reload()
+        started = time.perf_counter()
+
+        # Writes tombstone rows in place after the lock is released, so take a
+        # copy of the alive flags and skip rows whose id was cleared since
+        with self._lock:
+            count, matrix, alive = self._count, self._matrix, self._alive[:self._count].copy()
+            ids, metadata, generation = self._ids, self._metadata, self._generation
+        matches = []
+        if count and top_k > 0:
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            scores = matrix[:count] @ (query / norm if norm else query)
+            mask = alive
+            if filter:
+                mask = mask & self._filter_mask(filter, generation, count, metadata)
+            candidates = np.flatnonzero(mask)
+            k = min(int(top_k), len(candidates))
+            if k:
+                candidate_scores = scores[candidates]
+                best = np.argpartition(-candidate_scores, k - 1)[:k]
+                best = best[np.argsort(-candidate_scores[best], kind="stable")]
+                for position in best:
+                    row = candidates[position]
+                    # _tombstone clears the id before the metadata, so read them in reverse
+                    row_metadata = metadata[row]
+                    vector_id = ids[row]
+                    if vector_id is None:
+                        continue
+                    match = {"id": vector_id, "score": float(candidate_scores[position])}
+                    if include_metadata:
+                        match["metadata"] = dict(row_metadata or {})
+                    if include_values:
+                        match["values"] = matrix[row].tolist()
+                    matches.append(match)
+
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+        return {"matches": matches, "namespace": ""}
+
+    def fetch(self, ids: List[str], **kwargs) -> Dict:
+        """{"vectors": {id: {"id", "values", "metadata"}}} for the ids present."""
+        with self._lock:
+            vectors = {}
+            for vector_id in ids:
+                row = self._positions.get(str(vector_id))
+                if row is not None:
+                    vectors[vector_id] = {"id": vector_id, "values": self._matrix[row].tolist(),
+                                          "metadata": dict(self._metadata[row] or {})}
+        return {"vectors": vectors}
+
+    # ---------- snapshots ----------
+
+    def snapshot(self, snapshot_dir: str = None) -> Path:
+        """
+        Write the live rows to `vectors-<ms>.f32` plus `manifest.json`.
+        The manifest is replaced atomically, so readers see either the old
+        snapshot or the new one; older matrix files are removed afterwards
+        (workers that still map them keep their pages until they reload).
+        """
+        directory = Path(snapshot_dir) if snapshot_dir else self.snapshot_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._count])
+            matrix = np.ascontiguousarray(self._matrix[rows], dtype=np.float32)
+            ids = [self._ids[row] for row in rows]
+            metadata = [self._metadata[row] for row in rows]
+            dim = self.dim
+
+        vectors_name = f"vectors-{int(time.time() * 1000)}.f32"
+        matrix.tofile(directory / vectors_name)
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "dtype": "float32",
+            "metric": "cosine",
+            "dim": dim,
+            "count": len(ids),
+            "vectors": vectors_name,
+            "created_at": time.time(),
+            "ids": ids,
+            "metadata": metadata,
+        }
+        tmp = directory / f"{_MANIFEST}.tmp"
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False))
+        tmp.replace(directory / _MANIFEST)
+        for old in directory.glob("vectors-*.f32"):
+            if old.name != vectors_name:
+                old.unlink(missing_ok=True)
+        if directory == self.snapshot_dir:
+            self._snapshot_mtime = (directory / _MANIFEST).stat().st_mtime
+        print(f"[VECTOR] wrote snapshot of {len(ids)} vectors to {directory}")
+        return directory
+
+    def restore(self, snapshot_dir: str = None) -> bool:
+        """Load a snapshot (memory-mapped, read-only); returns False when there is none."""
+        directory = Path(snapshot_dir) if snapshot_dir else self.snapshot_dir
+        manifest_path = directory / _MANIFEST
+        try:
+            mtime = manifest_path.stat().st_mtime
+            manifest = json.loads(manifest_path.read_text())
+        except (OSError, ValueError):
+            return False
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            print(f"[VECTOR] ignoring snapshot with format {manifest.get('format')}")
+            return False
+
+        count, dim = manifest["count"], manifest["dim"]
+        if count:
+            matrix = np.memmap(directory / manifest["vectors"], dtype=np.float32, mode="r", shape=(count, dim))
+        else:
+            matrix = np.empty((0, dim or 0), dtype=np.float32)
+        with self._lock:
+            self._reset(dim, matrix=matrix, ids=manifest["ids"], metadata=manifest["metadata"])
+            self._filter_masks.clear()
+            self.loaded = True
+            if directory == self.snapshot_dir:
+                self._snapshot_mtime = mtime
+        print(f"[VECTOR] restored {count} vectors from {directory}")
+        return True
+
+    def maybe_reload(self):
+        """Pick up a newer snapshot (checked at most every reload_seconds)."""
+        now = time.time()
+        if now - self._last_reload_check < self.reload_seconds and self._snapshot_mtime:
+            return
+        self._last_reload_check = now
+        try:
+            mtime = (self.snapshot_dir / _MANIFEST).stat().st_mtime
+        except OSError:
+            return
+        if mtime > self._snapshot_mtime:
+            self.restore()
+
+    def sync_from(self, pinecone_index, batch_size: int = VECTOR_SYNC_BATCH) -> int:
+        """
+        Replace the contents with every vector in a Pinecone index (ids via
+        `list()`, vectors and metadata via batched `fetch()`).
+
+        Returns:
+            Number of vectors loaded.
+        """
+        started = time.perf_counter()
+        fresh = LocalVectorIndex(self.snapshot_dir, self.reload_seconds)
+        for page in pinecone_index.list():
+            page = list(page)
+            for i in range(0, len(page), batch_size):
+                response = pinecone_index.fetch(ids=page[i:i + batch_size])
+                vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+                fresh.upsert(list(vectors.values()))
+        with self._lock:
+            fresh._compact()
+            self._reset(fresh.dim, matrix=fresh._matrix, ids=fresh._ids, metadata=fresh._metadata)
+            self._filter_masks.clear()
+            self.loaded = True
+        print(f"[VECTOR] synced {len(self)} vectors from Pinecone in {time.perf_counter() - started:.1f}s")
+        return len(self)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "local",
+            "loaded": self.loaded,
+            "vectors": len(self),
+            "dim": self.dim,
+            "tombstones": self._dead,
+            "memory_mapped": isinstance(self._matrix, np.memmap),
+            "snapshot_mtime": self._snapshot_mtime,
+            "queries": self.queries,
+            "avg_query_ms": round(self.query_seconds * 1000 / self.queries, 3) if self.queries else 0.0,
+        }
+
+
+class TieredVectorIndex(VectorBackend):
+    """
+    Local index in front of Pinecone.
+
+    Queries are answered by the local index once it is loaded from a
+    snapshot or a sync, and go to Pinecone before that or when the query
+    uses something the local index does not support. Writes go to Pinecone
+    first (the source of truth) and are mirrored locally only once it is
+    loaded; mirroring into an unloaded index would leave it holding just
+    those few vectors and answering every query from them.
+    """
+
+    def __init__(self, primary: VectorBackend, local: LocalVectorIndex):
+        self.primary = primary
+        self.local = local
+        self.local_queries = 0
+        self.primary_queries = 0
+
+    def query(self, vector=None, top_k: int = 10, include_metadata: bool = False,
+              filter: Optional[Dict] = None, **kwargs):
+        self.local.maybe_reload()
+        if self.local.loaded:
+            try:
+                result = self.local.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                                          filter=filter, **kwargs)
+                self.local_queries += 1
+                return result
+            except Exception as e:
+                print(f"[VECTOR] local query failed, using Pinecone: {e}")
+        self.primary_queries += 1
+        return self.primary.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                                  filter=filter, **kwargs)
+
+    def upsert(self, vectors, **kwargs):
+        vectors = list(vectors)
+        result = self.primary.upsert(vectors, **kwargs)
+        if self.local.loaded and not kwargs.get("namespace"):
+            self.local.upsert(vectors)
+        return result
+
+    def delete(self, ids: List[str] = None, **kwargs):
+        result = self.primary.delete(ids=ids, **kwargs)
+        if self.local.loaded and not kwargs.get("namespace"):
+            self.local.delete(ids=ids, delete_all=kwargs.get("delete_all", False))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "tiered",
+            "local_queries": self.local_queries,
+            "primary_queries": self.primary_queries,
+            "local": self.local.stats(),
+            "primary": self.primary.stats(),
+        }
+
+
+def create_index(pinecone_index, backend: str = VECTOR_BACKEND, snapshot_dir: str = VECTOR_SNAPSHOT_DIR) -> VectorBackend:
+    """
+    Vector backend for the recipe index, selected by VECTOR_BACKEND.
+
+    Args:
+        pinecone_index: The Pinecone Index (source of truth).
+        backend: "pinecone", "local" or "tiered".
+        snapshot_dir: Where the local index snapshot lives.
+    """
+    if backend == "pinecone":
+        return PineconeBackend(pinecone_index)
+    local = LocalVectorIndex(snapshot_dir)
+    local.restore()
+    if backend == "local":
+        return local
+    if backend == "tiered":
+        return TieredVectorIndex(PineconeBackend(pinecone_index), local)
+    raise ValueError(f"Unknown VECTOR_BACKEND {backend!r} (expected pinecone, local or tiered)")
+
+
+def benchmark(local: LocalVectorIndex, queries: int = 200, top_k: int = 24,
+              metadata_filter: Optional[Dict] = None) -> Dict:
+    """Latency of random-vector queries against a loaded local index."""
+    rng = np.random.default_rng(0)
+    timings = []
+    for _ in range(queries):
+        vector = rng.standard_normal(local.dim).astype(np.float32)
+        started = time.perf_counter()
+        local.query(vector=vector, top_k=top_k, include_metadata=True, filter=metadata_filter)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "vectors": len(local),
+        "queries": queries,
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95)], 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local recipe vector index snapshot")
+    parser.add_argument("--sync", action="store_true",
+                        help="Copy every vector from Pinecone and write a fresh snapshot (run after ingest)")
+    parser.add_argument("--benchmark", type=int, metavar="N", default=0,
+                        help="Time N random queries against the snapshot")
+    parser.add_argument("--snapshot-dir", default=VECTOR_SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    local_index = LocalVectorIndex(args.snapshot_dir)
+    if args.sync:
+        from pinecone import Pinecone
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        local_index.sync_from(pc.Index("ifn-recipes"))
+        local_index.snapshot()
+    elif not local_index.restore():
+        parser.error(f"no snapshot in {args.snapshot_dir}; run with --sync first")
+    if args.benchmark:
+        print(json.dumps(benchmark(local_index, args.benchmark)))
+    print(json.dumps(local_index.stats()))
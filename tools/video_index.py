@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from tools.db import db_connection
+
+logger = logging.getLogger(__name__)
+
+VIDEO_INDEX_ENABLED = os.getenv("VIDEO_INDEX_ENABLED", "1").lower() not in ("0", "false", "no")
+# How often the index checks flask_yt_details for rows it has not seen yet
+VIDEO_INDEX_REFRESH_SECONDS = int(os.getenv("VIDEO_INDEX_REFRESH_SECONDS", "600"))
+# Fraction of query terms the best document must contain to count as a hit
+VIDEO_INDEX_MIN_COVERAGE = float(os.getenv("VIDEO_INDEX_MIN_COVERAGE", "0.75"))
+
+# Field weights: a term in the title counts three times, in ingredients twice
+FIELD_WEIGHTS = {"title": 3.0, "ingredients": 2.0, "description": 1.0}
+
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "with", "in", "on", "for", "to", "how", "make",
+    "recipe", "recipes", "style", "at", "home", "by", "is", "it", "this", "my",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_VIDEO_ID_RE = re.compile(r"(?:v=|youtu\.be/|embed/)([\w-]{6,})")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class ChannelVideoIndex:
+    """
+    In-memory BM25 index over the channel videos stored in flask_yt_details
+    (title + description + ingredients).
+
+    The index loads lazily in a background thread and then picks up new rows
+    incrementally, either from periodic refreshes or when
+    YouTubeService.save_to_postgres hands it freshly inserted videos.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs: List[Dict] = []
+        self._urls = set()
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._doc_len: List[float] = []
+        self._total_len = 0.0
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._last_refresh = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- building ----------
+
+    def add_videos(self, videos: Iterable[Dict]) -> int:
+        """
+        Index videos not seen before (keyed on URL).
+
+        Accepts rows from flask_yt_details as well as the dicts produced by
+        YouTubeService (youtube_url / video_url keys, ingredients as a list
+        or a JSON string). Returns the number of videos added.
+        """
+        added = 0
+        with self._lock:
+            for video in videos:
+                url = video.get("url") or video.get("youtube_url") or video.get("video_url")
+                if not url or url in self._urls:
+                    continue
+                ingredients = video.get("ingredients") or []
+                if isinstance(ingredients, str):
+                    try:
+                        ingredients = json.loads(ingredients)
+                    except ValueError:
+                        ingredients = [ingredients]
+                fields = {
+                    "title": video.get("title") or "",
+                    "ingredients": " ".join(str(i) for i in ingredients),
+                    "description": video.get("description") or "",
+                }
+
+                term_weights = defaultdict(float)
+                for field, text in fields.items():
+                    for term in tokenize(text):
+                        term_weights[term] += FIELD_WEIGHTS[field]
+                if not term_weights:
+                    continue
+
+                doc_id = len(self._docs)
+                m = _VIDEO_ID_RE.search(url)
+                video_id = m.group(1) if m else ""
+                published = video.get("published_at") or video.get("published_date") or ""
+                self._docs.append({
+                    "video_id": video_id,
+                    "title": fields["title"],
+                    "description": fields["description"][:200],
+                    "published_at": str(published),
+                    "channel_title": "India Food Network",
+                    "thumbnail_url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg" if video_id else "",
+                    "video_url": url,
+                })
+                self._urls.add(url)
+                doc_len = sum(term_weights.values())
+                self._doc_len.append(doc_len)
+                self._total_len += doc_len
+                for term, weight in term_weights.items():
+                    self._postings[term][doc_id] = weight
+                added += 1
+        return added
+
+    def refresh_from_db(self) -> int:
+        """
+        Pull rows of flask_yt_details that are not indexed yet.
+
+        Only the URL column is scanned in full; title/description/ingredients
+        are fetched for new URLs only.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0  # another thread is already refreshing
+        try:
+            with db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT url FROM flask_yt_details WHERE url IS NOT NULL;")
+                with self._lock:
+                    new_urls = [row[0] for row in cur.fetchall() if row[0] not in self._urls]
+                rows = []
+                if new_urls:
+                    cur.execute(
+                        "SELECT title, description, url, ingredients, published_at "
+                        "FROM flask_yt_details WHERE url = ANY(%s);",
+                        (new_urls,)
+                    )
+                    rows = [
+                        {"title": t, "description": d, "url": u, "ingredients": i, "published_at": p}
+                        for t, d, u, i, p in cur.fetchall()
+                    ]
+                cur.close()
+            added = self.add_videos(rows)
+            self._loaded = True
+            self._last_refresh = time.time()
+            if added:
+                logger.info(f"Video index: added {added} videos ({len(self._docs)} total)")
+            return added
+        except Exception as e:
+            logger.error(f"Video index refresh failed: {e}")
+            self._last_refresh = time.time()
+            return 0
+        finally:
+            self._refresh_lock.release()
+
+    def ensure_fresh(self):
+        """Kick off a background (re)load when the index is empty or stale."""
+        if time.time() - self._last_refresh < VIDEO_INDEX_REFRESH_SECONDS:
+            return
+        if self._refresh_lock.locked():
+            return
+        threading.Thread(target=self.refresh_from_db, daemon=True, name="video-index-refresh").start()
+
+    # ---------- querying ----------
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict]:
+        """
+        Rank indexed videos against the query with BM25.
+
+        Returns [] (a miss) when the index is not loaded yet or no document
+        contains at least VIDEO_INDEX_MIN_COVERAGE of the query terms, so the
+        caller can fall back to the YouTube API.
+        """
+        self.ensure_fresh()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not self._loaded or not terms:
+            self.misses += 1
+            return []
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                self.misses += 1
+                return []
+            avg_len = self._total_len / n_docs
+            scores = defaultdict(float)
+            matched_terms = defaultdict(int)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched_terms[doc_id] += 1
+
+            min_terms = math.ceil(len(terms) * VIDEO_INDEX_MIN_COVERAGE)
+            ranked = sorted(
+                (doc_id for doc_id in scores if matched_terms[doc_id] >= min_terms),
+                key=lambda doc_id: scores[doc_id],
+                reverse=True
+            )[:max_results]
+            results = [dict(self._docs[doc_id]) for doc_id in ranked]
+
+        if results:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return results
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "loaded": self._loaded,
+            "documents": len(self._docs),
+            "terms": len(self._postings),
+            "last_refresh": self._last_refresh,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+channel_video_index = ChannelVideoIndex()
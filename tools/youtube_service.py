@@ -1,16 +1,44 @@
 import os
+import re
 import json
+import threading
 from typing import List, Dict, Optional
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import logging
-import psycopg2
-import psycopg2.extras
+from tools.db import db_connection
+from tools.cache import MISS, TieredCache, make_key
+from tools.video_index import VIDEO_INDEX_ENABLED, channel_video_index
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Socket timeout for YouTube Data API calls made through per-thread transports
+YOUTUBE_HTTP_TIMEOUT = float(os.getenv("YOUTUBE_HTTP_TIMEOUT", "10"))
+
+# Every search().list call costs 100 quota units, so recipe searches are
+# cached across requests and YouTubeService instances. Empty results are
+# cached too, but for a shorter time.
+YOUTUBE_SEARCH_CACHE_TTL = int(os.getenv("YOUTUBE_SEARCH_CACHE_TTL", str(24 * 3600)))
+YOUTUBE_SEARCH_NEGATIVE_TTL = int(os.getenv("YOUTUBE_SEARCH_NEGATIVE_TTL", str(3600)))
+YOUTUBE_SEARCH_CACHE_SIZE = int(os.getenv("YOUTUBE_SEARCH_CACHE_SIZE", "2048"))
+
+search_cache = TieredCache(
+    "youtube_search",
+    maxsize=YOUTUBE_SEARCH_CACHE_SIZE,
+    ttl=YOUTUBE_SEARCH_CACHE_TTL,
+    negative_ttl=YOUTUBE_SEARCH_NEGATIVE_TTL,
+)
+
+
+def normalize_search_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so equivalent queries share a cache key."""
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
 class YouTubeService:
     """Service class to interact with YouTube Data API v3"""
     
@@ -32,6 +60,19 @@ class YouTubeService:
         self.channel_id = "UCqJkAAmi4QKCPCF62r_-BhQ"
         self.channel_name = "India Food Network"
         self.channel_handle = "@Indiafoodnetwork"
+        self._local = threading.local()
+
+    def _thread_http(self) -> httplib2.Http:
+        """
+        httplib2.Http is not thread-safe, so every thread that calls the API
+        through this service (e.g. concurrent asyncio.to_thread lookups) gets
+        its own transport.
+        """
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = httplib2.Http(timeout=YOUTUBE_HTTP_TIMEOUT)
+            self._local.http = http
+        return http
     
     def get_channel_id(self, channel_handle: str = None) -> Optional[str]:
         """
@@ -78,7 +119,8 @@ class YouTubeService:
                      query: str = "", 
                      max_results: int = 10, 
                      order: str = "relevance",
-                     published_after: str = None) -> List[Dict]:
+                     published_after: str = None,
+                     raise_errors: bool = False) -> List[Dict]:
         """
         Search for videos in the India Food Network channel
         
@@ -87,6 +129,8 @@ class YouTubeService:
             max_results: Maximum number of results to return (1-50)
             order: Sort order ('relevance', 'date', 'rating', 'viewCount', 'title')
             published_after: RFC 3339 formatted date-time (e.g., "2024-01-01T00:00:00Z")
+            raise_errors: Re-raise API errors instead of returning [] (lets
+                callers tell "no results" apart from a failed call)
         
         Returns:
             List of video dictionaries with metadata
@@ -109,7 +153,7 @@ class YouTubeService:
             if published_after:
                 search_params['publishedAfter'] = published_after
             
-            search_response = self.youtube.search().list(**search_params).execute()
+            search_response = self.youtube.search().list(**search_params).execute(http=self._thread_http())
             
             videos = []
             for item in search_response.get('items', []):
@@ -129,6 +173,8 @@ class YouTubeService:
             
         except HttpError as e:
             logger.error(f"Error searching videos: {e}")
+            if raise_errors:
+                raise
             return []
     
     def parse_ingredients(self, description: str) -> List[str]:
@@ -188,45 +234,48 @@ class YouTubeService:
 
         inserted = 0
         try:
-            conn = psycopg2.connect(DB_URL)
-            cursor = conn.cursor()
-
-            # for video in videos:
-            #     cursor.execute(
-            #         """
-            #         INSERT INTO flask_yt_details (title, description, url, ingredients)
-            #         VALUES (%s, %s, %s, %s)
-            #         """,
-            #         (
-            #             video.get("title"),
-            #             video.get("description"),
-            #             video.get("youtube_url"),
-            #             json.dumps(video.get("ingredients", []))
-            #         )
-            #     )
+            with db_connection(DB_URL) as conn:
+                cursor = conn.cursor()
+
+                # for video in videos:
+                #     cursor.execute(
+                #         """
+                #         INSERT INTO flask_yt_details (title, description, url, ingredients)
+                #         VALUES (%s, %s, %s, %s)
+                #         """,
+                #         (
+                #             video.get("title"),
+                #             video.get("description"),
+                #             video.get("youtube_url"),
+                #             json.dumps(video.get("ingredients", []))
+                #         )
+                #     )
             
-            for video in videos:
-                cursor.execute(
-                    """
-                    INSERT INTO flask_yt_details (title, description, url, ingredients, published_at)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (
-                        video.get("title"),
-                        video.get("description"),
-                        video.get("youtube_url"),
-                        json.dumps(video.get("ingredients", [])),
-                        video.get("published_date")
+                for video in videos:
+                    cursor.execute(
+                        """
+                        INSERT INTO flask_yt_details (title, description, url, ingredients, published_at)
+                        VALUES (%s, %s, %s, %s, %s)
+                        """,
+                        (
+                            video.get("title"),
+                            video.get("description"),
+                            video.get("youtube_url"),
+                            json.dumps(video.get("ingredients", [])),
+                            video.get("published_date")
+                        )
                     )
-                )
-                if cursor.rowcount > 0:
-                    inserted += 1
+                    if cursor.rowcount > 0:
+                        inserted += 1
 
-            conn.commit()
-            cursor.close()
-            conn.close()
+                conn.commit()
+                cursor.close()
             logger.info(f"Inserted {inserted} new videos into flask_yt_details")
 
+            # Make the new rows searchable locally without waiting for a refresh
+            if VIDEO_INDEX_ENABLED:
+                channel_video_index.add_videos(videos)
+
         except Exception as e:
             logger.error(f"PostgreSQL error: {e}")
             raise
@@ -530,6 +579,10 @@ class YouTubeService:
         """
         Search for specific recipe videos
         
+        Lookup order: the local channel video index (BM25 over
+        flask_yt_details), then search_cache, then the live search API.
+        Only successful API responses (including empty ones) are cached.
+        
         Args:
             recipe_name: Name of the recipe (e.g., "butter chicken", "biryani")
             max_results: Maximum number of results to return
@@ -537,11 +590,29 @@ class YouTubeService:
         Returns:
             List of recipe video dictionaries
         """
-        return self.search_videos(
-            query=f"{recipe_name} recipe",
-            max_results=max_results,
-            order="relevance"
-        )
+        if VIDEO_INDEX_ENABLED:
+            local_videos = channel_video_index.search(recipe_name, max_results=max_results)
+            if local_videos:
+                return local_videos
+
+        order = "relevance"
+        cache_key = make_key(normalize_search_query(recipe_name), max_results, order)
+        cached = search_cache.get(cache_key)
+        if cached is not MISS:
+            return [dict(video) for video in cached]
+
+        try:
+            videos = self.search_videos(
+                query=f"{recipe_name} recipe",
+                max_results=max_results,
+                order=order,
+                raise_errors=True
+            )
+        except HttpError:
+            return []
+
+        search_cache.set(cache_key, videos)
+        return [dict(video) for video in videos]
     
     def export_to_json(self, videos: List[Dict], filename: str = "youtube_videos.json"):
         """
@@ -5,6 +5,9 @@ import base64
 from openai import OpenAI
 from PIL import Image
 import io
+from tools.image_preprocess import image_bytes, image_content_part, image_hash, prepare_image
+from tools.cache import MISS
+from tools.image_cache import image_result_cache
 
 import requests
 from datetime import datetime, timedelta
@@ -57,21 +60,22 @@ def generate_food_or_ingredients_in_image(img):
 
     # OpenAI implementation
     try:
-        # Check if img is a file path (string) or PIL Image
-        if isinstance(img, str):
-            base64_image = encode_image_to_base64(img)
-        elif hasattr(img, 'save'):  # PIL Image object
-            base64_image = encode_pil_image_to_base64(img)
-        else:
-            # Handle other cases - try to convert to PIL Image first
-            try:
-                if hasattr(img, 'read'):  # File-like object
-                    img = Image.open(img)
-                    base64_image = encode_pil_image_to_base64(img)
-                else:
-                    raise ValueError("Unsupported image type")
-            except Exception as e:
-                return {"error": f"Failed to process image: {str(e)}"}
+        # Same or near-identical photo seen recently: skip preprocessing and the vision call
+        try:
+            img = image_bytes(img)
+            hash_value = image_hash(img)
+        except Exception as e:
+            return {"error": f"Failed to process image: {str(e)}"}
+        cached = image_result_cache.get(hash_value)
+        if cached is not MISS:
+            print(f"[IMAGE] cache hit for dhash {hash_value:016x}")
+            return cached
+
+        # Orient, downscale and re-encode before upload (path, PIL image, bytes or file-like)
+        try:
+            prepared = prepare_image(img, hash_value=hash_value)
+        except Exception as e:
+            return {"error": f"Failed to process image: {str(e)}"}
         
         response = client.chat.completions.create(
             model="gpt-4.1-mini",  # Using latest OpenAI model
@@ -91,12 +95,7 @@ def generate_food_or_ingredients_in_image(img):
                                    '\n{\n  "ingredients": []\n}'
                                    "\nStrictly follow this format with no additional information."
                         },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
+                        image_content_part(prepared)
                     ]
                 }
             ],
@@ -118,6 +117,8 @@ def generate_food_or_ingredients_in_image(img):
             cleaned_text = clean_raw_text(raw_text)
             parsed_result = json.loads(cleaned_text)
             print(parsed_result)
+            if isinstance(parsed_result, dict) and isinstance(parsed_result.get("ingredients"), list):
+                image_result_cache.set(prepared["dhash"], parsed_result)
             return parsed_result
         except json.JSONDecodeError as e:
             raise ValueError(f"Failed to parse JSON from AI response: {str(e)}")